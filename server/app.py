@@ -1,82 +1,420 @@
 #!/usr/bin/env python3
 
 from models import db, Sweet, Vendor, VendorSweet
-from flask_migrate import Migrate
-from flask import Flask, request, make_response
+from flask import (
+    Flask, Response, current_app, request, make_response, stream_with_context,
+)
 from flask_restful import Api, Resource
+from sqlalchemy import select, true
+from cache import ResponseCache
+from config import DATABASE, init_database
+from instrumentation import Instrumentation
+from search import Search
+from summaries import cli as price_summaries_cli
+from bulk import (
+    BulkPayloadError, DEFAULT_CHUNK_SIZE, MAX_CHUNK_SIZE, batch, iter_records,
+    ingest,
+)
+from serializers import FastJSONProvider, rows_to_dicts
+from pagination import (
+    PageArgsError, page_args, keyset_page, page_headers, stream_format,
+    stream_rows, offset_args, offset_headers, since_args, ids_args, id_list,
+    DEFAULT_PAGE_SIZE,
+)
+from price_stats import (
+    add_price_stats, with_price_stats, sweet_vendors, SWEET_VENDOR_FIELDS,
+)
+from fieldsets import Fieldset, FieldsetError, fieldset_args
+from snapshot import CatalogSnapshot
+from coalesce import Coalescer
+from changes import ChangeLog
+import changes
+import click
 import os
 
-BASE_DIR = os.path.abspath(os.path.dirname(__file__))
-DATABASE = os.environ.get(
-    "DB_URI", f"sqlite:///{os.path.join(BASE_DIR, 'app.db')}")
+SEARCH_PAGE_SIZE = 20
 
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.json.compact = False
+response_cache = ResponseCache()
+instrumentation = Instrumentation()
+instrumentation.register_collector(response_cache.metrics)
+search = Search()
+catalog_snapshot = CatalogSnapshot()
+instrumentation.register_collector(catalog_snapshot.metrics)
+coalescer = Coalescer()
+instrumentation.register_collector(coalescer.metrics)
+change_log = ChangeLog()
+api = Api()
 
-migrate = Migrate(app, db)
+def default_config(environ=os.environ):
+    config = {
+        'SQLALCHEMY_DATABASE_URI': DATABASE,
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        'BULK_CHUNK_SIZE': int(environ.get("BULK_CHUNK_SIZE", DEFAULT_CHUNK_SIZE)),
+        'SEARCH_BACKEND': environ.get("SEARCH_BACKEND", "auto"),
+        'RESPONSE_CACHE_ENABLED': environ.get("RESPONSE_CACHE", "1") != "0",
+        'RESPONSE_CACHE_SYNC': environ.get("RESPONSE_CACHE_SYNC", "0") != "0",
+        'CATALOG_SNAPSHOT': environ.get("CATALOG_SNAPSHOT", "0") != "0",
+        'COALESCE_ENABLED': environ.get("COALESCE", "1") != "0",
+    }
+    if environ.get("CATALOG_SNAPSHOT_INTERVAL"):
+        config['CATALOG_SNAPSHOT_INTERVAL'] = float(environ["CATALOG_SNAPSHOT_INTERVAL"])
+    if environ.get("CHANGES_RETENTION"):
+        config['CHANGES_RETENTION'] = int(environ["CHANGES_RETENTION"])
+    if environ.get("CHANGES_STREAM_SECONDS"):
+        config['CHANGES_STREAM_SECONDS'] = float(environ["CHANGES_STREAM_SECONDS"])
+    if environ.get("COALESCE_TIMEOUT"):
+        config['COALESCE_TIMEOUT'] = float(environ["COALESCE_TIMEOUT"])
+    if environ.get("SLOW_QUERY_MS"):
+        config['SLOW_QUERY_MS'] = float(environ["SLOW_QUERY_MS"])
+    return config
 
-db.init_app(app)
+def init_migrations(app):
+    '''Registers Flask-Migrate, which pulls in alembic, on `app`.'''
+    from flask_migrate import Migrate
+    from search import include_object
 
-api = Api(app)
+    Migrate(app, db, include_object=include_object)
+
+class MigrationCommands(click.Group):
+    '''`flask db`: Flask-Migrate's commands, set up on the app the first time
+    one of them is looked up rather than on every start.'''
+
+    def migrate_commands(self):
+        if 'migrate' not in current_app.extensions:
+            init_migrations(current_app)
+        from flask_migrate.cli import db as group
+        return group
+
+    def list_commands(self, ctx):
+        return self.migrate_commands().list_commands(ctx)
+
+    def get_command(self, ctx, name):
+        return self.migrate_commands().get_command(ctx, name)
+
+def build_app():
+    '''Builds this process's app from settings read from the environment.
+
+    The extensions and resources are module-level so views can use them;
+    this wires them to the app. They hold its settings and register their
+    session listeners once, so there is one app per process: the
+    module-level `app` below, and calling this again raises. Flask-Migrate
+    is only imported when a `flask db` command runs.'''
+    if globals().get('app') is not None:
+        raise RuntimeError(
+            'build_app() has already built the app of this process; '
+            'change its settings through the environment instead')
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    app.config.update(default_config())
+
+    init_database(app, db)
+
+    response_cache.init_app(app, db)
+
+    instrumentation.init_app(app, db)
+
+    search.init_app(app, db)
+
+    catalog_snapshot.init_app(app, db)
+
+    coalescer.init_app(app, db)
+
+    change_log.init_app(app, db)
+
+    app.cli.add_command(price_summaries_cli)
+    app.cli.add_command(MigrationCommands(
+        'db', help='Perform database migrations.'))
+
+    app.add_url_rule('/', 'index', index)
+    api.init_app(app)
+    return app
 
-@app.route('/')
 def index():
     return '<h1>Code challenge</h1>'
 
+def collection_response(model, fieldset, stmt=None, extra=None):
+    '''Lists `model` rows: the whole table by default, one keyset page when
+    `limit`/`after` are given, or a chunked stream when `stream` is given.
+
+    Only the columns of `fieldset` are selected, so no ORM objects are built.
+    `stmt` replaces the default column SELECT for listings that select more
+    than the fieldset; `extra` serializes the columns it adds.'''
+    try:
+        fmt = stream_format()
+        limit, after = page_args()
+    except PageArgsError as e:
+        return make_response({'errors': [str(e)]}, 400)
+    if stmt is None:
+        stmt = fieldset.select()
+
+    def to_dicts(rows):
+        return fieldset.to_dicts(rows, extra=extra)
+
+    if fmt is not None:
+        if after is not None:
+            stmt = stmt.where(model.id > after)
+        return stream_rows(stmt.order_by(model.id), to_dicts, fmt)
+    if limit is None:
+        rows = db.session.execute(stmt).all()
+        return make_response(to_dicts(rows), 200)
+    rows, next_cursor = keyset_page(stmt, model.id, limit, after)
+    return make_response(to_dicts(rows), 200, page_headers(limit, next_cursor))
+
+def list_response(model):
+    '''Lists `model` rows with the fieldset the request asked for, and their
+    price summaries when it asks for `include=price_stats`.'''
+    try:
+        fieldset = fieldset_args(model)
+        ids = ids_args()
+    except (FieldsetError, PageArgsError) as e:
+        return make_response({'errors': [str(e)]}, 400)
+    if ids is not None:
+        return lookup_response(fieldset, ids)
+    if catalog_snapshot.serves(request.args):
+        return snapshot_response(fieldset)
+    include = request.args.get('include')
+    if include is None:
+        return collection_response(model, fieldset)
+    if include != 'price_stats':
+        return make_response({'errors': ['include must be price_stats']}, 400)
+    return collection_response(
+        model, fieldset, with_price_stats(model, fieldset.columns()),
+        add_price_stats)
+
+def lookup_response(fieldset, ids):
+    '''Returns the rows of `ids` in the order asked for, and the ids that do
+    not exist under `not_found`.'''
+    include = request.args.get('include')
+    if catalog_snapshot.serves(request.args):
+        found = catalog_snapshot.get_many(fieldset, ids)
+    elif include is None:
+        found = fieldset.by_ids(ids)
+    elif include == 'price_stats':
+        found = fieldset.by_ids(
+            ids, with_price_stats(fieldset.model, fieldset.columns()),
+            add_price_stats)
+    else:
+        return make_response({'errors': ['include must be price_stats']}, 400)
+    return make_response({
+        'results': [found[id] for id in ids if id in found],
+        'not_found': [id for id in ids if id not in found],
+    }, 200)
+
+def lookup_post(model):
+    '''Answers a POST of `{"ids": [...]}`, for id lists too long for a query
+    string, like `GET` with `ids=`.'''
+    payload = request.get_json(silent=True)
+    try:
+        if not isinstance(payload, dict) or 'ids' not in payload:
+            raise PageArgsError('expected a JSON object with ids')
+        ids = id_list(payload['ids'])
+        fieldset = fieldset_args(model)
+    except (FieldsetError, PageArgsError) as e:
+        return make_response({'errors': [str(e)]}, 400)
+    return lookup_response(fieldset, ids)
+
+def snapshot_response(fieldset):
+    '''Lists the rows of `fieldset` from the in-memory catalog snapshot.'''
+    try:
+        limit, after = page_args()
+    except PageArgsError as e:
+        return make_response({'errors': [str(e)]}, 400)
+    dicts, next_cursor = catalog_snapshot.page(fieldset, after, limit)
+    return make_response(dicts, 200, page_headers(limit, next_cursor))
+
+def detail_dict(fieldset, id):
+    '''Returns one row of `fieldset` as a dict, or None when it does not
+    exist, from the catalog snapshot when it serves the request.'''
+    if catalog_snapshot.serves(request.args):
+        return catalog_snapshot.get(fieldset, id)
+    model = fieldset.model
+    row = db.session.execute(
+        fieldset.select().where(model.id == id)).one_or_none()
+    return None if row is None else fieldset.to_dicts([row])[0]
+
+def collection_tags(table):
+    tags = [table]
+    if 'include' in request.args:
+        tags.append('vendor_sweets')
+    if request.args.get('embed'):
+        tags.extend(('vendor_sweets', 'sweets', 'vendors'))
+    return tuple(dict.fromkeys(tags))
+
 class Vendors(Resource):
+    @response_cache.cached(lambda: collection_tags('vendors'))
+    @coalescer.coalesced()
     def get(self):
-        vendors = [vendor.to_dict() for vendor in Vendor.query.all()]
-        return make_response(vendors, 200)
+        return list_response(Vendor)
 api.add_resource(Vendors, "/vendors")
 
+class VendorsLookup(Resource):
+    def post(self):
+        return lookup_post(Vendor)
+api.add_resource(VendorsLookup, "/vendors/lookup")
+
 class VendorById(Resource):
+    @response_cache.cached(lambda id: ('vendor_details', f'vendor:{id}'))
+    @coalescer.coalesced()
     def get(self, id):
-        vendor = Vendor.query.filter_by(id=id).one_or_none()
-        if vendor is None:
+        # Two SELECTs however many offerings the vendor has: one for the
+        # vendor, one for its vendor_sweets joined to their sweets.
+        try:
+            fieldset = fieldset_args(Vendor, default_embeds=('vendor_sweets',))
+        except FieldsetError as e:
+            return make_response({'errors': [str(e)]}, 400)
+        vendor_dict = detail_dict(fieldset, id)
+        if vendor_dict is None:
             return make_response({'error': 'Vendor not found'}, 404)
-        vendor_dict = vendor.to_dict()
-        vendor_dict['vendor_sweets'] = [vs.to_dict() for vs in vendor.vendor_sweets]
         return make_response(vendor_dict, 200)
 api.add_resource(VendorById, "/vendors/<int:id>")
 
 class Sweets(Resource):
+    @response_cache.cached(lambda: collection_tags('sweets'))
+    @coalescer.coalesced()
     def get(self):
-        sweets = [sweet.to_dict() for sweet in Sweet.query.all()]
-        return make_response(sweets, 200)
+        return list_response(Sweet)
 api.add_resource(Sweets, "/sweets")
 
+class SweetsLookup(Resource):
+    def post(self):
+        return lookup_post(Sweet)
+api.add_resource(SweetsLookup, "/sweets/lookup")
+
+def sweet_tags(id):
+    tags = ('sweet_details', f'sweet:{id}')
+    if request.args.get('embed'):
+        tags += ('sweet_vendors', f'sweet_vendors:{id}', 'vendors')
+    return tags
+
 class SweetById(Resource):
+    @response_cache.cached(sweet_tags)
+    @coalescer.coalesced()
     def get(self, id):
-        sweet = Sweet.query.filter_by(id=id).one_or_none()
-        if sweet is None:
+        try:
+            fieldset = fieldset_args(Sweet)
+        except FieldsetError as e:
+            return make_response({'errors': [str(e)]}, 400)
+        sweet_dict = detail_dict(fieldset, id)
+        if sweet_dict is None:
             return make_response({'error': 'Sweet not found'}, 404)
-        return make_response(sweet.to_dict(), 200)
+        return make_response(sweet_dict, 200)
 api.add_resource(SweetById, "/sweets/<int:id>")
 
+class SweetVendors(Resource):
+    @response_cache.cached(lambda id: (
+        'sweet_details', f'sweet:{id}', 'vendors', 'sweet_vendors',
+        f'sweet_vendors:{id}'))
+    @coalescer.coalesced()
+    def get(self, id):
+        try:
+            limit, after = page_args()
+        except PageArgsError as e:
+            return make_response({'errors': [str(e)]}, 400)
+        if limit is None:
+            limit, after = DEFAULT_PAGE_SIZE, 0
+
+        # Price aggregates come from the sweet's summary row and the vendors
+        # from one keyset page searching ix_vendor_sweets_sweet_id.
+        fieldset = Fieldset(Sweet)
+        stats = db.session.execute(
+            with_price_stats(Sweet, fieldset.columns()).where(Sweet.id == id)
+        ).one_or_none()
+        if stats is None:
+            return make_response({'error': 'Sweet not found'}, 404)
+        sweet_dict = fieldset.to_dicts([stats], extra=add_price_stats)[0]
+        page = sweet_vendors(id)
+        rows, next_cursor = keyset_page(
+            page, page.selected_columns.vendor_sweet_id, limit, after)
+        sweet_dict['vendors'] = rows_to_dicts(rows, SWEET_VENDOR_FIELDS)
+        return make_response(sweet_dict, 200, page_headers(limit, next_cursor))
+api.add_resource(SweetVendors, "/sweets/<int:id>/vendors")
+
+class SearchResults(Resource):
+    @response_cache.cached(lambda: ('sweets', 'vendors'))
+    @coalescer.coalesced()
+    def get(self):
+        q = request.args.get('q', '').strip()
+        if not q:
+            return make_response({'errors': ['q is required']}, 400)
+        try:
+            limit, offset = offset_args(default_limit=SEARCH_PAGE_SIZE)
+        except PageArgsError as e:
+            return make_response({'errors': [str(e)]}, 400)
+        results = search.search(q, limit + 1, offset)
+        return make_response(
+            results[:limit], 200,
+            offset_headers(limit, offset, len(results) > limit))
+api.add_resource(SearchResults, "/search")
+
+class Changes(Resource):
+    def get(self):
+        try:
+            limit, since = since_args(
+                last_event_id=request.headers.get('Last-Event-ID'))
+        except PageArgsError as e:
+            return make_response({'errors': [str(e)]}, 400)
+        if request.accept_mimetypes.best == 'text/event-stream':
+            events = changes.stream_events(
+                db.engine, since, current_app.config['CHANGES_POLL_INTERVAL'],
+                lifetime=current_app.config['CHANGES_STREAM_SECONDS'])
+            return Response(stream_with_context(events), 200, {
+                'Content-Type': 'text/event-stream',
+                'Cache-Control': 'no-cache',
+            })
+
+        conn = db.session.connection()
+        entries = changes.since(conn, since, limit + 1)
+        if entries and entries[0][3] == changes.COMPACTED:
+            # Compaction dropped entries this reader has not seen yet.
+            return make_response({
+                'error': 'since is older than the change log; reload and continue from seq',
+                'seq': changes.last_seq(conn),
+            }, 410)
+        next_cursor = entries[limit - 1][0] if len(entries) > limit else None
+        return make_response(
+            changes.feed(conn, entries[:limit]), 200,
+            page_headers(limit, next_cursor, cursor='since'))
+api.add_resource(Changes, "/changes")
+
 class VendorSweets(Resource):
     def post(self):
-        fields = request.get_json()
+        fields = request.get_json(silent=True)
+        if fields is None:
+            fields = {}
+        elif not isinstance(fields, dict):
+            return make_response({"errors": ["expected a JSON object"]}, 400)
         try:
+            sweet_id = int(fields.get('sweet_id'))
+            vendor_id = int(fields.get('vendor_id'))
             vendor_sweet = VendorSweet(
                 price=fields.get('price'),
-                sweet_id=fields.get('sweet_id'),
-                vendor_id=fields.get('vendor_id'),
+                sweet_id=sweet_id,
+                vendor_id=vendor_id,
             )
-            db.session.add(vendor_sweet)
-            db.session.flush()
-            vendor_sweet_dict = vendor_sweet.to_dict()
-            sweet_obj = Sweet.query.filter_by(id=vendor_sweet.sweet_id).one()
-            vendor_obj = Vendor.query.filter_by(id=vendor_sweet.vendor_id).one()
-            vendor_sweet_dict['sweet'] = sweet_obj.to_dict()
-            vendor_sweet_dict['vendor'] = vendor_obj.to_dict()
-            db.session.commit()
-
-            return make_response(vendor_sweet_dict, 201)
-        except ValueError:
+        except (TypeError, ValueError):
             return make_response({"errors": ["validation errors"]}, 400)
 
+        # A single read validates both foreign keys and loads the rows
+        # nested in the response; the INSERT is the only other statement.
+        row = db.session.execute(
+            select(Sweet, Vendor)
+            .join(Vendor, true())
+            .where(Sweet.id == sweet_id, Vendor.id == vendor_id)
+        ).one_or_none()
+        if row is None:
+            missing = 'Sweet' if db.session.get(Sweet, sweet_id) is None else 'Vendor'
+            return make_response({'error': f'{missing} not found'}, 404)
+        sweet, vendor = row
+
+        db.session.add(vendor_sweet)
+        db.session.flush()
+        vendor_sweet_dict = vendor_sweet.to_dict()
+        vendor_sweet_dict['sweet'] = sweet.to_dict()
+        vendor_sweet_dict['vendor'] = vendor.to_dict()
+        db.session.commit()
+
+        return make_response(vendor_sweet_dict, 201)
+
     def delete(self, id):
         vendor_sweet = VendorSweet.query.filter_by(id=id).one_or_none()
         if vendor_sweet is None:
@@ -86,5 +424,33 @@ class VendorSweets(Resource):
         return make_response({}, 204)
 api.add_resource(VendorSweets, "/vendor_sweets", "/vendor_sweets/<int:id>")
 
+class VendorSweetsBulk(Resource):
+    def post(self):
+        try:
+            chunk_size = int(request.args.get(
+                'chunk_size', current_app.config['BULK_CHUNK_SIZE']))
+        except ValueError:
+            return make_response({"errors": ["chunk_size must be an integer"]}, 400)
+        chunk_size = max(1, min(chunk_size, MAX_CHUNK_SIZE))
+        try:
+            report = ingest(iter_records(request), chunk_size)
+        except BulkPayloadError as e:
+            return make_response({"errors": [str(e)]}, 400)
+        return make_response(report, 200)
+api.add_resource(VendorSweetsBulk, "/vendor_sweets/bulk")
+
+class VendorSweetsBatch(Resource):
+    def post(self):
+        try:
+            report = batch(request.get_json(silent=True))
+        except BulkPayloadError as e:
+            return make_response({"errors": [str(e)]}, 400)
+        if 'errors' in report:
+            return make_response(report, 400)
+        return make_response(report, 200)
+api.add_resource(VendorSweetsBatch, "/vendor_sweets/batch")
+
+app = build_app()
+
 if __name__ == '__main__':
     app.run(port=5555, debug=True)
\ No newline at end of file
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+'''Async ASGI entry point serving the same JSON contracts as app.py's
+Vendors, VendorById, Sweets, SweetById and VendorSweets resources.
+
+Queries run through SQLAlchemy's asyncio extension on aiosqlite, so a worker
+keeps serving other connections while SQLite works. Run it with any ASGI
+server, for example:
+
+    cd server && uvicorn asgi:app --port 5555
+'''
+import asyncio
+import json
+import os
+import re
+
+from sqlalchemy import select, true
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import selectinload
+
+from config import DATABASE, set_sqlite_pragmas, sqlite_profile
+from models import Sweet, Vendor, VendorSweet
+from serializers import dumps, model_fields, rows_to_dicts
+
+
+def async_database_uri(uri):
+    if uri.startswith('sqlite:'):
+        return 'sqlite+aiosqlite:' + uri[len('sqlite:'):]
+    return uri
+
+
+class JSONResponse:
+    def __init__(self, body, status=200):
+        self.body = b'' if status == 204 else dumps(body) + b'\n'
+        self.status = status
+
+    async def send(self, send):
+        await send({
+            'type': 'http.response.start',
+            'status': self.status,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(self.body)).encode()),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': self.body})
+
+
+class SweetsASGI:
+    '''Minimal ASGI application with a regex router over async handlers.'''
+
+    def __init__(self, database_uri=DATABASE, profile=None):
+        if profile is None:
+            profile = os.environ.get('DB_PROFILE', 'default')
+        pragmas = sqlite_profile(profile)
+        self.engine = create_async_engine(async_database_uri(database_uri))
+        set_sqlite_pragmas(self.engine.sync_engine, pragmas)
+        self.session = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.routes = [
+            ('GET', re.compile(r'/vendors'), self.vendors),
+            ('GET', re.compile(r'/vendors/(?P<id>\d+)'), self.vendor_by_id),
+            ('GET', re.compile(r'/sweets'), self.sweets),
+            ('GET', re.compile(r'/sweets/(?P<id>\d+)'), self.sweet_by_id),
+            ('POST', re.compile(r'/vendor_sweets'), self.create_vendor_sweet),
+            ('DELETE', re.compile(r'/vendor_sweets/(?P<id>\d+)'),
+             self.delete_vendor_sweet),
+        ]
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        response = await self.dispatch(scope, receive)
+        await response.send(send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def dispatch(self, scope, receive):
+        path = scope['path'].rstrip('/') or '/'
+        allowed = False
+        for method, pattern, handler in self.routes:
+            match = pattern.fullmatch(path)
+            if match is None:
+                continue
+            allowed = True
+            if method != scope['method']:
+                continue
+            kwargs = {key: int(value) for key, value in match.groupdict().items()}
+            if method == 'POST':
+                kwargs['fields'] = await self.read_json(receive)
+            return await handler(**kwargs)
+        if allowed:
+            return JSONResponse({'error': 'Method not allowed'}, 405)
+        return JSONResponse({'error': 'Not found'}, 404)
+
+    async def read_json(self, receive):
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+        try:
+            return json.loads(body)
+        except ValueError:
+            return {}
+
+    async def collection(self, model):
+        async with self.session() as session:
+            rows = (await session.execute(select(*model_fields(model)))).all()
+        return JSONResponse(rows_to_dicts(rows, model.serialize_fields))
+
+    async def vendors(self):
+        return await self.collection(Vendor)
+
+    async def sweets(self):
+        return await self.collection(Sweet)
+
+    async def vendor_by_id(self, id):
+        async with self.session() as session:
+            vendor = (await session.execute(
+                select(Vendor).options(
+                    selectinload(Vendor.vendor_sweets).joinedload(VendorSweet.sweet)
+                ).where(Vendor.id == id)
+            )).scalar_one_or_none()
+            if vendor is None:
+                return JSONResponse({'error': 'Vendor not found'}, 404)
+            vendor_dict = vendor.to_dict()
+            vendor_dict['vendor_sweets'] = [
+                dict(vs.to_dict(), sweet=vs.sweet.to_dict())
+                for vs in vendor.vendor_sweets
+            ]
+        return JSONResponse(vendor_dict)
+
+    async def sweet_by_id(self, id):
+        async with self.session() as session:
+            row = (await session.execute(
+                select(*model_fields(Sweet)).where(Sweet.id == id)
+            )).one_or_none()
+        if row is None:
+            return JSONResponse({'error': 'Sweet not found'}, 404)
+        return JSONResponse(dict(zip(Sweet.serialize_fields, row)))
+
+    async def create_vendor_sweet(self, fields):
+        if not isinstance(fields, dict):
+            return JSONResponse({'errors': ['expected a JSON object']}, 400)
+        try:
+            sweet_id = int(fields.get('sweet_id'))
+            vendor_id = int(fields.get('vendor_id'))
+            vendor_sweet = VendorSweet(
+                price=fields.get('price'),
+                sweet_id=sweet_id,
+                vendor_id=vendor_id,
+            )
+        except (TypeError, ValueError):
+            return JSONResponse({"errors": ["validation errors"]}, 400)
+
+        async with self.session() as session:
+            row = (await session.execute(
+                select(Sweet, Vendor)
+                .join(Vendor, true())
+                .where(Sweet.id == sweet_id, Vendor.id == vendor_id)
+            )).one_or_none()
+            if row is None:
+                missing = 'Sweet' if await session.get(Sweet, sweet_id) is None else 'Vendor'
+                return JSONResponse({'error': f'{missing} not found'}, 404)
+            sweet, vendor = row
+
+            session.add(vendor_sweet)
+            await session.flush()
+            vendor_sweet_dict = vendor_sweet.to_dict()
+            vendor_sweet_dict['sweet'] = sweet.to_dict()
+            vendor_sweet_dict['vendor'] = vendor.to_dict()
+            await session.commit()
+        return JSONResponse(vendor_sweet_dict, 201)
+
+    async def delete_vendor_sweet(self, id):
+        async with self.session() as session:
+            vendor_sweet = await session.get(VendorSweet, id)
+            if vendor_sweet is None:
+                return JSONResponse({'error': 'VendorSweet not found'}, 404)
+            await session.delete(vendor_sweet)
+            await session.commit()
+        return JSONResponse({}, 204)
+
+
+class TestResponse:
+    __test__ = False
+
+    def __init__(self, status_code, headers, data):
+        self.status_code = status_code
+        self.headers = headers
+        self.content_type = headers.get('content-type')
+        self.data = data
+
+    def get_data(self, as_text=False):
+        return self.data.decode() if as_text else self.data
+
+    @property
+    def json(self):
+        return json.loads(self.data)
+
+
+class TestClient:
+    '''Calls an ASGI app in-process, mirroring the parts of Flask's test
+    client used by the test suite. One event loop is kept for the client's
+    lifetime since pooled aiosqlite connections belong to a loop.'''
+
+    __test__ = False
+
+    def __init__(self, app):
+        self.app = app
+        self.loop = asyncio.new_event_loop()
+
+    def close(self):
+        self.loop.run_until_complete(self.app.engine.dispose())
+        self.loop.close()
+
+    async def request(self, method, path, json_body=None, headers=None):
+        path, _, query = path.partition('?')
+        body = b'' if json_body is None else json.dumps(json_body).encode()
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+            'method': method, 'path': path, 'raw_path': path.encode(),
+            'query_string': query.encode(), 'root_path': '',
+            'headers': [(name.lower().encode(), value.encode())
+                        for name, value in (headers or {}).items()],
+        }
+        sent = False
+        messages = []
+
+        async def receive():
+            nonlocal sent
+            if sent:
+                return {'type': 'http.disconnect'}
+            sent = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        await self.app(scope, receive, send)
+        start = messages[0]
+        response_headers = {name.decode(): value.decode()
+                            for name, value in start['headers']}
+        data = b''.join(m.get('body', b'') for m in messages[1:])
+        return TestResponse(start['status'], response_headers, data)
+
+    def open(self, path, method='GET', json=None, headers=None):
+        return self.loop.run_until_complete(
+            self.request(method, path, json, headers))
+
+    def get(self, path, **kwargs):
+        return self.open(path, 'GET', **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.open(path, 'POST', **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.open(path, 'DELETE', **kwargs)
+
+
+app = SweetsASGI()
@@ -0,0 +1,84 @@
+'''Concurrent-connection throughput of the Flask app (one thread per
+connection) versus the ASGI app in asgi.py (one task per connection).
+
+    cd server && python -m benchmarks.asgi_concurrency --connections 64
+
+Both apps run in-process against the same seeded database. Each connection
+issues --requests GET /vendors/<id> requests back to back. The response cache
+is disabled so every request reaches SQLite.
+'''
+import argparse
+import asyncio
+import os
+import random
+import threading
+import time
+
+from benchmarks.common import use_temporary_database
+
+
+def run_wsgi(app, connections, requests, vendors):
+    def connection(seed):
+        rng = random.Random(seed)
+        client = app.test_client()
+        for _ in range(requests):
+            client.get(f'/vendors/{rng.randint(1, vendors)}').get_data()
+
+    threads = [threading.Thread(target=connection, args=(i,)) for i in range(connections)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def run_asgi(client, connections, requests, vendors):
+    async def connection(seed):
+        rng = random.Random(seed)
+        for _ in range(requests):
+            await client.request('GET', f'/vendors/{rng.randint(1, vendors)}')
+
+    async def main():
+        await asyncio.gather(*(connection(i) for i in range(connections)))
+
+    start = time.perf_counter()
+    client.loop.run_until_complete(main())
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--connections', type=int, default=64)
+    parser.add_argument('--requests', type=int, default=50,
+                        help='requests per connection')
+    parser.add_argument('--vendors', type=int, default=10000)
+    args = parser.parse_args()
+
+    path = use_temporary_database()
+    os.environ['RESPONSE_CACHE'] = '0'
+    from app import app
+    from asgi import SweetsASGI, TestClient
+    from models import db
+    from seed import load_catalog
+
+    with app.app_context():
+        db.create_all()
+        load_catalog(db.engine, args.vendors, args.vendors)
+    asgi_client = TestClient(SweetsASGI(os.environ['DB_URI']))
+
+    total = args.connections * args.requests
+    results = {
+        'wsgi (threads)': run_wsgi(app, args.connections, args.requests, args.vendors),
+        'asgi (asyncio)': run_asgi(asgi_client, args.connections, args.requests, args.vendors),
+    }
+    asgi_client.close()
+    os.remove(path)
+
+    print(f'{args.connections} connections x {args.requests} requests')
+    for name, seconds in results.items():
+        print(f'{name:<16} {total / seconds:>10,.0f} req/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+'''Deleting and repricing vendor_sweets one request at a time against one
+POST /vendor_sweets/batch.
+
+    cd server && python -m benchmarks.batch --rows 2000
+
+Requests go through the Flask test client with the response cache on, so
+the numbers include routing, SQL, the summary triggers and commits.
+'''
+import argparse
+import os
+import time
+
+from sqlalchemy import insert, select
+
+from benchmarks.common import use_temporary_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=2000,
+                        help='vendor_sweets to delete and reprice per run')
+    args = parser.parse_args()
+
+    path = use_temporary_database()
+    from app import app
+    from models import db, Sweet, Vendor, VendorSweet
+
+    def seed_rows():
+        ids = db.session.scalars(
+            insert(VendorSweet).returning(VendorSweet.id),
+            [{'sweet_id': i % 100 + 1, 'vendor_id': i % 100 + 1, 'price': i % 500}
+             for i in range(args.rows)],
+        ).all()
+        db.session.commit()
+        return ids
+
+    results = {}
+    with app.app_context():
+        db.create_all()
+        db.session.execute(insert(Vendor), [{'name': f'Vendor {i}'} for i in range(100)])
+        db.session.execute(insert(Sweet), [{'name': f'Sweet {i}'} for i in range(100)])
+        db.session.commit()
+        client = app.test_client()
+
+        ids = seed_rows()
+        start = time.perf_counter()
+        for id in ids:
+            client.delete(f'/vendor_sweets/{id}')
+        results['delete_one_by_one_s'] = time.perf_counter() - start
+
+        ids = seed_rows()
+        start = time.perf_counter()
+        response = client.post('/vendor_sweets/batch', json={'delete': ids})
+        results['delete_batch_s'] = time.perf_counter() - start
+        assert len(response.json['deleted']) == args.rows
+
+        # There is no single-row reprice endpoint, so the baseline is one ORM
+        # load, update and commit per row, as VendorSweets.delete does.
+        ids = seed_rows()
+        start = time.perf_counter()
+        for id in ids:
+            vendor_sweet = VendorSweet.query.filter_by(id=id).one_or_none()
+            vendor_sweet.price += 1
+            db.session.commit()
+        results['reprice_one_by_one_s'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        response = client.post('/vendor_sweets/batch', json={
+            'update': [{'id': id, 'price': 1} for id in ids]})
+        results['reprice_batch_s'] = time.perf_counter() - start
+        assert len(response.json['updated']) == args.rows
+        assert set(db.session.scalars(select(VendorSweet.price))) == {1}
+
+    os.remove(path)
+    print({'rows': args.rows, **{k: round(v, 3) for k, v in results.items()}})
+
+
+if __name__ == '__main__':
+    main()
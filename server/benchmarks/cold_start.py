@@ -0,0 +1,72 @@
+'''Cold start: time from interpreter launch to the first served request, and
+the slowest imports on the way.
+
+    cd server && python -m benchmarks.cold_start --runs 10
+
+Each run is a fresh `python` process that imports app and serves one
+GET /vendors/1 through the test client. The import breakdown comes from
+`python -X importtime -c "import app"`, as the startup test reads it.
+'''
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.common import use_temporary_database
+
+FIRST_REQUEST = (
+    'from app import app; '
+    'assert app.test_client().get("/vendors/1").status_code in (200, 404)'
+)
+
+
+def import_times(module='app', cwd=None):
+    '''Returns {module: cumulative microseconds} for every module imported
+    by `import module`, from `-X importtime`.'''
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, check=True, cwd=cwd)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--top', type=int, default=10,
+                        help='slowest imports to list')
+    args = parser.parse_args()
+
+    path = use_temporary_database()
+    subprocess.run(
+        [sys.executable, '-c',
+         'from app import app, db\nwith app.app_context(): db.create_all()'],
+        check=True)
+
+    timings = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', FIRST_REQUEST], check=True)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    times = import_times()
+    os.remove(path)
+
+    print(f'first request: p50 {statistics.median(timings):.0f} ms, '
+          f'min {min(timings):.0f} ms over {args.runs} runs')
+    print(f'import app: {times["app"] / 1000:.0f} ms')
+    direct = {name: us for name, us in times.items()
+              if name != 'app' and '.' not in name}
+    for name, us in sorted(direct.items(), key=lambda item: -item[1])[:args.top]:
+        print(f'  {name:<24} {us / 1000:>7.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,23 @@
+import os
+import tempfile
+import time
+
+
+def use_temporary_database():
+    '''Points the app at a fresh SQLite file. Must run before `app` is
+    imported, since the app reads DB_URI at import time.'''
+    fd, path = tempfile.mkstemp(suffix='.db', prefix='bench-')
+    os.close(fd)
+    os.environ['DB_URI'] = f'sqlite:///{path}'
+    return path
+
+
+def best_of(fn, repeat=5):
+    '''Returns the fastest of `repeat` timed calls to `fn`, in seconds.'''
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
@@ -0,0 +1,307 @@
+'''Replays request mixes at a given concurrency and reports latency, RPS and
+SQL query counts per endpoint as JSON.
+
+    cd server && python -m benchmarks.load --vendors 100000 --concurrency 8 \\
+        --mix ../challenge-3-sweets.postman_collection.json \\
+        --mix benchmarks/mixes/read_heavy.jsonl --output results.json
+
+By default requests go through the Flask test client against a freshly
+seeded throwaway database. --serve starts the app on a threaded WSGI server
+and sends real HTTP requests. --url targets an already running server, in
+which case nothing is seeded and query counts are not available.
+
+A mix is either a Postman collection or a JSONL file with one request per
+line: {"method": "GET", "path": "/vendors/1", "body": null, "weight": 5}.
+Numeric ids in paths are replaced by random ids within the seeded range
+unless --fixed-ids is given.
+'''
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict, namedtuple
+from urllib.parse import urlsplit
+
+from benchmarks.common import use_temporary_database
+
+Request = namedtuple('Request', 'method path body weight')
+
+ID_SEGMENT = re.compile(r'/\d+(?=/|$|\?)')
+
+
+def load_postman(path):
+    with open(path) as f:
+        collection = json.load(f)
+    requests = []
+    for item in collection['item']:
+        request = item['request']
+        url = urlsplit(request['url']['raw'])
+        body = request.get('body', {}).get('raw')
+        requests.append(Request(
+            request['method'],
+            url.path + (f'?{url.query}' if url.query else ''),
+            json.loads(body) if body else None,
+            1,
+        ))
+    return requests
+
+
+def load_jsonl(path):
+    requests = []
+    with open(path) as f:
+        for number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if 'method' not in entry or 'path' not in entry:
+                raise ValueError(f'{path}:{number}: expected "method" and "path"')
+            requests.append(Request(
+                entry['method'].upper(), entry['path'],
+                entry.get('body'), entry.get('weight', 1)))
+    return requests
+
+
+def load_mix(path):
+    if path.endswith('.jsonl'):
+        return load_jsonl(path)
+    return load_postman(path)
+
+
+def endpoint_key(method, path):
+    return f'{method} {ID_SEGMENT.sub("/<id>", path.split("?")[0])}'
+
+
+def randomize_ids(path, rng, max_id):
+    return ID_SEGMENT.sub(lambda m: f'/{rng.randint(1, max_id)}', path)
+
+
+class ClientTarget:
+    '''Sends requests through the Flask test client, one client per thread.'''
+
+    def __init__(self, app):
+        self.app = app
+        self.local = threading.local()
+
+    def send(self, method, path, body):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+        response = client.open(path, method=method, json=body)
+        response.get_data()
+        return response.status_code
+
+
+class HTTPTarget:
+    '''Sends real HTTP requests to `base_url`.'''
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def send(self, method, path, body):
+        data = None if body is None else json.dumps(body).encode()
+        request = urllib.request.Request(
+            self.base_url + path, data=data, method=method,
+            headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+
+def serve_in_background(app):
+    from werkzeug.serving import make_server
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+class QueryCounter:
+    '''Counts SQL statements per request through Flask's request signals.'''
+
+    def __init__(self, app, engine):
+        from flask import request, request_started, request_finished
+        from sqlalchemy import event
+
+        self.counts = defaultdict(list)
+        self.local = threading.local()
+
+        def started(sender, **extra):
+            self.local.count = 0
+
+        def execute(*args):
+            self.local.count = getattr(self.local, 'count', 0) + 1
+
+        def finished(sender, response, **extra):
+            key = endpoint_key(request.method, request.path)
+            self.counts[key].append(getattr(self.local, 'count', 0))
+
+        # blinker only holds weak references to receivers.
+        self._hooks = (started, finished)
+        request_started.connect(started, app)
+        request_finished.connect(finished, app)
+        event.listen(engine, 'before_cursor_execute', execute)
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, round(p / 100 * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+def run(target, mix, concurrency, duration, requests_per_worker, max_id, seed):
+    '''Runs `concurrency` workers replaying `mix` and returns the latencies and
+    statuses recorded per endpoint.'''
+    latencies = defaultdict(list)
+    statuses = defaultdict(lambda: defaultdict(int))
+    lock = threading.Lock()
+    weights = [request.weight for request in mix]
+    deadline = time.perf_counter() + duration if duration else None
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        sent = 0
+        local = []
+        while True:
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            if deadline is None and sent >= requests_per_worker:
+                break
+            request = rng.choices(mix, weights)[0]
+            path = request.path if max_id is None else randomize_ids(
+                request.path, rng, max_id)
+            start = time.perf_counter()
+            status = target.send(request.method, path, request.body)
+            local.append((endpoint_key(request.method, path),
+                          time.perf_counter() - start, status))
+            sent += 1
+        with lock:
+            for key, latency, status in local:
+                latencies[key].append(latency)
+                statuses[key][status] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, statuses, time.perf_counter() - start
+
+
+def summarize(latencies, statuses, elapsed, query_counts=None):
+    endpoints = {}
+    for key in sorted(latencies):
+        values = sorted(latencies[key])
+        summary = {
+            'requests': len(values),
+            'rps': len(values) / elapsed,
+            'p50_ms': percentile(values, 50) * 1000,
+            'p95_ms': percentile(values, 95) * 1000,
+            'p99_ms': percentile(values, 99) * 1000,
+            'statuses': dict(statuses[key]),
+        }
+        if query_counts is not None and query_counts.get(key):
+            summary['queries_per_request'] = statistics.mean(query_counts[key])
+        endpoints[key] = summary
+    everything = sorted(v for values in latencies.values() for v in values)
+    return {
+        'elapsed_s': elapsed,
+        'requests': len(everything),
+        'rps': len(everything) / elapsed,
+        'p50_ms': percentile(everything, 50) * 1000,
+        'p95_ms': percentile(everything, 95) * 1000,
+        'p99_ms': percentile(everything, 99) * 1000,
+        'endpoints': endpoints,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mix', action='append', default=[],
+                        help='Postman collection or JSONL mix; may repeat')
+    parser.add_argument('--vendors', type=int, default=1000,
+                        help='vendors and sweets to seed (offerings = 5x)')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=500,
+                        help='requests per worker when --duration is not set')
+    parser.add_argument('--duration', type=float, help='seconds to run for')
+    parser.add_argument('--warmup', type=int, default=0,
+                        help='requests per worker to send before measuring')
+    parser.add_argument('--serve', action='store_true',
+                        help='serve the app over HTTP on a threaded WSGI server')
+    parser.add_argument('--url', help='benchmark an already running server')
+    parser.add_argument('--fixed-ids', action='store_true')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the JSON report here')
+    args = parser.parse_args()
+
+    args.mix = args.mix or [
+        os.path.join(os.path.dirname(__file__), 'mixes', 'read_heavy.jsonl')]
+    mix = [request for path in args.mix for request in load_mix(path)]
+
+    query_counter = None
+    server = None
+    path = None
+    if args.url:
+        target = HTTPTarget(args.url)
+    else:
+        path = use_temporary_database()
+        from app import app
+        from models import db
+        from seed import load_catalog
+        with app.app_context():
+            db.create_all()
+            load_catalog(db.engine, args.vendors, args.vendors, seed=args.seed)
+            query_counter = QueryCounter(app, db.engine)
+        if args.serve:
+            server, base_url = serve_in_background(app)
+            target = HTTPTarget(base_url)
+        else:
+            target = ClientTarget(app)
+
+    max_id = None if args.fixed_ids else args.vendors
+    if args.warmup:
+        run(target, mix, args.concurrency, None, args.warmup, max_id, args.seed)
+        if query_counter is not None:
+            query_counter.counts.clear()
+    latencies, statuses, elapsed = run(
+        target, mix, args.concurrency, args.duration, args.requests, max_id,
+        args.seed + 1)
+
+    report = {
+        'config': {
+            'mix': args.mix, 'vendors': args.vendors,
+            'concurrency': args.concurrency,
+            'target': args.url or ('wsgi' if args.serve else 'test_client'),
+            'db_profile': os.environ.get('DB_PROFILE', 'default'),
+            'response_cache': os.environ.get('RESPONSE_CACHE', '1') != '0',
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        },
+        **summarize(latencies, statuses, elapsed,
+                    query_counter.counts if query_counter else None),
+    }
+    if server is not None:
+        server.shutdown()
+    if path is not None:
+        os.remove(path)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
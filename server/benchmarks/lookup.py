@@ -0,0 +1,73 @@
+'''Fetching a list of vendors or sweets one GET /<collection>/<id> at a time
+against one GET ?ids= or POST /<collection>/lookup.
+
+    cd server && python -m benchmarks.lookup --vendors 10000 --ids 50 100 200
+
+Requests go through the Flask test client with the response cache off, so
+every request reaches SQLite. Ids are drawn at random, a tenth of them
+missing, and each timing is the best of --repeat runs.
+'''
+import argparse
+import os
+import random
+
+from benchmarks.common import best_of, use_temporary_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--vendors', type=int, default=10000)
+    parser.add_argument('--ids', type=int, nargs='+', default=[50, 100, 200])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    path = use_temporary_database()
+    os.environ['RESPONSE_CACHE'] = '0'
+    from app import app
+    from models import db
+    from seed import load_catalog
+
+    rng = random.Random(args.seed)
+    results = []
+    with app.app_context():
+        db.create_all()
+        counts = load_catalog(db.engine, args.vendors, seed=args.seed)
+        client = app.test_client()
+
+        # /vendors/<id> embeds vendor_sweets by default; lookups ask for the
+        # same so both sides return the same JSON.
+        for collection, rows, embed in (
+                ('vendors', counts['vendors'], 'embed=vendor_sweets'),
+                ('sweets', counts['sweets'], 'embed=')):
+            for n in args.ids:
+                ids = [rng.randint(1, rows) if rng.random() < 0.9 else rows + 1 + i
+                       for i in range(n)]
+                joined = ','.join(map(str, ids))
+
+                def per_id():
+                    for id in ids:
+                        client.get(f'/{collection}/{id}')
+
+                def get_ids():
+                    assert client.get(f'/{collection}?ids={joined}&{embed}').status_code == 200
+
+                def post_ids():
+                    response = client.post(f'/{collection}/lookup?{embed}', json={'ids': ids})
+                    assert response.status_code == 200
+
+                result = {'collection': collection, 'ids': n}
+                for name, fn in (('per_id_ms', per_id), ('get_ids_ms', get_ids),
+                                 ('post_lookup_ms', post_ids)):
+                    result[name] = round(best_of(fn, args.repeat) * 1000, 2)
+                result['speedup'] = round(result['per_id_ms'] / result['get_ids_ms'], 1)
+                results.append(result)
+
+    os.remove(path)
+    print(counts)
+    for result in results:
+        print(result)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+'''Search latency: FTS5 and the in-memory prefix index against LIKE scans.
+
+    cd server && python -m benchmarks.search --vendors 100000 --queries 200
+
+Queries are word prefixes drawn from the seeded names. The LIKE baseline is
+what a search over the existing tables would run: `name LIKE '%q%'` on
+sweets and vendors, which reads every row. Ranking needs every match, so
+the baseline fetches them all; `like_first_page` stops at the first 20
+unranked matches instead.
+'''
+import argparse
+import os
+import random
+import statistics
+import time
+
+from sqlalchemy import select, union_all
+
+from benchmarks.common import use_temporary_database
+
+
+def timed(fn, queries):
+    '''Returns the median and p95 milliseconds of `fn` over `queries`.'''
+    latencies = []
+    for q in queries:
+        start = time.perf_counter()
+        fn(q)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return {
+        'p50_ms': round(statistics.median(latencies), 3),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--vendors', type=int, default=100000,
+                        help='vendors and sweets to seed')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    path = use_temporary_database()
+    from app import app, search
+    from models import db, Sweet, Vendor
+    from search import terms
+    from seed import load_catalog
+
+    rng = random.Random(args.seed)
+    with app.app_context():
+        db.create_all()
+        load_catalog(db.engine, args.vendors, args.vendors, offerings=1,
+                     seed=args.seed)
+        names = db.session.scalars(select(Sweet.name).limit(1000)).all()
+        words = sorted({word for name in names for word in terms(name)})
+        queries = [
+            word[:rng.randint(3, max(3, len(word)))] for word in rng.choices(
+                words, k=args.queries)
+        ]
+
+        def like_statement(q):
+            pattern = f'%{q}%'
+            return union_all(
+                select(Sweet.id, Sweet.name).where(Sweet.name.like(pattern)),
+                select(Vendor.id, Vendor.name).where(Vendor.name.like(pattern)),
+            )
+
+        def like(q):
+            db.session.execute(like_statement(q)).all()
+
+        def like_first_page(q):
+            db.session.execute(like_statement(q).limit(20)).all()
+
+        def fts5(q):
+            search.backend = 'fts5'
+            search.search(q, 20, 0)
+
+        def memory(q):
+            search.backend = 'memory'
+            search.search(q, 20, 0)
+
+        start = time.perf_counter()
+        search.backend = 'memory'
+        search.prefix_index()
+        build_s = time.perf_counter() - start
+        memory_index = search.memory
+
+        results = {
+            'like_scan': timed(like, queries),
+            'like_first_page': timed(like_first_page, queries),
+            'fts5': timed(fts5, queries),
+            'prefix_index': dict(
+                timed(memory, queries), build_s=round(build_s, 3),
+                tokens=len(memory_index.tokens)),
+        }
+
+    os.remove(path)
+    print({'vendors': args.vendors, 'sweets': args.vendors,
+           'queries': args.queries, **results})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+'''Rows/sec of the /vendors list path: ORM objects + to_dict + the stdlib
+pretty-printing encoder versus column tuples + the fast encoder.
+
+    cd server && python -m benchmarks.serialization --rows 100000
+'''
+import argparse
+import json
+import os
+
+from benchmarks.common import best_of, use_temporary_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    path = use_temporary_database()
+    os.environ['RESPONSE_CACHE'] = '0'
+    from sqlalchemy import insert, select
+    from app import app
+    from models import db, Vendor
+    from serializers import dumps, model_fields, orjson, rows_to_dicts
+
+    with app.app_context():
+        db.create_all()
+        db.session.execute(
+            insert(Vendor), [{'name': f'Vendor {i}'} for i in range(args.rows)])
+        db.session.commit()
+
+        def orm_path():
+            vendors = [vendor.to_dict() for vendor in Vendor.query.all()]
+            json.dumps(vendors, indent=2, sort_keys=True).encode()
+            db.session.expunge_all()
+
+        def row_path():
+            rows = db.session.execute(select(*model_fields(Vendor))).all()
+            dumps(rows_to_dicts(rows, Vendor.serialize_fields))
+
+        client = app.test_client()
+
+        def endpoint():
+            client.get('/vendors')
+
+        results = {
+            'orm + to_dict + json (indent=2)': best_of(orm_path, args.repeat),
+            f'rows + {"orjson" if orjson else "json"} (compact)':
+                best_of(row_path, args.repeat),
+            'GET /vendors (test client)': best_of(endpoint, args.repeat),
+        }
+
+    os.remove(path)
+    for name, seconds in results.items():
+        print(f'{name:<40} {args.rows / seconds:>14,.0f} rows/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+'''Memory and latency of the in-memory catalog snapshot against SQL reads.
+
+    cd server && python -m benchmarks.snapshot --vendors 100000 --requests 2000
+
+Memory is measured with tracemalloc: the snapshot's records and indexes
+against the same catalog loaded as ORM objects into a session's identity
+map. Latency is measured through the Flask test client with the response
+cache disabled, so every SQL-path request reaches SQLite and every
+snapshot request polls the change log.
+'''
+import argparse
+import gc
+import os
+import random
+import statistics
+import time
+import tracemalloc
+
+from benchmarks.common import use_temporary_database
+
+
+def traced(fn):
+    '''Returns (result, MiB allocated by `fn` and still alive).'''
+    gc.collect()
+    tracemalloc.start()
+    result = fn()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, round(size / 2 ** 20, 1)
+
+
+def latencies(client, paths):
+    timings = []
+    for path in paths:
+        start = time.perf_counter()
+        response = client.get(path)
+        timings.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, path
+    timings.sort()
+    return {
+        'p50_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(timings[int(len(timings) * 0.95) - 1], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--vendors', type=int, default=100000)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    path = use_temporary_database()
+    os.environ['RESPONSE_CACHE'] = '0'
+    from app import app, catalog_snapshot
+    from models import db, Sweet, Vendor, VendorSweet
+    from seed import load_catalog
+    from snapshot import CatalogSnapshot
+
+    rng = random.Random(args.seed)
+    sweets = max(1, args.vendors // 10)
+    mixes = {
+        'vendor_by_id': [f'/vendors/{rng.randint(1, args.vendors)}'
+                         for _ in range(args.requests)],
+        'vendors_page': [f'/vendors?limit=100&after={rng.randint(0, args.vendors - 100)}'
+                         for _ in range(args.requests)],
+        'sweet_with_embed': [f'/sweets/{rng.randint(1, sweets)}?embed=vendor_sweets'
+                             for _ in range(args.requests)],
+    }
+
+    results = {}
+    with app.app_context():
+        db.create_all()
+        counts = load_catalog(db.engine, args.vendors, sweets, seed=args.seed)
+
+        def load_orm():
+            session = db.session()
+            return [session.query(model).all() for model in (Vendor, Sweet, VendorSweet)]
+
+        objects, results['orm_identity_map_mib'] = traced(load_orm)
+        del objects
+        db.session.remove()
+
+        def load_snapshot():
+            snapshot = CatalogSnapshot(app, db)
+            snapshot.refresh()
+            return snapshot
+
+        start = time.perf_counter()
+        snapshot, results['snapshot_mib'] = traced(load_snapshot)
+        results['snapshot_load_s'] = round(time.perf_counter() - start, 3)
+        del snapshot
+
+        client = app.test_client()
+        for name, paths in mixes.items():
+            catalog_snapshot.enabled = False
+            sql = latencies(client, paths)
+            catalog_snapshot.enabled = True
+            catalog_snapshot.refresh()
+            results[name] = {'sql': sql, 'snapshot': latencies(client, paths)}
+
+        # One offering repriced per refresh: the incremental path.
+        ids = db.session.scalars(db.select(VendorSweet.id).limit(200)).all()
+        timings = []
+        for id in ids:
+            db.session.execute(
+                db.update(VendorSweet).where(VendorSweet.id == id)
+                .values(price=VendorSweet.price + 1))
+            db.session.commit()
+            start = time.perf_counter()
+            catalog_snapshot.refresh()
+            timings.append((time.perf_counter() - start) * 1000)
+        results['refresh_one_change_ms'] = round(statistics.median(timings), 3)
+
+    os.remove(path)
+    print({**counts, **results})
+
+
+if __name__ == '__main__':
+    main()
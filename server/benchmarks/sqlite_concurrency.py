@@ -0,0 +1,96 @@
+'''Read throughput while a writer commits continuously, per SQLite profile.
+
+    cd server && python -m benchmarks.sqlite_concurrency --readers 8 --seconds 5
+
+Readers run the vendor detail query while one writer inserts vendor_sweets
+one transaction at a time, as VendorSweets.post does.
+'''
+import argparse
+import os
+import threading
+import time
+
+from sqlalchemy import create_engine, insert, select
+
+from benchmarks.common import use_temporary_database
+from config import SQLITE_PROFILES, engine_options, set_sqlite_pragmas
+from models import db, Vendor, Sweet, VendorSweet
+
+
+def seed(engine, vendors):
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Vendor), [{'name': f'Vendor {i}'} for i in range(vendors)])
+        conn.execute(insert(Sweet), [{'name': f'Sweet {i}'} for i in range(vendors)])
+        conn.execute(insert(VendorSweet), [
+            {'vendor_id': i % vendors + 1, 'sweet_id': i % vendors + 1, 'price': i % 500}
+            for i in range(vendors * 10)
+        ])
+
+
+def run(profile, readers, seconds, vendors):
+    path = use_temporary_database()
+    engine = create_engine(os.environ['DB_URI'], **engine_options(profile))
+    set_sqlite_pragmas(engine, SQLITE_PROFILES[profile])
+    seed(engine, vendors)
+
+    stop = threading.Event()
+    reads = [0] * readers
+    writes = [0]
+    busy = [0]
+
+    def read(slot):
+        query = select(VendorSweet.id, VendorSweet.price, Sweet.name).join(
+            Sweet, Sweet.id == VendorSweet.sweet_id)
+        vendor_id = slot
+        while not stop.is_set():
+            vendor_id = vendor_id % vendors + 1
+            try:
+                with engine.connect() as conn:
+                    conn.execute(query.where(VendorSweet.vendor_id == vendor_id)).all()
+                reads[slot] += 1
+            except Exception:
+                busy[0] += 1
+
+    def write():
+        i = 0
+        while not stop.is_set():
+            i += 1
+            try:
+                with engine.begin() as conn:
+                    conn.execute(insert(VendorSweet).values(
+                        vendor_id=i % vendors + 1, sweet_id=1, price=i % 500))
+                writes[0] += 1
+            except Exception:
+                busy[0] += 1
+
+    threads = [threading.Thread(target=read, args=(slot,)) for slot in range(readers)]
+    threads.append(threading.Thread(target=write))
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    return sum(reads) / seconds, writes[0] / seconds, busy[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--vendors', type=int, default=1000)
+    args = parser.parse_args()
+
+    print(f'{"profile":<12} {"reads/s":>10} {"writes/s":>10} {"errors":>8}')
+    for profile in SQLITE_PROFILES:
+        reads, writes, errors = run(profile, args.readers, args.seconds, args.vendors)
+        print(f'{profile:<12} {reads:>10,.0f} {writes:>10,.0f} {errors:>8}')
+
+
+if __name__ == '__main__':
+    main()
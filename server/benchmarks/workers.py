@@ -0,0 +1,115 @@
+'''Throughput of gunicorn with gunicorn.conf.py from 1 worker up to one per
+core.
+
+    cd server && python -m benchmarks.workers --vendors 10000 --requests 2000
+
+For each worker count a gunicorn master is started on a free port against
+the same seeded database. --clients processes then send GET /vendors/<id>
+requests over fresh HTTP connections, since sync workers close them after
+each response. The response cache is disabled so every request reaches
+SQLite. The clients share the machine with the workers, so scaling flattens
+before the core count on small machines.
+'''
+import argparse
+import http.client
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks.common import use_temporary_database
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_serving(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'gunicorn did not listen on port {port}')
+
+
+def client(port, requests, vendors, seed):
+    rng = random.Random(seed)
+    for _ in range(requests):
+        conn = http.client.HTTPConnection('127.0.0.1', port)
+        conn.request('GET', f'/vendors/{rng.randint(1, vendors)}')
+        response = conn.getresponse()
+        response.read()
+        assert response.status == 200
+        conn.close()
+
+
+def run(workers, args):
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+         '--workers', str(workers), '--bind', f'127.0.0.1:{port}',
+         '--log-level', 'warning', 'app:app'],
+        env=dict(os.environ, RESPONSE_CACHE='0'),
+    )
+    try:
+        wait_until_serving(port)
+        per_client = args.requests // args.clients
+        with ProcessPoolExecutor(args.clients) as pool:
+            start = time.perf_counter()
+            futures = [
+                pool.submit(client, port, per_client, args.vendors, seed)
+                for seed in range(args.clients)
+            ]
+            for future in futures:
+                future.result()
+            seconds = time.perf_counter() - start
+        return per_client * args.clients / seconds
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    cores = multiprocessing.cpu_count()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--vendors', type=int, default=10000)
+    parser.add_argument('--requests', type=int, default=2000,
+                        help='requests per worker count')
+    parser.add_argument('--clients', type=int, default=max(4, cores * 2),
+                        help='client processes sending requests')
+    parser.add_argument('--max-workers', type=int, default=cores)
+    args = parser.parse_args()
+
+    path = use_temporary_database()
+    from app import app
+    from models import db
+    from seed import load_catalog
+
+    with app.app_context():
+        db.create_all()
+        load_catalog(db.engine, args.vendors, args.vendors)
+        db.engine.dispose()
+
+    counts = sorted({1, args.max_workers} | {
+        2 ** i for i in range(args.max_workers.bit_length())
+        if 2 ** i <= args.max_workers})
+    results = {workers: run(workers, args) for workers in counts}
+    os.remove(path)
+
+    print(f'{cores} cores, {args.clients} clients, {args.requests} requests')
+    for workers, rps in results.items():
+        print(f'{workers:>3} workers {rps:>10,.0f} req/s '
+              f'{rps / results[1]:>5.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+import json
+from itertools import islice
+
+from sqlalchemy import case, delete, insert, select, update
+
+from models import db, Sweet, Vendor, VendorSweet
+
+DEFAULT_CHUNK_SIZE = 1000
+MAX_CHUNK_SIZE = 10000
+# Ids per IN list, well under SQLite's limit on bound parameters.
+ID_CHUNK_SIZE = 500
+# SQLite stores INTEGER in 8 bytes; binding anything wider raises OverflowError.
+MIN_INTEGER, MAX_INTEGER = -2 ** 63, 2 ** 63 - 1
+
+
+class BulkPayloadError(ValueError):
+    pass
+
+
+def iter_records(req):
+    '''Yields the offerings posted to the bulk endpoint, either as one JSON
+    array or as NDJSON read line by line from the request stream. A malformed
+    NDJSON line is yielded as None so it is reported like any invalid row.'''
+    if req.mimetype == 'application/x-ndjson':
+        for line in req.stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None
+        return
+    records = req.get_json(silent=True)
+    if not isinstance(records, list):
+        raise BulkPayloadError('expected a JSON array of vendor sweets')
+    yield from records
+
+
+def _integer(value):
+    '''Returns `value` unchanged, raising ValueError for ints SQLite cannot
+    store.'''
+    if isinstance(value, int) and not MIN_INTEGER <= value <= MAX_INTEGER:
+        raise ValueError('integer out of range')
+    return value
+
+
+def _check_record(record):
+    '''Returns the insert mapping for one record, raising ValueError or
+    TypeError with the same price rules as VendorSweet.validate_price.'''
+    if not isinstance(record, dict):
+        raise ValueError('expected an object')
+    return {
+        'price': _integer(VendorSweet.check_price(record.get('price'))),
+        'sweet_id': _integer(int(record.get('sweet_id'))),
+        'vendor_id': _integer(int(record.get('vendor_id'))),
+    }
+
+
+def _existing_ids(model, ids):
+    existing = set()
+    for chunk in id_chunks(ids):
+        existing.update(db.session.scalars(select(model.id).where(model.id.in_(chunk))))
+    return existing
+
+
+def _ingest_chunk(chunk, results):
+    valid = []
+    for index, record in chunk:
+        try:
+            valid.append((index, _check_record(record)))
+        except (TypeError, ValueError):
+            results.append({'index': index, 'errors': ['validation errors']})
+
+    # One set-based lookup per referenced table for the whole chunk.
+    sweet_ids = _existing_ids(Sweet, {row['sweet_id'] for _, row in valid})
+    vendor_ids = _existing_ids(Vendor, {row['vendor_id'] for _, row in valid})
+
+    rows = []
+    for index, row in valid:
+        errors = []
+        if row['sweet_id'] not in sweet_ids:
+            errors.append('Sweet not found')
+        if row['vendor_id'] not in vendor_ids:
+            errors.append('Vendor not found')
+        if errors:
+            results.append({'index': index, 'errors': errors})
+        else:
+            rows.append((index, row))
+
+    if rows:
+        ids = db.session.scalars(
+            insert(VendorSweet).returning(
+                VendorSweet.id, sort_by_parameter_order=True),
+            [row for _, row in rows],
+        ).all()
+        results.extend(
+            {'index': index, 'id': id} for (index, _), id in zip(rows, ids))
+    db.session.commit()
+    return len(rows)
+
+
+def ingest(records, chunk_size=DEFAULT_CHUNK_SIZE):
+    '''Inserts `records` in chunks of `chunk_size`, committing once per chunk.
+
+    Returns a report with one entry per record, in input order, holding
+    either the new id or the reasons the record was rejected.'''
+    results = []
+    created = 0
+    indexed = enumerate(records)
+    while True:
+        chunk = list(islice(indexed, chunk_size))
+        if not chunk:
+            break
+        created += _ingest_chunk(chunk, results)
+    results.sort(key=lambda result: result['index'])
+    return {
+        'created': created,
+        'failed': len(results) - created,
+        'results': results,
+    }
+
+
+def id_chunks(items, size=ID_CHUNK_SIZE):
+    items = iter(items)
+    while chunk := list(islice(items, size)):
+        yield chunk
+
+
+def _ids(values, name):
+    if not isinstance(values, list):
+        raise BulkPayloadError(f'{name} must be a list')
+    try:
+        return list(dict.fromkeys(_integer(int(value)) for value in values))
+    except (TypeError, ValueError):
+        raise BulkPayloadError(f'{name} must be a list of ids')
+
+
+def _check_update(record):
+    if not isinstance(record, dict):
+        raise ValueError('expected an object')
+    return (_integer(int(record.get('id'))),
+            _integer(VendorSweet.check_price(record.get('price'))))
+
+
+def _delete_ids(ids):
+    deleted = []
+    for chunk in id_chunks(ids):
+        deleted.extend(db.session.scalars(
+            delete(VendorSweet).where(VendorSweet.id.in_(chunk))
+            .returning(VendorSweet.id)))
+    return deleted
+
+
+def _reprice(prices):
+    updated = []
+    for chunk in id_chunks(prices.items()):
+        chunk = dict(chunk)
+        updated.extend(db.session.scalars(
+            update(VendorSweet)
+            .where(VendorSweet.id.in_(chunk))
+            .values(price=case(chunk, value=VendorSweet.id))
+            .returning(VendorSweet.id)))
+    return updated
+
+
+def batch(payload):
+    """Applies `{"delete": [id], "update": [{id, price}], "create": [row]}`
+    in one transaction: deletes first, then updates, then creates.
+
+    Each kind runs as set-based statements, one per ID_CHUNK_SIZE ids, with
+    RETURNING telling which ids existed. Ids that did not are reported
+    under `not_found` and do not fail the batch. Any invalid update or
+    create rejects the whole batch, and its errors are returned with
+    nothing applied."""
+    if not isinstance(payload, dict):
+        raise BulkPayloadError('expected a JSON object')
+    unknown = set(payload) - {'delete', 'update', 'create'}
+    if unknown:
+        raise BulkPayloadError(f'unknown keys: {", ".join(sorted(unknown))}')
+    delete_ids = _ids(payload.get('delete', []), 'delete')
+    updates = payload.get('update', [])
+    creates = payload.get('create', [])
+    if not isinstance(updates, list) or not isinstance(creates, list):
+        raise BulkPayloadError('update and create must be lists')
+
+    errors = []
+    prices = {}
+    for index, record in enumerate(updates):
+        try:
+            id, price = _check_update(record)
+            prices[id] = price
+        except (TypeError, ValueError):
+            errors.append({'update': index, 'errors': ['validation errors']})
+    rows = []
+    for index, record in enumerate(creates):
+        try:
+            rows.append((index, _check_record(record)))
+        except (TypeError, ValueError):
+            errors.append({'create': index, 'errors': ['validation errors']})
+    if rows:
+        sweet_ids = _existing_ids(Sweet, {row['sweet_id'] for _, row in rows})
+        vendor_ids = _existing_ids(Vendor, {row['vendor_id'] for _, row in rows})
+        for index, row in rows:
+            missing = []
+            if row['sweet_id'] not in sweet_ids:
+                missing.append('Sweet not found')
+            if row['vendor_id'] not in vendor_ids:
+                missing.append('Vendor not found')
+            if missing:
+                errors.append({'create': index, 'errors': missing})
+    if errors:
+        return {'errors': errors}
+
+    deleted = _delete_ids(delete_ids)
+    updated = _reprice(prices)
+    created = []
+    if rows:
+        created = db.session.scalars(
+            insert(VendorSweet).returning(
+                VendorSweet.id, sort_by_parameter_order=True),
+            [row for _, row in rows],
+        ).all()
+    db.session.commit()
+
+    deleted_set, updated_set = set(deleted), set(updated)
+    return {
+        'deleted': sorted(deleted),
+        'updated': sorted(updated),
+        'created': created,
+        'not_found': {
+            'delete': [id for id in delete_ids if id not in deleted_set],
+            'update': [id for id in prices if id not in updated_set],
+        },
+    }
@@ -0,0 +1,331 @@
+import hashlib
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import wraps
+
+from flask import request, Response
+from sqlalchemy import event, inspect
+
+import changes
+from models import Sweet, Vendor, VendorSweet
+
+# Tags whose version is bumped when any row of a table changes and the
+# individual rows are not known (bulk UPDATE/DELETE statements).
+TABLE_TAGS = {
+    'vendors': ('vendors', 'vendor_details'),
+    'sweets': ('sweets', 'sweet_details', 'vendor_details'),
+    'vendor_sweets': ('vendor_sweets', 'vendor_details', 'sweet_vendors'),
+}
+
+
+class Cache(ABC):
+    '''Key/value store used by ResponseCache.
+
+    Every operation maps onto one Redis command (GET, SET EX, DEL, FLUSHDB,
+    GET and INCR), so a Redis-compatible client can stand in for LRUCache.
+    A version read by `version` must never go back to a value it had
+    before, or responses cached under it would be served again: an
+    external store keeps its counters out of eviction.'''
+
+    @abstractmethod
+    def get(self, key):
+        ...
+
+    @abstractmethod
+    def set(self, key, value, ttl=None):
+        ...
+
+    @abstractmethod
+    def delete(self, key):
+        ...
+
+    @abstractmethod
+    def clear(self):
+        ...
+
+    @abstractmethod
+    def version(self, name):
+        ...
+
+    @abstractmethod
+    def bump(self, name):
+        ...
+
+
+class LRUCache(Cache):
+    '''In-process LRU cache with a per-entry TTL and a cap on entries.
+
+    Version counters are capped too, at `max_versions`: once there are more,
+    the least recently bumped half is forgotten and every tag without a
+    counter reads a floor above all the forgotten versions. No version ever
+    goes back; forgetting only costs misses on entries of untracked tags.'''
+
+    def __init__(self, max_entries=1024, ttl=60, clock=time.monotonic,
+                 max_versions=65536):
+        self.max_entries = max_entries
+        self.max_versions = max_versions
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._versions = OrderedDict()
+        self._version_floor = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= self.clock():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            self._entries[key] = (self.clock() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def version(self, name):
+        with self._lock:
+            return self._versions.get(name, self._version_floor)
+
+    def bump(self, name):
+        with self._lock:
+            version = self._versions.get(name, self._version_floor) + 1
+            self._versions[name] = version
+            self._versions.move_to_end(name)
+            if len(self._versions) > self.max_versions:
+                for _ in range(len(self._versions) // 2):
+                    _, forgotten = self._versions.popitem(last=False)
+                    self._version_floor = max(self._version_floor, forgotten + 1)
+            return version
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self._entries),
+            'versions': len(self._versions),
+        }
+
+
+def body_etag(body):
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def instance_tags(obj, new=False):
+    '''Returns the tags of cached responses that a write to `obj` makes stale.
+    Only 200 responses are cached, so a new row cannot make a detail stale.'''
+    if isinstance(obj, Vendor):
+        return {'vendors'} if new else {'vendors', f'vendor:{obj.id}'}
+    if isinstance(obj, Sweet):
+        return {'sweets'} if new else {'sweets', f'sweet:{obj.id}', 'vendor_details'}
+    if isinstance(obj, VendorSweet):
+        attrs = inspect(obj).attrs
+        vendor_ids = {obj.vendor_id, *attrs.vendor_id.history.deleted}
+        sweet_ids = {obj.sweet_id, *attrs.sweet_id.history.deleted}
+        return ({'vendor_sweets'} | {f'vendor:{id}' for id in vendor_ids}
+                | {f'sweet_vendors:{id}' for id in sweet_ids})
+    return set()
+
+
+def change_tags(table_name, row_id):
+    '''Returns the tags made stale by a change log entry. Entries do not say
+    which vendor and sweet an offering belonged to, so offerings, reloads
+    and compactions stale whole tables.'''
+    if table_name == 'vendors':
+        return {'vendors', f'vendor:{row_id}'}
+    if table_name == 'sweets':
+        return {'sweets', f'sweet:{row_id}', 'vendor_details'}
+    if table_name in TABLE_TAGS:
+        return set(TABLE_TAGS[table_name])
+    return {tag for tags in TABLE_TAGS.values() for tag in tags}
+
+
+def statement_tags(orm_execute_state):
+    '''Returns the tags made stale by an INSERT/UPDATE/DELETE statement run
+    through the session, such as a bulk insert or Query.delete().'''
+    table = getattr(orm_execute_state.statement, 'table', None)
+    name = getattr(table, 'name', None)
+    if name not in TABLE_TAGS:
+        return set()
+    params = orm_execute_state.parameters
+    if name == 'vendor_sweets' and orm_execute_state.is_insert and params:
+        rows = params if isinstance(params, list) else [params]
+        if all('vendor_id' in row and 'sweet_id' in row for row in rows):
+            return ({'vendor_sweets'}
+                    | {f'vendor:{row["vendor_id"]}' for row in rows}
+                    | {f'sweet_vendors:{row["sweet_id"]}' for row in rows})
+    return set(TABLE_TAGS[name])
+
+
+class ResponseCache:
+    '''Read-through cache of serialized GET responses.
+
+    Each cached response depends on a set of tags. The cache key embeds the
+    current version of each tag, and committing a write bumps the versions
+    of the tags it touched, so stale entries are never read again and simply
+    age out of the LRU.
+
+    Session events only see the writes of this process. With
+    RESPONSE_CACHE_SYNC on, as when gunicorn runs several workers, each
+    lookup first reads the change log (changes.py) entries committed since
+    the last one, by any process, and bumps their tags too.'''
+
+    # Entries read per sync; a process further behind than this drops every
+    # table's tags at once.
+    SYNC_BATCH = 1000
+
+    def __init__(self, app=None, db=None, backend=None):
+        self.backend = backend
+        self.enabled = False
+        self.sync = False
+        self.seq = None
+        self._sync_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        app.config.setdefault('RESPONSE_CACHE_ENABLED', True)
+        app.config.setdefault('RESPONSE_CACHE_SIZE', 4096)
+        app.config.setdefault('RESPONSE_CACHE_TTL', 60)
+        app.config.setdefault('RESPONSE_CACHE_SYNC', False)
+        self.enabled = app.config['RESPONSE_CACHE_ENABLED']
+        self.sync = app.config['RESPONSE_CACHE_SYNC']
+        self.db = db
+        if self.backend is None:
+            self.backend = LRUCache(
+                max_entries=app.config['RESPONSE_CACHE_SIZE'],
+                ttl=app.config['RESPONSE_CACHE_TTL'],
+            )
+        app.extensions['response_cache'] = self
+
+        event.listen(db.session, 'after_flush', self._collect_flush)
+        event.listen(db.session, 'do_orm_execute', self._collect_statement)
+        event.listen(db.session, 'after_commit', self._invalidate)
+        event.listen(db.session, 'after_rollback', self._discard)
+
+    def _pending(self, session):
+        return session.info.setdefault('stale_cache_tags', set())
+
+    def _collect_flush(self, session, flush_context):
+        pending = self._pending(session)
+        for obj in session.new:
+            pending |= instance_tags(obj, new=True)
+        for obj in (*session.dirty, *session.deleted):
+            pending |= instance_tags(obj)
+
+    def _collect_statement(self, orm_execute_state):
+        if orm_execute_state.is_insert or orm_execute_state.is_update \
+                or orm_execute_state.is_delete:
+            self._pending(orm_execute_state.session).update(
+                statement_tags(orm_execute_state))
+
+    def _invalidate(self, session):
+        self.invalidate(*session.info.pop('stale_cache_tags', ()))
+
+    def _discard(self, session):
+        session.info.pop('stale_cache_tags', None)
+
+    def metrics(self):
+        '''Prometheus text lines for the backend's counters, if it keeps any.'''
+        stats = getattr(self.backend, 'stats', None)
+        if stats is None:
+            return []
+        lines = []
+        for name, value in stats().items():
+            kind = 'gauge' if name in ('entries', 'versions') else 'counter'
+            suffix = '' if kind == 'gauge' else '_total'
+            lines.append(f'# TYPE response_cache_{name}{suffix} {kind}')
+            lines.append(f'response_cache_{name}{suffix} {value}')
+        return lines
+
+    def invalidate(self, *tags):
+        for tag in tags:
+            self.backend.bump(tag)
+
+    def sync_changes(self):
+        '''Bumps the tags of the change log entries committed since the last
+        call, including those of other processes.'''
+        with self._sync_lock, self.db.engine.connect() as conn:
+            if self.seq is None:
+                # Nothing is cached yet, so there is nothing to make stale.
+                self.seq = changes.last_seq(conn)
+                return
+            entries = changes.since(conn, self.seq, self.SYNC_BATCH)
+            if not entries:
+                return
+            if len(entries) == self.SYNC_BATCH:
+                self.invalidate(*change_tags('*', None))
+                self.seq = changes.last_seq(conn)
+                return
+            stale = set()
+            for _, table_name, row_id, _ in entries:
+                stale |= change_tags(table_name, row_id)
+            self.invalidate(*stale)
+            self.seq = entries[-1][0]
+
+    def key(self, path, tags):
+        versions = ','.join(f'{tag}={self.backend.version(tag)}' for tag in tags)
+        return f'{path}|{versions}'
+
+    def cached(self, tags):
+        '''Caches the 200 responses of a GET view and answers conditional
+        requests. `tags` is called with the view's URL arguments and returns
+        the tags the response depends on.
+
+        Every 200 response carries a strong ETag hashed from its body and
+        stored alongside it, so an `If-None-Match` request whose response is
+        cached gets its 304 without touching the database.'''
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if 'stream' in request.args:
+                    return view(*args, **kwargs)
+                hit = None
+                if self.enabled:
+                    if self.sync:
+                        self.sync_changes()
+                    # The key is computed before the query runs, so a response
+                    # read before a concurrent commit is stored under the old
+                    # versions and never served afterwards.
+                    key = self.key(request.full_path, tags(**kwargs))
+                    hit = self.backend.get(key)
+                if hit is not None:
+                    response = Response(hit[0], 200, hit[1])
+                else:
+                    response = view(*args, **kwargs)
+                    if response.status_code != 200 or response.is_streamed:
+                        return response
+                    response.set_etag(body_etag(response.get_data()))
+                    if self.enabled:
+                        headers = [
+                            (name, value) for name, value in response.headers
+                            if name != 'Content-Length'
+                        ]
+                        self.backend.set(key, (response.get_data(), headers))
+                return response.make_conditional(request)
+            return wrapper
+        return decorator
@@ -0,0 +1,249 @@
+'''Change log of the catalog tables.
+
+SQLite triggers on vendors, sweets and vendor_sweets append one `changes`
+row per inserted, updated or deleted row, in the same transaction as the
+write, whichever code path makes it. `seq` is an AUTOINCREMENT key, so it
+only grows, even once old entries are deleted. A reader remembers the last
+seq it applied and asks for the entries after it.
+
+Bulk loads drop the triggers and append a single `reload` entry instead,
+telling readers to start over from the tables.
+
+Compaction keeps the table bounded. Entries superseded by a later entry for
+the same row are dropped, which loses nothing since readers fetch a row's
+current state. Entries more than CHANGES_RETENTION behind the newest are
+dropped too, and a `compacted` entry is left at the highest seq removed:
+a reader behind it has missed changes and must start over. Compaction
+runs outside requests, from a scheduled command:
+
+    flask changes compact            # e.g. hourly from cron
+'''
+import time
+from contextlib import contextmanager
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import DDL, delete, event, func, insert, select
+
+from bulk import id_chunks
+from models import db, Change, Sweet, Vendor, VendorSweet
+from serializers import dumps, model_fields, rows_to_dicts
+
+TABLES = ('vendors', 'sweets', 'vendor_sweets')
+MODELS = {model.__tablename__: model for model in (Vendor, Sweet, VendorSweet)}
+
+RELOAD = 'reload'
+COMPACTED = 'compacted'
+
+DEFAULT_RETENTION = 100000
+# Under gunicorn's default 30 second worker timeout.
+DEFAULT_STREAM_SECONDS = 25.0
+
+TRIGGERS = {
+    'insert': ('AFTER INSERT', 'NEW'),
+    'update': ('AFTER UPDATE', 'NEW'),
+    'delete': ('AFTER DELETE', 'OLD'),
+}
+
+
+def trigger_ddl():
+    '''Returns (name, CREATE TRIGGER statement) for every change trigger.'''
+    statements = []
+    for table in TABLES:
+        for op, (timing, row) in TRIGGERS.items():
+            name = f'{table}_changes_{op}'
+            statements.append((name, (
+                f'CREATE TRIGGER {name} {timing} ON {table} BEGIN\n'
+                f"    INSERT INTO changes (table_name, row_id, op) "
+                f"VALUES ('{table}', {row}.id, '{op}');\nEND")))
+    return statements
+
+
+def create_triggers(conn):
+    for name, statement in trigger_ddl():
+        conn.execute(DDL(statement))
+
+
+def drop_triggers(conn):
+    for name, statement in trigger_ddl():
+        conn.execute(DDL(f'DROP TRIGGER IF EXISTS {name}'))
+
+
+def record_reload(conn):
+    conn.execute(insert(Change).values(table_name='*', op=RELOAD))
+
+
+def last_seq(conn):
+    return conn.execute(select(func.coalesce(func.max(Change.seq), 0))).scalar()
+
+
+def since(conn, seq, limit=None):
+    '''Returns the (seq, table_name, row_id, op) entries after `seq`.'''
+    stmt = (
+        select(Change.seq, Change.table_name, Change.row_id, Change.op)
+        .where(Change.seq > seq)
+        .order_by(Change.seq)
+    )
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return conn.execute(stmt).all()
+
+
+def rows_by_id(conn, table_name, ids):
+    '''Returns {id: current row dict} for the `ids` still in `table_name`.'''
+    model = MODELS[table_name]
+    rows = {}
+    for chunk in id_chunks(sorted(ids)):
+        for d in rows_to_dicts(
+                conn.execute(select(*model_fields(model)).where(model.id.in_(chunk))),
+                model.serialize_fields):
+            rows[d['id']] = d
+    return rows
+
+
+def feed(conn, entries):
+    '''Serializes log entries for clients, each with the current state of
+    its row, or None once the row is deleted.'''
+    ids = {}
+    for _, table_name, row_id, op in entries:
+        if table_name in MODELS:
+            ids.setdefault(table_name, set()).add(row_id)
+    rows = {
+        table_name: rows_by_id(conn, table_name, table_ids)
+        for table_name, table_ids in ids.items()
+    }
+    return [
+        {
+            'seq': seq,
+            'table': table_name if table_name in MODELS else None,
+            'id': row_id,
+            'op': op,
+            'row': rows.get(table_name, {}).get(row_id),
+        }
+        for seq, table_name, row_id, op in entries
+    ]
+
+
+def stream_events(engine, seq, poll_interval=1.0, heartbeat=15.0,
+                  batch_size=500, lifetime=DEFAULT_STREAM_SECONDS):
+    '''Yields the log after `seq` as Server-Sent Events, then waits for new
+    entries, polling every `poll_interval` seconds, for `lifetime` seconds.
+
+    Each entry is a `change` event whose id is its seq, so the EventSource
+    reconnects after the stream ends (or drops) and resumes from
+    Last-Event-ID. Ending the stream keeps it under the worker timeout and
+    frees the worker. A reader that fell behind compaction gets a `reset`
+    event carrying the seq to continue from after reloading. Comments are
+    sent every `heartbeat` idle seconds.'''
+    yield b'retry: 2000\n\n'
+    deadline = time.monotonic() + lifetime
+    idle = 0.0
+    while True:
+        with engine.connect() as conn:
+            entries = since(conn, seq, batch_size)
+            if entries and entries[0][3] == COMPACTED:
+                seq = last_seq(conn)
+                yield b'event: reset\ndata: ' + dumps({'seq': seq}) + b'\n\n'
+                continue
+            events = feed(conn, entries)
+        for item in events:
+            seq = item['seq']
+            yield (f'id: {seq}\nevent: change\ndata: '.encode()
+                   + dumps(item) + b'\n\n')
+        if entries:
+            idle = 0.0
+            continue
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        time.sleep(min(poll_interval, remaining))
+        idle += poll_interval
+        if idle >= heartbeat:
+            idle = 0.0
+            yield b': keep-alive\n\n'
+
+
+def compact(conn, retention=DEFAULT_RETENTION):
+    '''Drops superseded entries and those more than `retention` behind the
+    newest, and returns the number of entries removed.'''
+    latest = (
+        select(func.max(Change.seq))
+        .where(Change.table_name != '*')
+        .group_by(Change.table_name, Change.row_id)
+    )
+    removed = conn.execute(delete(Change).where(
+        Change.table_name != '*', Change.seq.not_in(latest))).rowcount
+    horizon = last_seq(conn) - retention
+    oldest = conn.execute(select(func.min(Change.seq))).scalar()
+    if oldest is not None and oldest <= horizon:
+        removed += conn.execute(
+            delete(Change).where(Change.seq <= horizon)).rowcount
+        conn.execute(insert(Change).values(
+            seq=horizon, table_name='*', op=COMPACTED))
+    return removed
+
+
+@contextmanager
+def deferred(conn):
+    '''Drops the triggers for the duration of a bulk load on `conn` and logs
+    one `reload` entry at the end. Run it inside a transaction, as for
+    summaries.deferred.'''
+    if conn.dialect.name != 'sqlite':
+        yield
+        return
+    drop_triggers(conn)
+    yield
+    record_reload(conn)
+    create_triggers(conn)
+
+
+def _create_triggers(target, connection, **kw):
+    if connection.dialect.name == 'sqlite':
+        create_triggers(connection)
+
+
+# db.create_all() gets the triggers as well; migrated databases get them
+# from the migration that added the changes table.
+event.listen(db.metadata, 'after_create', _create_triggers)
+
+
+class ChangeLog:
+    '''Holds the change log settings and registers `flask changes`.
+
+    Compaction scans the whole log, so it never runs inside a request; run
+    `flask changes compact` periodically, from cron or a systemd timer.'''
+
+    def __init__(self, app=None, db=None):
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        app.config.setdefault('CHANGES_RETENTION', DEFAULT_RETENTION)
+        app.config.setdefault('CHANGES_POLL_INTERVAL', 1.0)
+        app.config.setdefault('CHANGES_STREAM_SECONDS', DEFAULT_STREAM_SECONDS)
+        self.retention = app.config['CHANGES_RETENTION']
+        self.db = db
+        app.extensions['change_log'] = self
+        app.cli.add_command(cli)
+
+    def compact(self):
+        with self.db.engine.begin() as conn:
+            return compact(conn, self.retention)
+
+
+@click.group('changes')
+def cli():
+    '''Maintain the change log.'''
+
+
+@cli.command('compact')
+@click.option('--retention', type=int,
+              help='entries to keep behind the newest (CHANGES_RETENTION)')
+@with_appcontext
+def compact_command(retention):
+    '''Drop superseded and expired change log entries.'''
+    retention = retention or current_app.config['CHANGES_RETENTION']
+    with db.engine.begin() as conn:
+        removed = compact(conn, retention)
+    click.echo(f'Removed {removed} change log entries.')
@@ -0,0 +1,142 @@
+'''Single-flight coalescing of concurrent identical GET requests.
+
+While one request (the leader) runs a coalesced view, identical requests
+arriving in the meantime (followers) wait for it and answer with a copy of
+its response instead of repeating the queries and serialization. A follower
+that waits longer than COALESCE_TIMEOUT seconds, or whose leader failed,
+runs the view itself.
+
+Requests are identical when their key is: by default the method, path and
+query string plus the headers listed in COALESCE_KEY_HEADERS. A view can
+pass its own `key` function to `coalesced`. Keys also carry a generation
+bumped by every commit in this process, so a request arriving after a
+write never joins a flight that started before it.
+'''
+import threading
+from functools import wraps
+
+from flask import request, Response
+from sqlalchemy import event
+
+
+class Flight:
+    __slots__ = ('done', 'result')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class SingleFlight:
+    '''Runs at most one call per key at a time, sharing its result with the
+    callers that asked for the same key meanwhile.'''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def __len__(self):
+        return len(self._flights)
+
+    def do(self, key, fn, timeout=None):
+        '''Returns (result, shared): the result of `fn()` or of the call
+        already running for `key`, and whether it came from that call.
+        Followers get None back when the wait timed out or the leader
+        raised.'''
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Flight()
+        if not leader:
+            flight.done.wait(timeout)
+            return flight.result, True
+        try:
+            flight.result = fn()
+            return flight.result, False
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+
+class Coalescer:
+    '''Coalesces identical concurrent requests to the views it decorates.'''
+
+    def __init__(self, app=None, db=None):
+        self.enabled = False
+        self.flights = SingleFlight()
+        self.generation = 0
+        self.leaders = 0
+        self.followers = 0
+        self.fallbacks = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        app.config.setdefault('COALESCE_ENABLED', True)
+        app.config.setdefault('COALESCE_TIMEOUT', 5.0)
+        app.config.setdefault('COALESCE_KEY_HEADERS', ('Accept',))
+        self.enabled = app.config['COALESCE_ENABLED']
+        self.timeout = app.config['COALESCE_TIMEOUT']
+        self.key_headers = tuple(app.config['COALESCE_KEY_HEADERS'])
+        app.extensions['coalescer'] = self
+
+        event.listen(db.session, 'after_commit', self._bump_generation)
+
+    def _bump_generation(self, session):
+        self._count('generation')
+
+    def request_key(self):
+        return (request.method, request.full_path) + tuple(
+            request.headers.get(name) for name in self.key_headers)
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def coalesced(self, key=None):
+        '''Decorates a view whose response depends only on the request key.
+        `key` is called with the view's URL arguments and replaces the
+        default key. Streamed responses are never shared.'''
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self.enabled or 'stream' in request.args:
+                    return view(*args, **kwargs)
+                flight_key = (view.__qualname__, self.generation) + (
+                    key(**kwargs) if key is not None else self.request_key())
+
+                def run():
+                    response = view(*args, **kwargs)
+                    if response.is_streamed:
+                        return response, None
+                    return response, (
+                        response.get_data(), response.status_code,
+                        list(response.headers))
+
+                result, shared = self.flights.do(flight_key, run, self.timeout)
+                if not shared:
+                    self._count('leaders')
+                    return result[0]
+                if result is None or result[1] is None:
+                    self._count('fallbacks')
+                    return view(*args, **kwargs)
+                self._count('followers')
+                return Response(*result[1])
+            return wrapper
+        return decorator
+
+    def metrics(self):
+        '''Prometheus text lines for /metrics.'''
+        return [
+            '# TYPE coalesce_leaders_total counter',
+            f'coalesce_leaders_total {self.leaders}',
+            '# TYPE coalesce_followers_total counter',
+            f'coalesce_followers_total {self.followers}',
+            '# TYPE coalesce_fallbacks_total counter',
+            f'coalesce_fallbacks_total {self.fallbacks}',
+            '# TYPE coalesce_in_flight gauge',
+            f'coalesce_in_flight {len(self.flights)}',
+        ]
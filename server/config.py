@@ -0,0 +1,84 @@
+import os
+
+from sqlalchemy import event
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+DATABASE = os.environ.get(
+    "DB_URI", f"sqlite:///{os.path.join(BASE_DIR, 'app.db')}")
+
+# PRAGMAs run on every new SQLite connection, by profile. "default" leaves
+# SQLite's rollback journal alone; "production" switches to WAL so readers
+# never wait on the writer and only fsyncs at checkpoints.
+SQLITE_PROFILES = {
+    'default': {},
+    'production': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'cache_size': -64000,
+        'mmap_size': 268435456,
+        'temp_store': 'MEMORY',
+    },
+}
+
+POOL_DEFAULTS = {
+    'default': {},
+    'production': {'pool_size': 8, 'max_overflow': 16, 'pool_timeout': 10},
+}
+
+
+def sqlite_profile(name):
+    if name not in SQLITE_PROFILES:
+        raise ValueError(
+            f'DB_PROFILE must be one of {", ".join(SQLITE_PROFILES)}')
+    return SQLITE_PROFILES[name]
+
+
+def engine_options(profile, environ=os.environ):
+    '''Returns SQLALCHEMY_ENGINE_OPTIONS for `profile`, with pool sizes
+    overridable through DB_POOL_SIZE, DB_MAX_OVERFLOW and DB_POOL_TIMEOUT.'''
+    options = dict(POOL_DEFAULTS[profile])
+    for key, env in (('pool_size', 'DB_POOL_SIZE'),
+                     ('max_overflow', 'DB_MAX_OVERFLOW'),
+                     ('pool_timeout', 'DB_POOL_TIMEOUT')):
+        if env in environ:
+            options[key] = int(environ[env])
+    return options
+
+
+def set_sqlite_pragmas(engine, pragmas):
+    '''Runs `pragmas` on every connection `engine` opens.'''
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+
+def init_database(app, db):
+    '''Initializes `db` on `app` with the engine profile named by DB_PROFILE:
+    pool options go into SQLALCHEMY_ENGINE_OPTIONS before the engine is
+    created, and the profile's pragmas are attached to it afterwards.'''
+    profile = app.config.setdefault(
+        'DB_PROFILE', os.environ.get('DB_PROFILE', 'default'))
+    pragmas = sqlite_profile(profile)
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+    if uri.startswith('sqlite:///') and ':memory:' not in uri:
+        app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {}).update(
+            engine_options(profile))
+    db.init_app(app)
+    with app.app_context():
+        set_sqlite_pragmas(db.engine, pragmas)
+
+
+def dispose_engines(app, db):
+    '''Forgets the pooled connections a forked worker inherited from its
+    parent without closing them, so the parent's SQLite handles are never
+    used from two processes. The worker then opens its own on first use.'''
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
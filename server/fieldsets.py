@@ -0,0 +1,120 @@
+'''Sparse fieldsets and embeds requested with `fields=` and `embed=`.
+
+`fields` lists the model columns to return and `embed` the related rows to
+nest under each result. Both are comma-separated, and an empty `embed=`
+turns off a default embed. Only the requested columns are selected, and
+each embed costs one extra SELECT per 500 parents, whatever their number.
+'''
+from collections import defaultdict
+
+from flask import request
+from sqlalchemy import select
+
+from bulk import id_chunks
+from models import db, Sweet, Vendor, VendorSweet
+from serializers import model_fields
+
+# (model, embed name): the vendor_sweets column pointing at the parent, and
+# the model nested in each vendor_sweet together with its key column.
+EMBEDS = {
+    (Vendor, 'vendor_sweets'): (VendorSweet.vendor_id, Sweet, VendorSweet.sweet_id, 'sweet'),
+    (Sweet, 'vendor_sweets'): (VendorSweet.sweet_id, Vendor, VendorSweet.vendor_id, 'vendor'),
+}
+
+
+class FieldsetError(ValueError):
+    pass
+
+
+def _names(value):
+    return [name for name in (part.strip() for part in value.split(',')) if name]
+
+
+class Fieldset:
+    '''The columns and embeds of `model` a request asked for.
+
+    `id` is always selected first, since cursors and embeds need it, but
+    only appears in the output when requested.'''
+
+    def __init__(self, model, fields=None, embeds=()):
+        self.model = model
+        self.fields = tuple(fields or model.serialize_fields)
+        self.embeds = tuple(embeds)
+        self.selected = ('id',) + tuple(f for f in self.fields if f != 'id')
+        self._output = [(field, self.selected.index(field)) for field in self.fields]
+
+    def columns(self):
+        return [getattr(self.model, field) for field in self.selected]
+
+    def select(self):
+        return select(*self.columns())
+
+    def by_ids(self, ids, stmt=None, extra=None):
+        '''Returns {id: dict} for the rows of `ids` that exist, selected with
+        one `IN` query per 500 ids. `stmt` and `extra` select and serialize
+        extra columns, as for to_dicts.'''
+        stmt = self.select() if stmt is None else stmt
+        rows = []
+        for chunk in id_chunks(ids):
+            rows.extend(db.session.execute(stmt.where(self.model.id.in_(chunk))))
+        return {row[0]: d for row, d in zip(rows, self.to_dicts(rows, extra=extra))}
+
+    def to_dicts(self, rows, extra=None):
+        '''Serializes rows selected with `columns()` first. Columns selected
+        after them are passed to `extra(dict, values)` when given.'''
+        n = len(self.selected)
+        dicts = []
+        for row in rows:
+            d = {field: row[index] for field, index in self._output}
+            if extra is not None:
+                extra(d, row[n:])
+            dicts.append(d)
+        ids = [row[0] for row in rows]
+        for name in self.embeds:
+            embedded = load_embed(self.model, name, ids)
+            for d, id in zip(dicts, ids):
+                d[name] = embedded.get(id, [])
+        return dicts
+
+
+def fieldset_args(model, default_embeds=(), args=None):
+    '''Returns the Fieldset asked for by `fields` and `embed`, raising
+    FieldsetError for names `model` does not have.'''
+    args = request.args if args is None else args
+    fields = None
+    if 'fields' in args:
+        fields = _names(args['fields'])
+        unknown = [f for f in fields if f not in model.serialize_fields]
+        if unknown or not fields:
+            raise FieldsetError(
+                f'fields must be chosen from {", ".join(model.serialize_fields)}')
+    embeds = default_embeds
+    if 'embed' in args:
+        embeds = _names(args['embed'])
+        choices = [name for (m, name) in EMBEDS if m is model]
+        if any(name not in choices for name in embeds):
+            raise FieldsetError(f'embed must be chosen from {", ".join(choices)}')
+    return Fieldset(model, fields, embeds)
+
+
+def load_embed(model, name, ids):
+    '''Returns {parent id: [vendor_sweet dict]} for `ids`, each vendor_sweet
+    nesting the sweet or vendor on its other side, in one joined SELECT per
+    chunk of ids.'''
+    parent_key, other, other_key, nested = EMBEDS[(model, name)]
+    vendor_sweet_fields = VendorSweet.serialize_fields
+    other_fields = other.serialize_fields
+    n = len(vendor_sweet_fields)
+    embedded = defaultdict(list)
+    for chunk in id_chunks(ids):
+        rows = db.session.execute(
+            select(*model_fields(VendorSweet), *model_fields(other))
+            .join(other, other.id == other_key)
+            .where(parent_key.in_(chunk))
+            .order_by(VendorSweet.id)
+        )
+        for row in rows:
+            d = dict(zip(vendor_sweet_fields, row[:n]))
+            d[nested] = dict(zip(other_fields, row[n:]))
+            embedded[d[parent_key.key]].append(d)
+    return embedded
@@ -0,0 +1,44 @@
+'''Production serving settings, read by gunicorn from the working directory:
+
+    cd server && gunicorn app:app
+
+The app and models are imported once in the master (`preload_app`) and
+shared copy-on-write by the forked workers, one per core by default. Each
+worker holds its own connections, response cache and search index, and is
+replaced after `max_requests` requests. With more than one worker, the
+response caches follow the change log so a write through one worker is
+never served stale by another (RESPONSE_CACHE_SYNC). Every setting can be overridden on
+the command line, e.g. `gunicorn app:app --workers 2`.
+'''
+import multiprocessing
+import os
+import sys
+
+# Several processes share one SQLite file, so default to WAL and a busy
+# timeout (see config.SQLITE_PROFILES) before the app is preloaded.
+os.environ.setdefault('DB_PROFILE', 'production')
+
+bind = os.environ.get('BIND', '0.0.0.0:5555')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+preload_app = True
+if workers > 1:
+    os.environ.setdefault('RESPONSE_CACHE_SYNC', '1')
+max_requests = int(os.environ.get('MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.environ.get('MAX_REQUESTS_JITTER', max_requests // 10))
+timeout = int(os.environ.get('WORKER_TIMEOUT', 30))
+# /changes event streams end before the worker would be killed as hung;
+# clients reconnect with Last-Event-ID. A sync worker serves nothing else
+# while a stream is open, so serve streams with --threads or gthread.
+os.environ.setdefault('CHANGES_STREAM_SECONDS', str(max(1, timeout - 5)))
+
+
+def post_fork(server, worker):
+    # Connections opened while preloading (the search backend probe, for
+    # one) were copied into this worker; drop them before serving.
+    if 'app' in sys.modules:
+        from app import app, db
+        from config import dispose_engines
+
+        dispose_engines(app, db)
+    if 'asgi' in sys.modules:
+        sys.modules['asgi'].app.engine.sync_engine.dispose(close=False)
@@ -0,0 +1,176 @@
+import bisect
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from flask import g, has_request_context, request, Response
+from sqlalchemy import event
+
+slow_query_log = logging.getLogger('sweets.slow_query')
+
+DURATION_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+
+class Histogram:
+    '''Cumulative histogram per label set, rendered in Prometheus text
+    format.'''
+
+    def __init__(self, name, help, buckets):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self._series = defaultdict(lambda: [[0] * (len(buckets) + 1), 0.0, 0])
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series[labels]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = [(labels, (list(counts), total, count))
+                      for labels, (counts, total, count) in sorted(self._series.items())]
+        for labels, (counts, total, count) in series:
+            label_text = ','.join(f'{k}="{v}"' for k, v in labels)
+            cumulative = 0
+            for bound, bucket in zip((*self.buckets, '+Inf'), counts):
+                cumulative += bucket
+                lines.append(
+                    f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {total}')
+            lines.append(f'{self.name}_count{{{label_text}}} {count}')
+        return lines
+
+
+class RequestTimings:
+    __slots__ = ('start', 'queries', 'sql_time', 'serialize_time')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.serialize_time = 0.0
+
+
+def current_timings():
+    return g.get('timings') if has_request_context() else None
+
+
+class Instrumentation:
+    '''Records query count, SQL time, serialization time and total time per
+    request. Each response gets a `Server-Timing` header, and aggregated
+    histograms are served at `/metrics` in Prometheus text format.
+
+    Queries slower than SLOW_QUERY_MS milliseconds are logged to the
+    `sweets.slow_query` logger when that setting is not None.'''
+
+    def __init__(self, app=None, db=None):
+        self.request_duration = Histogram(
+            'http_request_duration_seconds',
+            'Time spent handling a request.', DURATION_BUCKETS)
+        self.sql_duration = Histogram(
+            'http_request_sql_duration_seconds',
+            'Time spent executing SQL per request.', DURATION_BUCKETS)
+        self.serialize_duration = Histogram(
+            'http_request_serialize_duration_seconds',
+            'Time spent encoding JSON per request.', DURATION_BUCKETS)
+        self.query_count = Histogram(
+            'http_request_sql_queries',
+            'SQL statements executed per request.', QUERY_COUNT_BUCKETS)
+        self.collectors = []
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        app.config.setdefault('SLOW_QUERY_MS', None)
+        self.slow_query_ms = app.config['SLOW_QUERY_MS']
+        app.extensions['instrumentation'] = self
+
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        event.listen(engine, 'handle_error', self._handle_error)
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.add_url_rule('/metrics', 'metrics', self.metrics)
+
+        respond = app.json.response
+
+        def timed_response(*args, **kwargs):
+            start = time.perf_counter()
+            response = respond(*args, **kwargs)
+            timings = current_timings()
+            if timings is not None:
+                timings.serialize_time += time.perf_counter() - start
+            return response
+
+        app.json.response = timed_response
+
+    def register_collector(self, collect):
+        '''Adds a callable returning extra Prometheus text lines to /metrics.'''
+        self.collectors.append(collect)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters,
+                               context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters,
+                              context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_start'].pop()
+        timings = current_timings()
+        if timings is not None:
+            timings.queries += 1
+            timings.sql_time += elapsed
+        if self.slow_query_ms is not None and elapsed * 1000 >= self.slow_query_ms:
+            slow_query_log.warning(
+                'slow query (%.1f ms): %s %r', elapsed * 1000, statement, parameters)
+
+    def _handle_error(self, context):
+        if context.connection is not None:
+            starts = context.connection.info.get('query_start')
+            if starts:
+                starts.pop()
+
+    def _before_request(self):
+        g.timings = RequestTimings()
+
+    def _after_request(self, response):
+        timings = g.pop('timings', None)
+        if timings is None:
+            return response
+        total = time.perf_counter() - timings.start
+        response.headers['Server-Timing'] = ', '.join([
+            f'db;dur={timings.sql_time * 1000:.2f};desc="{timings.queries} queries"',
+            f'serialize;dur={timings.serialize_time * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ])
+
+        labels = (
+            ('method', request.method),
+            ('endpoint', request.url_rule.rule if request.url_rule else 'unmatched'),
+        )
+        self.request_duration.observe(labels, total)
+        self.sql_duration.observe(labels, timings.sql_time)
+        self.serialize_duration.observe(labels, timings.serialize_time)
+        self.query_count.observe(labels, timings.queries)
+        return response
+
+    def metrics(self):
+        lines = []
+        for histogram in (self.request_duration, self.sql_duration,
+                          self.serialize_duration, self.query_count):
+            lines.extend(histogram.render())
+        for collect in self.collectors:
+            lines.extend(collect())
+        return Response('\n'.join(lines) + '\n',
+                        content_type='text/plain; version=0.0.4; charset=utf-8')
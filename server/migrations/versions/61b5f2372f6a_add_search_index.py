@@ -0,0 +1,77 @@
+"""add search index
+
+Revision ID: 61b5f2372f6a
+Revises: 8953b3be4f3e
+Create Date: 2026-10-18 06:42:38.167187
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '61b5f2372f6a'
+down_revision = '8953b3be4f3e'
+branch_labels = None
+depends_on = None
+
+# Frozen copy of search.trigger_ddl() at this revision. A sweet's index rowid
+# is id * 2 and a vendor's is id * 2 + 1.
+TRIGGERS = [
+    '''CREATE TRIGGER sweets_search_insert AFTER INSERT ON sweets BEGIN
+    INSERT INTO search_index (rowid, name) VALUES (NEW.id * 2 + 0, NEW.name);
+END''',
+    '''CREATE TRIGGER sweets_search_update AFTER UPDATE OF name ON sweets BEGIN
+    DELETE FROM search_index WHERE rowid = OLD.id * 2 + 0;
+    INSERT INTO search_index (rowid, name) VALUES (NEW.id * 2 + 0, NEW.name);
+END''',
+    '''CREATE TRIGGER sweets_search_delete AFTER DELETE ON sweets BEGIN
+    DELETE FROM search_index WHERE rowid = OLD.id * 2 + 0;
+END''',
+    '''CREATE TRIGGER vendors_search_insert AFTER INSERT ON vendors BEGIN
+    INSERT INTO search_index (rowid, name) VALUES (NEW.id * 2 + 1, NEW.name);
+END''',
+    '''CREATE TRIGGER vendors_search_update AFTER UPDATE OF name ON vendors BEGIN
+    DELETE FROM search_index WHERE rowid = OLD.id * 2 + 1;
+    INSERT INTO search_index (rowid, name) VALUES (NEW.id * 2 + 1, NEW.name);
+END''',
+    '''CREATE TRIGGER vendors_search_delete AFTER DELETE ON vendors BEGIN
+    DELETE FROM search_index WHERE rowid = OLD.id * 2 + 1;
+END''',
+]
+
+TRIGGER_NAMES = [
+    f'{table}_search_{event}'
+    for table in ('sweets', 'vendors')
+    for event in ('insert', 'update', 'delete')
+]
+
+
+def fts5_available(conn):
+    if conn.dialect.name != 'sqlite':
+        return False
+    return bool(conn.exec_driver_sql(
+        "SELECT sqlite_compileoption_used('ENABLE_FTS5')").scalar())
+
+
+def upgrade():
+    # Without FTS5 there is no index to create; search.py then answers from
+    # its in-memory index instead.
+    if not fts5_available(op.get_bind()):
+        return
+    op.execute(
+        "CREATE VIRTUAL TABLE search_index USING fts5(name, prefix='2 3')")
+    for statement in TRIGGERS:
+        op.execute(statement)
+    op.execute(
+        'INSERT INTO search_index (rowid, name) '
+        'SELECT id * 2, name FROM sweets WHERE name IS NOT NULL')
+    op.execute(
+        'INSERT INTO search_index (rowid, name) '
+        'SELECT id * 2 + 1, name FROM vendors WHERE name IS NOT NULL')
+
+
+def downgrade():
+    for name in TRIGGER_NAMES:
+        op.execute(f'DROP TRIGGER IF EXISTS {name}')
+    op.execute('DROP TABLE IF EXISTS search_index')
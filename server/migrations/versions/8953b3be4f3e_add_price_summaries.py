@@ -0,0 +1,152 @@
+"""add price summaries
+
+Revision ID: 8953b3be4f3e
+Revises: 21f068a6eb34
+Create Date: 2026-10-18 06:39:14.521391
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8953b3be4f3e'
+down_revision = '21f068a6eb34'
+branch_labels = None
+depends_on = None
+
+# Frozen copy of summaries.trigger_ddl() at this revision.
+TRIGGERS = [
+    '''CREATE TRIGGER sweet_price_summaries_insert AFTER INSERT ON vendor_sweets WHEN NEW.sweet_id IS NOT NULL BEGIN
+    INSERT INTO sweet_price_summaries (sweet_id, count, min_price, max_price, price_sum)
+    SELECT NEW.sweet_id, 1, NEW.price, NEW.price, NEW.price
+    WHERE NEW.sweet_id IS NOT NULL
+    ON CONFLICT (sweet_id) DO UPDATE SET
+        count = count + 1,
+        min_price = min(min_price, excluded.min_price),
+        max_price = max(max_price, excluded.max_price),
+        price_sum = price_sum + excluded.price_sum;
+END''',
+    '''CREATE TRIGGER sweet_price_summaries_delete AFTER DELETE ON vendor_sweets WHEN OLD.sweet_id IS NOT NULL BEGIN
+    UPDATE sweet_price_summaries SET
+        count = count - 1,
+        price_sum = price_sum - OLD.price,
+        min_price = CASE WHEN min_price < OLD.price THEN min_price ELSE (
+            SELECT min(price) FROM vendor_sweets WHERE sweet_id = OLD.sweet_id) END,
+        max_price = CASE WHEN max_price > OLD.price THEN max_price ELSE (
+            SELECT max(price) FROM vendor_sweets WHERE sweet_id = OLD.sweet_id) END
+    WHERE sweet_id = OLD.sweet_id;
+    DELETE FROM sweet_price_summaries WHERE sweet_id = OLD.sweet_id AND count = 0;
+END''',
+    '''CREATE TRIGGER sweet_price_summaries_update AFTER UPDATE OF price, sweet_id ON vendor_sweets WHEN OLD.sweet_id IS NOT NULL OR NEW.sweet_id IS NOT NULL BEGIN
+    UPDATE sweet_price_summaries SET
+        count = count - 1,
+        price_sum = price_sum - OLD.price,
+        min_price = CASE WHEN min_price < OLD.price THEN min_price ELSE (
+            SELECT min(price) FROM vendor_sweets WHERE sweet_id = OLD.sweet_id) END,
+        max_price = CASE WHEN max_price > OLD.price THEN max_price ELSE (
+            SELECT max(price) FROM vendor_sweets WHERE sweet_id = OLD.sweet_id) END
+    WHERE sweet_id = OLD.sweet_id;
+    DELETE FROM sweet_price_summaries WHERE sweet_id = OLD.sweet_id AND count = 0;
+    INSERT INTO sweet_price_summaries (sweet_id, count, min_price, max_price, price_sum)
+    SELECT NEW.sweet_id, 1, NEW.price, NEW.price, NEW.price
+    WHERE NEW.sweet_id IS NOT NULL
+    ON CONFLICT (sweet_id) DO UPDATE SET
+        count = count + 1,
+        min_price = min(min_price, excluded.min_price),
+        max_price = max(max_price, excluded.max_price),
+        price_sum = price_sum + excluded.price_sum;
+END''',
+    '''CREATE TRIGGER vendor_price_summaries_insert AFTER INSERT ON vendor_sweets WHEN NEW.vendor_id IS NOT NULL BEGIN
+    INSERT INTO vendor_price_summaries (vendor_id, count, min_price, max_price, price_sum)
+    SELECT NEW.vendor_id, 1, NEW.price, NEW.price, NEW.price
+    WHERE NEW.vendor_id IS NOT NULL
+    ON CONFLICT (vendor_id) DO UPDATE SET
+        count = count + 1,
+        min_price = min(min_price, excluded.min_price),
+        max_price = max(max_price, excluded.max_price),
+        price_sum = price_sum + excluded.price_sum;
+END''',
+    '''CREATE TRIGGER vendor_price_summaries_delete AFTER DELETE ON vendor_sweets WHEN OLD.vendor_id IS NOT NULL BEGIN
+    UPDATE vendor_price_summaries SET
+        count = count - 1,
+        price_sum = price_sum - OLD.price,
+        min_price = CASE WHEN min_price < OLD.price THEN min_price ELSE (
+            SELECT min(price) FROM vendor_sweets WHERE vendor_id = OLD.vendor_id) END,
+        max_price = CASE WHEN max_price > OLD.price THEN max_price ELSE (
+            SELECT max(price) FROM vendor_sweets WHERE vendor_id = OLD.vendor_id) END
+    WHERE vendor_id = OLD.vendor_id;
+    DELETE FROM vendor_price_summaries WHERE vendor_id = OLD.vendor_id AND count = 0;
+END''',
+    '''CREATE TRIGGER vendor_price_summaries_update AFTER UPDATE OF price, vendor_id ON vendor_sweets WHEN OLD.vendor_id IS NOT NULL OR NEW.vendor_id IS NOT NULL BEGIN
+    UPDATE vendor_price_summaries SET
+        count = count - 1,
+        price_sum = price_sum - OLD.price,
+        min_price = CASE WHEN min_price < OLD.price THEN min_price ELSE (
+            SELECT min(price) FROM vendor_sweets WHERE vendor_id = OLD.vendor_id) END,
+        max_price = CASE WHEN max_price > OLD.price THEN max_price ELSE (
+            SELECT max(price) FROM vendor_sweets WHERE vendor_id = OLD.vendor_id) END
+    WHERE vendor_id = OLD.vendor_id;
+    DELETE FROM vendor_price_summaries WHERE vendor_id = OLD.vendor_id AND count = 0;
+    INSERT INTO vendor_price_summaries (vendor_id, count, min_price, max_price, price_sum)
+    SELECT NEW.vendor_id, 1, NEW.price, NEW.price, NEW.price
+    WHERE NEW.vendor_id IS NOT NULL
+    ON CONFLICT (vendor_id) DO UPDATE SET
+        count = count + 1,
+        min_price = min(min_price, excluded.min_price),
+        max_price = max(max_price, excluded.max_price),
+        price_sum = price_sum + excluded.price_sum;
+END''',
+]
+
+TRIGGER_NAMES = [
+    f'{table}_{event}'
+    for table in ('sweet_price_summaries', 'vendor_price_summaries')
+    for event in ('insert', 'delete', 'update')
+]
+
+
+def upgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.create_table('sweet_price_summaries',
+    sa.Column('sweet_id', sa.Integer(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('min_price', sa.Integer(), nullable=True),
+    sa.Column('max_price', sa.Integer(), nullable=True),
+    sa.Column('price_sum', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['sweet_id'], ['sweets.id'], name=op.f('fk_sweet_price_summaries_sweet_id_sweets')),
+    sa.PrimaryKeyConstraint('sweet_id')
+    )
+    op.create_table('vendor_price_summaries',
+    sa.Column('vendor_id', sa.Integer(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('min_price', sa.Integer(), nullable=True),
+    sa.Column('max_price', sa.Integer(), nullable=True),
+    sa.Column('price_sum', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['vendor_id'], ['vendors.id'], name=op.f('fk_vendor_price_summaries_vendor_id_vendors')),
+    sa.PrimaryKeyConstraint('vendor_id')
+    )
+    # ### end Alembic commands ###
+
+    for statement in TRIGGERS:
+        op.execute(statement)
+    op.execute(
+        'INSERT INTO sweet_price_summaries '
+        '(sweet_id, count, min_price, max_price, price_sum) '
+        'SELECT sweet_id, count(*), min(price), max(price), sum(price) '
+        'FROM vendor_sweets WHERE sweet_id IS NOT NULL GROUP BY sweet_id')
+    op.execute(
+        'INSERT INTO vendor_price_summaries '
+        '(vendor_id, count, min_price, max_price, price_sum) '
+        'SELECT vendor_id, count(*), min(price), max(price), sum(price) '
+        'FROM vendor_sweets WHERE vendor_id IS NOT NULL GROUP BY vendor_id')
+
+
+def downgrade():
+    for name in TRIGGER_NAMES:
+        op.execute(f'DROP TRIGGER IF EXISTS {name}')
+
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.drop_table('vendor_price_summaries')
+    op.drop_table('sweet_price_summaries')
+    # ### end Alembic commands ###
@@ -1,11 +1,10 @@
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import MetaData
 from sqlalchemy.orm import validates
-from sqlalchemy.ext.associationproxy import association_proxy
-from sqlalchemy_serializer import SerializerMixin
 
 metadata = MetaData(naming_convention={
     'fk': 'fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s',
+    'ix': 'ix_%(column_0_label)s',
 })
 
 db = SQLAlchemy(metadata=metadata)
@@ -18,13 +17,14 @@ class Sweet(db.Model):
     name = db.Column(db.String)
 
     vendor_sweets = db.relationship('VendorSweet', backref='sweet')
-    
+
+    serialize_fields = ('id', 'name')
+
     def to_dict(self):
         return {
             'id': self.id,
             'name': self.name,
         }
-    serialize_rules = ('-vendor_sweets.sweet',)
     
     def __repr__(self):
         return f'<Sweet {self.id}>'
@@ -35,13 +35,14 @@ class Vendor(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
     vendor_sweets = db.relationship('VendorSweet', backref='vendor')
-    
+
+    serialize_fields = ('id', 'name')
+
     def to_dict(self):
         return {
             'id': self.id,
             'name': self.name,
         }
-    serialize_rules = ('-vendor_sweets.vendor',)
     
     def __repr__(self):
         return f'<Vendor {self.id}>'
@@ -52,9 +53,16 @@ class VendorSweet(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     price = db.Column(db.Integer, nullable=False)
-    sweet_id = db.Column(db.Integer, db.ForeignKey('sweets.id'))
+    sweet_id = db.Column(db.Integer, db.ForeignKey('sweets.id'), index=True)
     vendor_id = db.Column(db.Integer, db.ForeignKey('vendors.id'))
 
+    # Leads with vendor_id, so it also serves the Vendor.vendor_sweets lookup.
+    __table_args__ = (
+        db.Index('ix_vendor_sweets_vendor_id_price', 'vendor_id', 'price'),
+    )
+
+    serialize_fields = ('id', 'price', 'sweet_id', 'vendor_id')
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -62,10 +70,13 @@ class VendorSweet(db.Model):
             'sweet_id': self.sweet_id,
             'vendor_id': self.vendor_id
         }
-    serialize_rules = ('-sweet.vendor_sweets', '-vendor.vendor_sweets')
 
     @validates('price')
     def validate_price(self, key, price):
+        return self.check_price(price)
+
+    @staticmethod
+    def check_price(price):
         if price is None:
             raise ValueError('Price cannot be None')
         if price < 0:
@@ -74,3 +85,53 @@ class VendorSweet(db.Model):
     
     def __repr__(self):
         return f'<VendorSweet {self.id}>'
+
+
+class SweetPriceSummary(db.Model):
+    '''Aggregates of the prices a sweet is sold at, kept up to date by the
+    triggers in summaries.py. Sweets nobody sells have no row.'''
+    __tablename__ = 'sweet_price_summaries'
+
+    sweet_id = db.Column(db.Integer, db.ForeignKey('sweets.id'), primary_key=True)
+    count = db.Column(db.Integer, nullable=False)
+    min_price = db.Column(db.Integer)
+    max_price = db.Column(db.Integer)
+    price_sum = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return f'<SweetPriceSummary {self.sweet_id}>'
+
+
+class VendorPriceSummary(db.Model):
+    '''Aggregates of the prices a vendor charges, kept up to date by the
+    triggers in summaries.py. Vendors selling nothing have no row.'''
+    __tablename__ = 'vendor_price_summaries'
+
+    vendor_id = db.Column(db.Integer, db.ForeignKey('vendors.id'), primary_key=True)
+    count = db.Column(db.Integer, nullable=False)
+    min_price = db.Column(db.Integer)
+    max_price = db.Column(db.Integer)
+    price_sum = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return f'<VendorPriceSummary {self.vendor_id}>'
+
+
+class Change(db.Model):
+    '''One insert, update or delete of a vendors, sweets or vendor_sweets
+    row, appended by the triggers in changes.py. `seq` is never reused.'''
+    __tablename__ = 'changes'
+    # Compaction groups entries by row; the index also carries seq, which
+    # is the rowid.
+    __table_args__ = (
+        db.Index('ix_changes_table_name_row_id', 'table_name', 'row_id'),
+        {'sqlite_autoincrement': True},
+    )
+
+    seq = db.Column(db.Integer, primary_key=True)
+    table_name = db.Column(db.String, nullable=False)
+    row_id = db.Column(db.Integer)
+    op = db.Column(db.String, nullable=False)
+
+    def __repr__(self):
+        return f'<Change {self.seq}>'
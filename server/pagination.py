@@ -0,0 +1,163 @@
+from urllib.parse import urlencode
+
+from flask import request, stream_with_context, Response
+
+from models import db
+from serializers import dumps
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_CHUNK_SIZE = 1000
+MAX_IDS = 1000
+
+STREAM_FORMATS = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class PageArgsError(ValueError):
+    pass
+
+
+def _positive_int(name, value):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise PageArgsError(f'{name} must be an integer')
+    if value < 0 or (name == 'limit' and value == 0):
+        raise PageArgsError(f'{name} must be positive')
+    return value
+
+
+def page_args(args=None):
+    '''Returns (limit, after) from the query string, or (None, None) when the
+    caller did not ask for a page.'''
+    args = request.args if args is None else args
+    if 'limit' not in args and 'after' not in args:
+        return None, None
+    limit = _positive_int('limit', args.get('limit', DEFAULT_PAGE_SIZE))
+    after = _positive_int('after', args.get('after', 0))
+    return min(limit, MAX_PAGE_SIZE), after
+
+
+def offset_args(args=None, default_limit=DEFAULT_PAGE_SIZE):
+    '''Returns (limit, offset) for results that have no stable key to page
+    on, such as ranked search results.'''
+    args = request.args if args is None else args
+    limit = _positive_int('limit', args.get('limit', default_limit))
+    offset = _positive_int('offset', args.get('offset', 0))
+    return min(limit, MAX_PAGE_SIZE), offset
+
+
+def since_args(args=None, default_limit=DEFAULT_PAGE_SIZE, last_event_id=None):
+    '''Returns (limit, since) for reading a log after sequence number
+    `since`. A reconnecting EventSource's `last_event_id` replaces it.'''
+    args = request.args if args is None else args
+    limit = _positive_int('limit', args.get('limit', default_limit))
+    if last_event_id is None:
+        since = _positive_int('since', args.get('since', 0))
+    else:
+        since = _positive_int('Last-Event-ID', last_event_id)
+    return min(limit, MAX_PAGE_SIZE), since
+
+
+def id_list(values):
+    '''Returns the distinct ids in `values`, a comma-separated string or a
+    list, in the order given.'''
+    if isinstance(values, str):
+        values = [value for value in (part.strip() for part in values.split(',')) if value]
+    if not isinstance(values, list):
+        raise PageArgsError('ids must be a list of ids')
+    try:
+        ids = list(dict.fromkeys(_positive_int('ids', value) for value in values))
+    except PageArgsError:
+        raise PageArgsError('ids must be a list of ids')
+    if not ids:
+        raise PageArgsError('ids must not be empty')
+    if len(ids) > MAX_IDS:
+        raise PageArgsError(f'ids must list at most {MAX_IDS} ids')
+    return ids
+
+
+def ids_args(args=None):
+    '''Returns the ids asked for with `ids=1,2,3`, or None when the caller
+    did not ask for specific rows.'''
+    args = request.args if args is None else args
+    if 'ids' not in args:
+        return None
+    if any(name in args for name in ('limit', 'after', 'stream')):
+        raise PageArgsError('ids cannot be combined with limit, after or stream')
+    return id_list(args['ids'])
+
+
+def keyset_page(stmt, column, limit, after):
+    '''Fetches one page of `stmt` ordered by `column` starting after the
+    `after` cursor.
+
+    One extra row is read to learn whether a next page exists, so no COUNT(*)
+    is ever issued.'''
+    rows = db.session.execute(
+        stmt.where(column > after).order_by(column).limit(limit + 1)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = getattr(rows[-1], column.key)
+    return rows, next_cursor
+
+
+def page_headers(limit, next_cursor, cursor='after'):
+    if next_cursor is None:
+        return {}
+    args = {k: v for k, v in request.args.items() if k not in ('limit', cursor)}
+    args.update({'limit': limit, cursor: next_cursor})
+    url = f'{request.base_url}?{urlencode(args)}'
+    return {
+        'Link': f'<{url}>; rel="next"',
+        'X-Next-Cursor': str(next_cursor),
+    }
+
+
+def offset_headers(limit, offset, has_more):
+    if not has_more:
+        return {}
+    args = {k: v for k, v in request.args.items() if k not in ('limit', 'offset')}
+    args.update(limit=limit, offset=offset + limit)
+    return {'Link': f'<{request.base_url}?{urlencode(args)}>; rel="next"'}
+
+
+def stream_format(args=None):
+    args = request.args if args is None else args
+    fmt = args.get('stream')
+    if fmt is None:
+        return None
+    if fmt not in STREAM_FORMATS:
+        raise PageArgsError(f'stream must be one of {", ".join(STREAM_FORMATS)}')
+    return fmt
+
+
+def stream_rows(stmt, to_dicts, fmt, chunk_size=STREAM_CHUNK_SIZE):
+    '''Streams every row of `stmt`, serialized by `to_dicts`, as a JSON array
+    or NDJSON.
+
+    Rows are pulled from a server-side cursor `chunk_size` at a time and each
+    chunk is encoded in one call, so memory use does not grow with the size
+    of the table.'''
+    result = db.session.execute(stmt.execution_options(yield_per=chunk_size))
+
+    def generate():
+        if fmt == 'ndjson':
+            for rows in result.partitions():
+                yield b''.join(
+                    dumps(row) + b'\n' for row in to_dicts(rows))
+            return
+        yield b'['
+        first = True
+        for rows in result.partitions():
+            chunk = dumps(to_dicts(rows))[1:-1]
+            yield chunk if first else b',' + chunk
+            first = False
+        yield b']'
+
+    return Response(stream_with_context(generate()), 200,
+                    mimetype=STREAM_FORMATS[fmt])
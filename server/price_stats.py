@@ -0,0 +1,52 @@
+from sqlalchemy import Float, cast, func, select
+
+from models import Sweet, SweetPriceSummary, Vendor, VendorPriceSummary, VendorSweet
+
+STATS_FIELDS = ('count', 'min', 'max', 'sum', 'avg')
+SWEET_VENDOR_FIELDS = ('vendor_sweet_id', 'id', 'name', 'price')
+
+PRICE_SUMMARIES = {
+    Sweet: (SweetPriceSummary, SweetPriceSummary.sweet_id),
+    Vendor: (VendorPriceSummary, VendorPriceSummary.vendor_id),
+}
+
+
+def price_stats_columns(summary):
+    return (
+        func.coalesce(summary.count, 0),
+        summary.min_price,
+        summary.max_price,
+        func.coalesce(summary.price_sum, 0),
+        cast(summary.price_sum, Float) / summary.count,
+    )
+
+
+def with_price_stats(model, columns):
+    '''Selects `columns` of every `model` row followed by the price
+    aggregates of its offerings.
+
+    Aggregates are read from the summary table maintained by the triggers
+    in summaries.py, one primary key lookup per row, and rows without
+    offerings get a count of 0.'''
+    summary, key = PRICE_SUMMARIES[model]
+    return (
+        select(*columns, *price_stats_columns(summary))
+        .outerjoin(summary, key == model.id)
+    )
+
+
+def add_price_stats(d, values):
+    '''Nests the aggregates selected by `with_price_stats` under
+    `price_stats`; pass it as Fieldset.to_dicts' `extra`.'''
+    d['price_stats'] = dict(zip(STATS_FIELDS, values))
+
+
+def sweet_vendors(sweet_id):
+    '''Selects the vendors selling `sweet_id` with their price, keyed by the
+    vendor_sweets id so the result can be keyset paginated.'''
+    return (
+        select(VendorSweet.id.label('vendor_sweet_id'), Vendor.id, Vendor.name,
+               VendorSweet.price)
+        .join(Vendor, Vendor.id == VendorSweet.vendor_id)
+        .where(VendorSweet.sweet_id == sweet_id)
+    )
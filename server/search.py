@@ -0,0 +1,264 @@
+'''Name search over sweets and vendors.
+
+Names are indexed in the `search_index` FTS5 table, kept in sync with the
+sweets and vendors tables by triggers. Each row's rowid encodes its source
+as `id * 2` for a sweet and `id * 2 + 1` for a vendor, so the triggers
+update the index through rowid lookups. Results are ranked by bm25.
+
+When SQLite lacks FTS5, or the table has not been created, searches fall
+back to PrefixIndex, an in-memory index rebuilt after writes to either
+table.
+'''
+import bisect
+import heapq
+import re
+import threading
+from contextlib import contextmanager
+
+from sqlalchemy import DDL, event, select, text
+
+from models import db, Sweet, Vendor
+
+SEARCH_TABLE = 'search_index'
+SOURCES = (('sweet', Sweet), ('vendor', Vendor))
+TOKEN = re.compile(r'\w+')
+
+SOURCE_TRIGGER = '''
+CREATE TRIGGER {table}_search_{event} AFTER {timing} ON {table} BEGIN{body}
+END'''
+INDEX_ROW = '''
+    INSERT INTO search_index (rowid, name) VALUES (NEW.id * 2 + {tag}, NEW.name);'''
+UNINDEX_ROW = '''
+    DELETE FROM search_index WHERE rowid = OLD.id * 2 + {tag};'''
+
+
+def trigger_ddl():
+    '''Returns (name, CREATE TRIGGER statement) for every search trigger.'''
+    statements = []
+    for tag, (kind, model) in enumerate(SOURCES):
+        table = model.__tablename__
+        for event_name, timing, body in (
+            ('insert', 'INSERT', INDEX_ROW),
+            ('update', 'UPDATE OF name', UNINDEX_ROW + INDEX_ROW),
+            ('delete', 'DELETE', UNINDEX_ROW),
+        ):
+            statements.append((f'{table}_search_{event_name}', SOURCE_TRIGGER.format(
+                table=table, event=event_name, timing=timing,
+                body=body.format(tag=tag)).strip()))
+    return statements
+
+
+def create_triggers(conn):
+    for name, statement in trigger_ddl():
+        conn.execute(DDL(statement))
+
+
+def drop_triggers(conn):
+    for name, statement in trigger_ddl():
+        conn.execute(DDL(f'DROP TRIGGER IF EXISTS {name}'))
+
+
+def fts5_available(conn):
+    if conn.dialect.name != 'sqlite':
+        return False
+    return bool(conn.exec_driver_sql(
+        "SELECT sqlite_compileoption_used('ENABLE_FTS5')").scalar())
+
+
+def search_table_exists(conn):
+    return conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE name = ?", (SEARCH_TABLE,)).first() is not None
+
+
+def rebuild(conn):
+    '''Replaces the whole index with the current sweet and vendor names.'''
+    conn.execute(text(f'DELETE FROM {SEARCH_TABLE}'))
+    for tag, (kind, model) in enumerate(SOURCES):
+        conn.execute(text(
+            f'INSERT INTO {SEARCH_TABLE} (rowid, name) '
+            f'SELECT id * 2 + {tag}, name FROM {model.__tablename__} '
+            'WHERE name IS NOT NULL'))
+
+
+def create_search_index(conn):
+    '''Creates the FTS5 table and its triggers, and indexes existing rows.'''
+    conn.execute(DDL(
+        f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5(name, prefix='2 3')"))
+    create_triggers(conn)
+    rebuild(conn)
+
+
+@contextmanager
+def deferred(conn):
+    '''Drops the triggers for the duration of a bulk load on `conn` and
+    rebuilds the index once at the end. Run it inside a transaction, as for
+    summaries.deferred.'''
+    if conn.dialect.name != 'sqlite' or not search_table_exists(conn):
+        yield
+        return
+    drop_triggers(conn)
+    yield
+    rebuild(conn)
+    create_triggers(conn)
+
+
+def _create_on_create_all(target, connection, **kw):
+    if fts5_available(connection) and not search_table_exists(connection):
+        create_search_index(connection)
+
+
+event.listen(db.metadata, 'after_create', _create_on_create_all)
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    '''Keeps Alembic autogenerate away from the FTS5 table and the shadow
+    tables SQLite creates for it.'''
+    return not (type_ == 'table' and name.startswith(SEARCH_TABLE))
+
+
+def terms(q):
+    return [term.lower() for term in TOKEN.findall(q or '')]
+
+
+def match_expression(words):
+    '''Every word as a quoted FTS5 prefix query, so user input can never be
+    parsed as FTS5 syntax. Adjacent terms are ANDed.'''
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def decode(rowid):
+    return SOURCES[rowid % 2][0], rowid // 2
+
+
+class PrefixIndex:
+    '''Sorted (token, rowid) pairs answering prefix lookups with bisect.
+
+    A flattened trie: every token sharing a prefix is in one contiguous run,
+    and two parallel lists keep it compact.'''
+
+    def __init__(self, rows=()):
+        names = {}
+        lengths = {}
+        pairs = []
+        for rowid, name in rows:
+            tokens = terms(name)
+            names[rowid] = name
+            lengths[rowid] = len(tokens)
+            pairs.extend((token, rowid) for token in set(tokens))
+        pairs.sort()
+        self.tokens = [token for token, _ in pairs]
+        self.rowids = [rowid for _, rowid in pairs]
+        self.names = names
+        self.lengths = lengths
+
+    def prefix(self, word):
+        start = bisect.bisect_left(self.tokens, word)
+        end = bisect.bisect_left(self.tokens, word + '\U0010ffff', start)
+        return set(self.rowids[start:end])
+
+    def exact(self, word):
+        start = bisect.bisect_left(self.tokens, word)
+        end = bisect.bisect_right(self.tokens, word, start)
+        return set(self.rowids[start:end])
+
+    def search(self, words, limit, offset):
+        '''Rows whose name has a token starting with every word. Names with
+        more exact word matches rank first, then shorter names.'''
+        if not words:
+            return []
+        matches = None
+        for word in words:
+            found = self.prefix(word)
+            matches = found if matches is None else matches & found
+            if not matches:
+                return []
+
+        exact = [self.exact(word) for word in words]
+
+        def rank(rowid):
+            return (-sum(rowid in found for found in exact),
+                    self.lengths[rowid], rowid)
+
+        ranked = heapq.nsmallest(offset + limit, matches, key=rank)
+        return [(rowid, self.names[rowid]) for rowid in ranked[offset:]]
+
+
+class Search:
+    '''Answers /search queries from FTS5, or from a PrefixIndex when
+    SEARCH_BACKEND is "memory" or FTS5 is not available.'''
+
+    def __init__(self, app=None, db=None):
+        self.backend = None
+        self.memory = None
+        self._stale = True
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        app.config.setdefault('SEARCH_BACKEND', 'auto')
+        self.db = db
+        self.backend = app.config['SEARCH_BACKEND']
+        if self.backend == 'auto':
+            with app.app_context(), db.engine.connect() as conn:
+                use_fts = fts5_available(conn) and search_table_exists(conn)
+            self.backend = 'fts5' if use_fts else 'memory'
+        app.extensions['search'] = self
+
+        event.listen(db.session, 'after_flush', self._collect_flush)
+        event.listen(db.session, 'do_orm_execute', self._collect_statement)
+        event.listen(db.session, 'after_commit', self._invalidate)
+        event.listen(db.session, 'after_rollback', self._discard)
+
+    def _collect_flush(self, session, flush_context):
+        if any(isinstance(obj, (Sweet, Vendor))
+               for obj in (*session.new, *session.dirty, *session.deleted)):
+            session.info['search_stale'] = True
+
+    def _collect_statement(self, orm_execute_state):
+        if orm_execute_state.is_insert or orm_execute_state.is_update \
+                or orm_execute_state.is_delete:
+            table = getattr(orm_execute_state.statement, 'table', None)
+            if getattr(table, 'name', None) in ('sweets', 'vendors'):
+                orm_execute_state.session.info['search_stale'] = True
+
+    def _invalidate(self, session):
+        if session.info.pop('search_stale', False):
+            self._stale = True
+
+    def _discard(self, session):
+        session.info.pop('search_stale', None)
+
+    def prefix_index(self):
+        with self._lock:
+            if self._stale or self.memory is None:
+                self._stale = False
+                rows = []
+                for tag, (kind, model) in enumerate(SOURCES):
+                    rows.extend(
+                        (id * 2 + tag, name) for id, name in self.db.session.execute(
+                            select(model.id, model.name).where(model.name.is_not(None))))
+                self.memory = PrefixIndex(rows)
+            return self.memory
+
+    def search(self, q, limit, offset):
+        '''Returns up to `limit` ranked results after skipping `offset`, as
+        dicts with the type, id and name of each sweet or vendor.'''
+        words = terms(q)
+        if not words:
+            return []
+        if self.backend == 'fts5':
+            rows = self.db.session.execute(
+                text(
+                    f'SELECT rowid, name FROM {SEARCH_TABLE} '
+                    f'WHERE {SEARCH_TABLE} MATCH :match '
+                    'ORDER BY bm25(search_index), rowid LIMIT :limit OFFSET :offset'),
+                {'match': match_expression(words), 'limit': limit, 'offset': offset},
+            ).all()
+        else:
+            rows = self.prefix_index().search(words, limit, offset)
+        results = []
+        for rowid, name in rows:
+            kind, id = decode(rowid)
+            results.append({'type': kind, 'id': id, 'name': name})
+        return results
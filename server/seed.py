@@ -1,48 +1,243 @@
-from random import choice as rc, randrange
+#!/usr/bin/env python3
+'''Seeds the database.
+
+    python seed.py                       # the six demo vendors and sweets
+    python seed.py --vendors 1000000 --sweets 50000 --seed 42
+
+With --vendors, a synthetic catalog is generated deterministically from
+--seed: vendor and sweet names come from Faker, offerings per vendor follow
+a long-tailed distribution, a few sweets are sold far more widely than the
+rest, and prices cluster around a per-sweet base price. Rows are produced by
+generators and written with Core bulk inserts in chunks, so memory stays
+bounded whatever the size.
+'''
+import argparse
+import math
+import time
+from contextlib import contextmanager
+from itertools import islice
+from random import Random, choice as rc, randrange
+
+from faker import Faker
+from sqlalchemy import delete, insert, text
+
+from models import (
+    db, Change, Sweet, SweetPriceSummary, Vendor, VendorPriceSummary, VendorSweet,
+)
+import changes
+import search
+import summaries
+
+CHUNK_SIZE = 20000
+
+# Applied for the duration of a load and then restored. Durability does not
+# matter while the whole database can be regenerated from --seed.
+LOAD_PRAGMAS = {
+    'synchronous': 'OFF',
+    'journal_mode': 'MEMORY',
+    'cache_size': -256000,
+    'temp_store': 'MEMORY',
+}
+
+FLAVORS = [
+    'Chocolate', 'Vanilla', 'Strawberry', 'Salted Caramel', 'Pistachio',
+    'Peanut Butter', 'Lemon', 'Raspberry', 'Matcha', 'Coconut', 'Hazelnut',
+    'Cinnamon', 'Maple', 'Espresso', 'Mint', 'Red Velvet', 'Honey', 'Mango',
+]
+BASES = [
+    'Cookie', 'Brownie', 'Cupcake', 'Macaron', 'Donut', 'Cheesecake',
+    'Ice Cream', 'Tart', 'Eclair', 'Blondie', 'Croissant', 'Scone', 'Fudge',
+    'Cannoli', 'Pie', 'Gelato', 'Muffin', 'Babka',
+]
+
+
+def clear(conn):
+    '''Empties the catalog along with the search index and the change log.
+    Run it inside deferred(conn), which leaves one reload entry in the log.'''
+    for model in (SweetPriceSummary, VendorPriceSummary, VendorSweet, Vendor,
+                  Sweet, Change):
+        conn.execute(delete(model))
+    if search.search_table_exists(conn):
+        conn.execute(text(f'DELETE FROM {search.SEARCH_TABLE}'))
+
+
+@contextmanager
+def deferred(conn):
+    '''Defers the summary, change log and search triggers for a bulk write
+    on `conn`, rebuilding each once at the end.'''
+    with summaries.deferred(conn), changes.deferred(conn), search.deferred(conn):
+        yield
+
+
+def vendor_rows(count, fake, rng):
+    # A pool of Faker names is reused with a location suffix: calling Faker
+    # once per row would dominate load time at millions of rows.
+    companies = [fake.unique.company() for _ in range(min(count, 5000))]
+    cities = [fake.city() for _ in range(200)]
+    for id in range(1, count + 1):
+        name = companies[(id - 1) % len(companies)]
+        if id > len(companies):
+            name = f'{name} {rng.choice(cities)}'
+        yield {'id': id, 'name': name}
+
+
+def sweet_rows(count, fake, rng):
+    words = [fake.word().capitalize() for _ in range(500)]
+    for id in range(1, count + 1):
+        name = f'{rng.choice(FLAVORS)} {rng.choice(BASES)}'
+        if rng.random() < 0.5:
+            name = f'{rng.choice(words)} {name}'
+        yield {'id': id, 'name': name}
+
+
+def vendor_sweet_rows(vendors, sweets, mean_offerings, rng):
+    '''Offerings for every vendor. Offerings per vendor are Pareto-distributed
+    around `mean_offerings`, and sweet ids are drawn with a power-law skew so
+    low ids are the best sellers.'''
+    base_prices = {}
+    alpha = 1.5
+    scale = mean_offerings * (alpha - 1) / alpha
+    for vendor_id in range(1, vendors + 1):
+        offered = min(sweets, max(1, int(scale * rng.paretovariate(alpha))))
+        if offered * 2 > sweets:
+            chosen = rng.sample(range(1, sweets + 1), offered)
+        else:
+            chosen = set()
+            while len(chosen) < offered:
+                chosen.add(1 + int(sweets * rng.random() ** 3))
+        for sweet_id in chosen:
+            base = base_prices.get(sweet_id)
+            if base is None:
+                base = base_prices[sweet_id] = rng.lognormvariate(math.log(400), 0.5)
+            yield {
+                'vendor_id': vendor_id,
+                'sweet_id': sweet_id,
+                'price': max(0, int(rng.gauss(base, base * 0.15))),
+            }
+
+
+def insert_chunks(conn, model, rows, chunk_size=CHUNK_SIZE):
+    total = 0
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return total
+        conn.execute(insert(model), chunk)
+        total += len(chunk)
+
+
+def set_pragmas(conn, pragmas):
+    previous = {}
+    for name, value in pragmas.items():
+        previous[name] = conn.exec_driver_sql(f'PRAGMA {name}').scalar()
+        conn.exec_driver_sql(f'PRAGMA {name}={value}').close()
+    return previous
+
+
+def load_catalog(engine, vendors, sweets=None, offerings=5, seed=0,
+                 chunk_size=CHUNK_SIZE, log=lambda message: None):
+    '''Replaces the catalog with a synthetic one and returns the row counts.'''
+    sweets = sweets or max(1, vendors // 10)
+    rng = Random(seed)
+    fake = Faker()
+    fake.seed_instance(seed)
+
+    counts = {}
+    with engine.connect() as conn:
+        previous = {}
+        if engine.dialect.name == 'sqlite':
+            # journal_mode cannot change inside a transaction, so the pragmas
+            # get their own before the load starts.
+            previous = set_pragmas(conn, LOAD_PRAGMAS)
+            conn.commit()
+        try:
+            # Summaries and the search index are rebuilt once at the end
+            # rather than by a trigger per row, and the change log gets one
+            # reload entry.
+            with conn.begin(), deferred(conn):
+                log('Clearing db...')
+                clear(conn)
+                for model, rows in (
+                    (Vendor, vendor_rows(vendors, fake, rng)),
+                    (Sweet, sweet_rows(sweets, fake, rng)),
+                    (VendorSweet, vendor_sweet_rows(vendors, sweets, offerings, rng)),
+                ):
+                    log(f'Seeding {model.__tablename__}...')
+                    counts[model.__tablename__] = insert_chunks(
+                        conn, model, rows, chunk_size)
+                log('Rebuilding price summaries and search index...')
+        finally:
+            set_pragmas(conn, previous)
+            conn.commit()
+    return counts
+
+
+def seed_demo():
+    print("Clearing db...")
+    with db.engine.begin() as conn, deferred(conn):
+        clear(conn)
+
+    print("Seeding vendors...")
+    vendors = [
+        Vendor(name="Insomnia Cookies"),
+        Vendor(name="Cookies Cream"),
+        Vendor(name="Carvel"),
+        Vendor(name="Gregory's Coffee"),
+        Vendor(name="Duane Park Patisserie"),
+        Vendor(name="Tribeca Treats"),
+
+    ]
+
+    db.session.add_all(vendors)
+
+    print("Seeding sweets...")
+    sweets = [
+        Sweet(name="Chocolate Chip Cookie"),
+        Sweet(name="Chocolate Chunk Cookie"),
+        Sweet(name="M&Ms Cookie"),
+        Sweet(name="White Chocolate Cookie"),
+        Sweet(name="Brownie"),
+        Sweet(name="Peanut Butter Icecream Cake"),
+    ]
+
+    db.session.add_all(sweets)
+
+    print("Seeding vendor sweets...")
+    vendor_sweets = []
+    for sweet in sweets:
+        vendor = rc(vendors)
+        vendor_sweets.append(
+            VendorSweet(sweet=sweet, vendor=vendor, price = randrange(50))
+        )
+    db.session.add_all(vendor_sweets)
+    db.session.commit()
 
-from app import app
-from models import db, Sweet, Vendor, VendorSweet
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Seed the database with demo or synthetic data.')
+    parser.add_argument('--vendors', type=int,
+                        help='generate this many vendors instead of the demo data')
+    parser.add_argument('--sweets', type=int,
+                        help='number of sweets (default: vendors / 10)')
+    parser.add_argument('--offerings', type=float, default=5,
+                        help='mean vendor_sweets per vendor')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    from app import app
+
     with app.app_context():
-        print("Clearing db...")
-        Vendor.query.delete()
-        Sweet.query.delete()
-        VendorSweet.query.delete()
-
-        print("Seeding vendors...")
-        vendors = [
-            Vendor(name="Insomnia Cookies"),
-            Vendor(name="Cookies Cream"),
-            Vendor(name="Carvel"),
-            Vendor(name="Gregory's Coffee"),
-            Vendor(name="Duane Park Patisserie"),
-            Vendor(name="Tribeca Treats"),
-
-        ]
-
-        db.session.add_all(vendors)
-
-        print("Seeding sweets...")
-        sweets = [
-            Sweet(name="Chocolate Chip Cookie"),
-            Sweet(name="Chocolate Chunk Cookie"),
-            Sweet(name="M&Ms Cookie"),
-            Sweet(name="White Chocolate Cookie"),
-            Sweet(name="Brownie"),
-            Sweet(name="Peanut Butter Icecream Cake"),
-        ]
-
-        db.session.add_all(sweets)
-
-        print("Seeding vendor sweets...")
-        vendor_sweets = []
-        for sweet in sweets:
-            vendor = rc(vendors)
-            vendor_sweets.append(
-                VendorSweet(sweet=sweet, vendor=vendor, price = randrange(50))
-            )
-        db.session.add_all(vendor_sweets)
-        db.session.commit()
+        if args.vendors is None:
+            seed_demo()
+        else:
+            start = time.perf_counter()
+            counts = load_catalog(
+                db.engine, args.vendors, args.sweets, args.offerings,
+                args.seed, args.chunk_size, log=print)
+            elapsed = time.perf_counter() - start
+            print(', '.join(f'{n:,} {table}' for table, n in counts.items())
+                  + f' in {elapsed:.1f}s')
 
         print("Done seeding!")
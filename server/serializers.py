@@ -0,0 +1,62 @@
+import json
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+
+def dumps(obj, pretty=False, default=None):
+    '''Encodes `obj` as JSON bytes, with orjson when it is installed.
+
+    orjson rejects integers wider than 64 bits and non-string dict keys, which
+    the standard library accepts; those fall back to it.'''
+    if orjson is not None:
+        option = orjson.OPT_SORT_KEYS
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(obj, default=default, option=option)
+        except TypeError:
+            pass
+    if pretty:
+        return json.dumps(obj, default=default, indent=2, sort_keys=True).encode()
+    return json.dumps(
+        obj, default=default, separators=(',', ':'), sort_keys=True).encode()
+
+
+def rows_to_dicts(rows, fields):
+    '''Turns column-only result rows into the dicts the API returns, without
+    materializing ORM objects.'''
+    return [dict(zip(fields, row)) for row in rows]
+
+
+def model_fields(model):
+    '''Columns selected for `model` when serializing it without the ORM.'''
+    return tuple(getattr(model, field) for field in model.serialize_fields)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    '''Flask JSON provider that encodes responses straight to bytes.
+
+    Output is compact unless the app runs in debug mode or `compact` is set
+    to False, matching Flask's defaults.'''
+
+    def dumps(self, obj, **kwargs):
+        if kwargs or orjson is None:
+            return super().dumps(obj, **kwargs)
+        try:
+            return orjson.dumps(
+                obj, default=self.default, option=orjson.OPT_SORT_KEYS).decode()
+        except TypeError:
+            return super().dumps(obj, **kwargs)
+
+    def pretty(self):
+        return (self.compact is None and self._app.debug) or self.compact is False
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = dumps(obj, pretty=self.pretty(), default=self.default)
+        return self._app.response_class(body + b'\n', mimetype=self.mimetype)
@@ -0,0 +1,322 @@
+'''In-memory snapshot of the catalog serving /vendors, /sweets and their
+by-id routes without SQL.
+
+Rows are held in `__slots__` records keyed by id, with the ids of each table
+in a sorted array for listing and keyset pages. Vendors and sweets keep
+adjacency lists of their offerings (vendor_sweets), so embeds are pointer
+walks. Before each read the snapshot applies the change log entries
+(changes.py) written since its last refresh: it reloads the rows they name
+by id and drops the ones that are gone. A `reload` or `compacted` entry, or
+more changed rows than REFRESH_RELOAD_RATIO of the catalog, reloads
+everything.
+
+Reads check the log at most once per CATALOG_SNAPSHOT_INTERVAL seconds,
+and on the first read after a commit made through this process's session.
+The check is a lock-free max(seq) lookup; only a refresh that has entries to
+apply takes the lock that reads share.
+
+Set CATALOG_SNAPSHOT=1 to serve reads from it. Requests with options the
+snapshot does not implement (`include`, `stream`) fall through to SQL.
+'''
+import threading
+import time
+from array import array
+from bisect import bisect_right, insort
+
+from sqlalchemy import event, select
+
+import changes
+from bulk import id_chunks
+from models import Sweet, Vendor, VendorSweet
+
+SERVED_ARGS = frozenset(('fields', 'embed', 'limit', 'after', 'ids'))
+
+REFRESH_RELOAD_RATIO = 0.1
+DEFAULT_INTERVAL = 1.0
+
+
+class NamedRecord:
+    '''A vendor or sweet, with its offerings in id order.'''
+    __slots__ = ('id', 'name', 'offerings')
+
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+        self.offerings = []
+
+
+class OfferingRecord:
+    __slots__ = ('id', 'price', 'sweet_id', 'vendor_id')
+
+    def __init__(self, id, price, sweet_id, vendor_id):
+        self.id = id
+        self.price = price
+        self.sweet_id = sweet_id
+        self.vendor_id = vendor_id
+
+
+def by_id(record):
+    return record.id
+
+
+class Table:
+    '''The records of one table by id, and their ids in ascending order.'''
+
+    def __init__(self, record):
+        self.record = record
+        self.fields = tuple(f for f in record.__slots__ if f != 'offerings')
+        self.rows = {}
+        self.ids = array('q')
+
+    def __len__(self):
+        return len(self.rows)
+
+    def load(self, rows):
+        self.rows = {row[0]: self.record(*row) for row in rows}
+        self.ids = array('q', sorted(self.rows))
+
+    def add(self, record):
+        if record.id not in self.rows:
+            insort(self.ids, record.id)
+        self.rows[record.id] = record
+
+    def remove(self, id):
+        record = self.rows.pop(id, None)
+        if record is not None:
+            del self.ids[bisect_right(self.ids, id) - 1]
+        return record
+
+    def page(self, after, limit):
+        '''Returns the records after id `after`, at most `limit` of them, and
+        the cursor of the next page or None.'''
+        start = bisect_right(self.ids, after)
+        ids = self.ids[start:] if limit is None else self.ids[start:start + limit + 1]
+        next_cursor = None
+        if limit is not None and len(ids) > limit:
+            ids = ids[:limit]
+            next_cursor = ids[-1]
+        return [self.rows[id] for id in ids], next_cursor
+
+
+class CatalogSnapshot:
+    '''Serves catalog reads from memory when CATALOG_SNAPSHOT is on.'''
+
+    def __init__(self, app=None, db=None):
+        self.enabled = False
+        self.seq = None
+        self.vendors = Table(NamedRecord)
+        self.sweets = Table(NamedRecord)
+        self.offerings = Table(OfferingRecord)
+        self.tables = {
+            Vendor: self.vendors, Sweet: self.sweets, VendorSweet: self.offerings}
+        self.parents = (('vendor_id', self.vendors), ('sweet_id', self.sweets))
+        # Offerings whose vendor or sweet is not in the snapshot, by
+        # (key, parent id), attached if that parent shows up.
+        self.orphans = {}
+        self.refreshes = 0
+        self.reloads = 0
+        self.refresh_seconds = 0.0
+        self.interval = DEFAULT_INTERVAL
+        self._checked = None
+        self._lock = threading.RLock()
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        app.config.setdefault('CATALOG_SNAPSHOT', False)
+        app.config.setdefault('CATALOG_SNAPSHOT_INTERVAL', DEFAULT_INTERVAL)
+        self.enabled = app.config['CATALOG_SNAPSHOT']
+        self.interval = app.config['CATALOG_SNAPSHOT_INTERVAL']
+        self.db = db
+        app.extensions['catalog_snapshot'] = self
+
+        event.listen(db.session, 'after_commit', self._invalidate)
+
+    def _invalidate(self, session):
+        self._checked = None
+
+    def serves(self, args):
+        return self.enabled and SERVED_ARGS.issuperset(args)
+
+    def refresh(self):
+        '''Brings the snapshot up to date with the change log.'''
+        with self.db.engine.connect() as conn:
+            if self.seq is not None and changes.last_seq(conn) == self.seq:
+                return
+            with self._lock:
+                start = time.perf_counter()
+                if self.seq is None:
+                    self.load(conn)
+                else:
+                    self.apply(conn, changes.since(conn, self.seq))
+                self.refreshes += 1
+                self.refresh_seconds += time.perf_counter() - start
+
+    def refresh_if_due(self):
+        '''Refreshes unless the log was checked less than `interval` seconds
+        ago with no commit through the session since.'''
+        now = time.monotonic()
+        if self.seq is not None and self._checked is not None \
+                and now - self._checked < self.interval:
+            return
+        # Set first, so a commit landing during the refresh resets it.
+        self._checked = now
+        try:
+            self.refresh()
+        except Exception:
+            self._checked = None
+            raise
+
+    def select(self, model):
+        return select(*(getattr(model, field) for field in self.tables[model].fields))
+
+    def load(self, conn):
+        seq = changes.last_seq(conn)
+        for model, table in self.tables.items():
+            table.load(conn.execute(self.select(model).order_by(model.id)))
+        self.orphans = {}
+        for offering in self.offerings.rows.values():
+            self._attach(offering, append=True)
+        self.seq = seq
+        self.reloads += 1
+
+    def apply(self, conn, entries):
+        if not entries:
+            return
+        size = len(self.vendors) + len(self.sweets) + len(self.offerings)
+        if any(op in (changes.RELOAD, changes.COMPACTED) for _, _, _, op in entries) or \
+                len(entries) > max(100, size * REFRESH_RELOAD_RATIO):
+            self.load(conn)
+            return
+        changed = {model.__tablename__: set() for model in self.tables}
+        for _, table_name, row_id, _ in entries:
+            changed[table_name].add(row_id)
+        # Vendors and sweets first, so new offerings find their parents.
+        for model, table in self.tables.items():
+            ids = changed[model.__tablename__]
+            found = set()
+            for chunk in id_chunks(sorted(ids)):
+                for row in conn.execute(
+                        self.select(model).where(model.id.in_(chunk))):
+                    found.add(row[0])
+                    self._upsert(table, row)
+            for id in ids - found:
+                self._remove(table, id)
+        self.seq = entries[-1][0]
+
+    def _attach(self, offering, append=False):
+        for key, parents in self.parents:
+            parent = parents.rows.get(getattr(offering, key))
+            if parent is None:
+                self.orphans.setdefault((key, getattr(offering, key)), []).append(offering)
+            elif append:
+                parent.offerings.append(offering)
+            else:
+                ids = [sibling.id for sibling in parent.offerings]
+                parent.offerings.insert(bisect_right(ids, offering.id), offering)
+
+    def _detach(self, offering):
+        for key, parents in self.parents:
+            parent = parents.rows.get(getattr(offering, key))
+            siblings = parent.offerings if parent is not None else \
+                self.orphans.get((key, getattr(offering, key)), [])
+            siblings.remove(offering)
+
+    def _upsert(self, table, row):
+        if table is self.offerings:
+            previous = table.rows.get(row[0])
+            if previous is not None:
+                self._detach(previous)
+            offering = OfferingRecord(*row)
+            table.add(offering)
+            self._attach(offering)
+            return
+        record = table.rows.get(row[0])
+        if record is not None:
+            record.name = row[1]
+            return
+        record = table.record(*row)
+        key = 'vendor_id' if table is self.vendors else 'sweet_id'
+        record.offerings = sorted(self.orphans.pop((key, record.id), []), key=by_id)
+        table.add(record)
+
+    def _remove(self, table, id):
+        record = table.remove(id)
+        if record is None:
+            return
+        if table is self.offerings:
+            self._detach(record)
+        else:
+            key = 'vendor_id' if table is self.vendors else 'sweet_id'
+            if record.offerings:
+                self.orphans[(key, id)] = record.offerings
+
+    def to_dicts(self, fieldset, records):
+        '''Serializes `records` the way Fieldset.to_dicts serializes rows.
+        Like its joined SELECT, embeds skip offerings whose other side is
+        missing.'''
+        if fieldset.model is Vendor:
+            key, other, nested = 'sweet_id', self.sweets, 'sweet'
+        else:
+            key, other, nested = 'vendor_id', self.vendors, 'vendor'
+        dicts = []
+        for record in records:
+            d = {field: getattr(record, field) for field in fieldset.fields}
+            for name in fieldset.embeds:
+                embedded = d[name] = []
+                for offering in record.offerings:
+                    parent = other.rows.get(getattr(offering, key))
+                    if parent is None:
+                        continue
+                    o = {field: getattr(offering, field)
+                         for field in VendorSweet.serialize_fields}
+                    o[nested] = {field: getattr(parent, field)
+                                 for field in other.fields}
+                    embedded.append(o)
+            dicts.append(d)
+        return dicts
+
+    def page(self, fieldset, after, limit):
+        '''Returns (dicts, next cursor) for one page of `fieldset.model`, or
+        the whole table when `limit` is None.'''
+        self.refresh_if_due()
+        with self._lock:
+            records, next_cursor = self.tables[fieldset.model].page(after or 0, limit)
+            return self.to_dicts(fieldset, records), next_cursor
+
+    def get(self, fieldset, id):
+        self.refresh_if_due()
+        with self._lock:
+            record = self.tables[fieldset.model].rows.get(id)
+            if record is None:
+                return None
+            return self.to_dicts(fieldset, [record])[0]
+
+    def get_many(self, fieldset, ids):
+        '''Returns {id: dict} for the rows of `ids` that exist.'''
+        self.refresh_if_due()
+        with self._lock:
+            rows = self.tables[fieldset.model].rows
+            records = [rows[id] for id in ids if id in rows]
+            dicts = self.to_dicts(fieldset, records)
+            return {record.id: d for record, d in zip(records, dicts)}
+
+    def metrics(self):
+        '''Prometheus text lines for /metrics.'''
+        if not self.enabled:
+            return []
+        lines = ['# TYPE catalog_snapshot_rows gauge']
+        for model, table in self.tables.items():
+            lines.append(
+                f'catalog_snapshot_rows{{table="{model.__tablename__}"}} {len(table)}')
+        lines += [
+            '# TYPE catalog_snapshot_seq gauge',
+            f'catalog_snapshot_seq {self.seq or 0}',
+            '# TYPE catalog_snapshot_refreshes_total counter',
+            f'catalog_snapshot_refreshes_total {self.refreshes}',
+            '# TYPE catalog_snapshot_reloads_total counter',
+            f'catalog_snapshot_reloads_total {self.reloads}',
+            '# TYPE catalog_snapshot_refresh_seconds_total counter',
+            f'catalog_snapshot_refresh_seconds_total {self.refresh_seconds}',
+        ]
+        return lines
@@ -0,0 +1,163 @@
+'''Per-sweet and per-vendor price summaries (count, min, max, sum).
+
+SQLite triggers on vendor_sweets update the summary rows in the same
+transaction as the write, whichever code path makes it: the ORM,
+Core bulk inserts or the async app. Inserts only touch one summary row per
+key. Deletes recompute min or max only when the removed price was the
+extreme, through the vendor_sweets indexes, and drop rows whose count
+reaches 0.
+
+    flask price-summaries check      # compare with a full recompute
+    flask price-summaries rebuild    # recompute every summary
+'''
+from contextlib import contextmanager
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import DDL, event, text
+
+from models import db, SweetPriceSummary, VendorPriceSummary
+
+SUMMARIES = (
+    (SweetPriceSummary.__tablename__, 'sweet_id'),
+    (VendorPriceSummary.__tablename__, 'vendor_id'),
+)
+
+ADD = '''
+    INSERT INTO {table} (key_id, count, min_price, max_price, price_sum)
+    SELECT NEW.key_id, 1, NEW.price, NEW.price, NEW.price
+    WHERE NEW.key_id IS NOT NULL
+    ON CONFLICT (key_id) DO UPDATE SET
+        count = count + 1,
+        min_price = min(min_price, excluded.min_price),
+        max_price = max(max_price, excluded.max_price),
+        price_sum = price_sum + excluded.price_sum;'''
+
+REMOVE = '''
+    UPDATE {table} SET
+        count = count - 1,
+        price_sum = price_sum - OLD.price,
+        min_price = CASE WHEN min_price < OLD.price THEN min_price ELSE (
+            SELECT min(price) FROM vendor_sweets WHERE key_id = OLD.key_id) END,
+        max_price = CASE WHEN max_price > OLD.price THEN max_price ELSE (
+            SELECT max(price) FROM vendor_sweets WHERE key_id = OLD.key_id) END
+    WHERE key_id = OLD.key_id;
+    DELETE FROM {table} WHERE key_id = OLD.key_id AND count = 0;'''
+
+TRIGGERS = {
+    'insert': ('AFTER INSERT', 'NEW.key_id IS NOT NULL', ADD),
+    'delete': ('AFTER DELETE', 'OLD.key_id IS NOT NULL', REMOVE),
+    'update': (
+        'AFTER UPDATE OF price, key_id',
+        'OLD.key_id IS NOT NULL OR NEW.key_id IS NOT NULL',
+        # Each half is a no-op when its key is NULL.
+        REMOVE + ADD,
+    ),
+}
+
+
+def trigger_ddl():
+    '''Returns (name, CREATE TRIGGER statement) for every summary trigger.'''
+    statements = []
+    for table, key in SUMMARIES:
+        for event_name, (timing, when, body) in TRIGGERS.items():
+            name = f'{table}_{event_name}'
+            statement = (
+                f'CREATE TRIGGER {name} {timing} ON vendor_sweets '
+                f'WHEN {when} BEGIN{body.format(table=table)}\nEND')
+            statements.append((name, statement.replace('key_id', key)))
+    return statements
+
+
+def recompute_select(key):
+    return (
+        'SELECT key_id, count(*), min(price), max(price), sum(price) '
+        'FROM vendor_sweets WHERE key_id IS NOT NULL GROUP BY key_id'
+    ).replace('key_id', key)
+
+
+def rebuild(conn):
+    '''Replaces every summary row with a full recompute from vendor_sweets.'''
+    for table, key in SUMMARIES:
+        conn.execute(text(f'DELETE FROM {table}'))
+        conn.execute(text(
+            f'INSERT INTO {table} ({key}, count, min_price, max_price, price_sum) '
+            + recompute_select(key)))
+
+
+def check(conn):
+    '''Compares the summary tables with a full recompute and returns one
+    (table, key, stored, expected) tuple per mismatching row.'''
+    mismatches = []
+    for table, key in SUMMARIES:
+        columns = f'{key}, count, min_price, max_price, price_sum'
+        stored = {row[0]: tuple(row[1:]) for row in conn.execute(
+            text(f'SELECT {columns} FROM {table}'))}
+        expected = {row[0]: tuple(row[1:]) for row in conn.execute(
+            text(recompute_select(key)))}
+        for id in sorted(stored.keys() | expected.keys()):
+            if stored.get(id) != expected.get(id):
+                mismatches.append((table, id, stored.get(id), expected.get(id)))
+    return mismatches
+
+
+def create_triggers(conn):
+    for name, statement in trigger_ddl():
+        conn.execute(DDL(statement))
+
+
+def drop_triggers(conn):
+    for name, statement in trigger_ddl():
+        conn.execute(DDL(f'DROP TRIGGER IF EXISTS {name}'))
+
+
+@contextmanager
+def deferred(conn):
+    '''Drops the triggers for the duration of a bulk load on `conn` and
+    rebuilds the summaries once at the end. Run it inside a transaction:
+    SQLite DDL is transactional, so other connections never see the
+    triggers missing.'''
+    if conn.dialect.name != 'sqlite':
+        yield
+        return
+    drop_triggers(conn)
+    yield
+    rebuild(conn)
+    create_triggers(conn)
+
+
+def _create_triggers(target, connection, **kw):
+    if connection.dialect.name == 'sqlite':
+        create_triggers(connection)
+
+
+# db.create_all() (tests, benchmarks) gets the triggers as well; migrated
+# databases get them from the migration that added the summary tables.
+event.listen(db.metadata, 'after_create', _create_triggers)
+
+
+@click.group('price-summaries')
+def cli():
+    '''Maintain the materialized price summaries.'''
+
+
+@cli.command('check')
+@with_appcontext
+def check_command():
+    '''Verify the summaries against a full recompute.'''
+    with db.engine.connect() as conn:
+        mismatches = check(conn)
+    for table, id, stored, expected in mismatches:
+        click.echo(f'{table} {id}: stored {stored}, expected {expected}')
+    if mismatches:
+        raise click.ClickException(f'{len(mismatches)} summaries out of date')
+    click.echo('Price summaries are consistent.')
+
+
+@cli.command('rebuild')
+@with_appcontext
+def rebuild_command():
+    '''Recompute every summary from vendor_sweets.'''
+    with db.engine.begin() as conn:
+        rebuild(conn)
+    click.echo('Price summaries rebuilt.')
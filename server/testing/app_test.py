@@ -1,4 +1,5 @@
 import json
+import pytest
 from os import environ
 from flask import request
 from faker import Faker
@@ -51,6 +52,37 @@ class TestApp:
             assert response['name'] == vendor.name
             assert 'vendor_sweets' in response
 
+    @pytest.mark.wsgi_only
+    def test_gets_vendor_by_id_with_bounded_queries(self, sql_statements):
+        '''embeds each vendor_sweet's sweet in /vendors/<int:id> using two queries however many offerings exist.'''
+
+        with app.app_context():
+            fake = Faker()
+            vendor = Vendor(name=fake.name())
+            sweets = [Sweet(name=fake.name()) for _ in range(5)]
+            db.session.add_all([vendor, *sweets])
+            db.session.commit()
+            db.session.add_all([
+                VendorSweet(vendor_id=vendor.id, sweet_id=sweet.id, price=i)
+                for i, sweet in enumerate(sweets)
+            ])
+            db.session.commit()
+            vendor_id = vendor.id
+            names = {sweet.id: sweet.name for sweet in sweets}
+
+        sql_statements.clear()
+        response = app.test_client().get(f'/vendors/{vendor_id}')
+        assert response.status_code == 200
+        assert len(sql_statements) == 2
+
+        vendor_sweets = response.json['vendor_sweets']
+        assert len(vendor_sweets) == 5
+        for vs in vendor_sweets:
+            assert vs['sweet']['name'] == names[vs['sweet_id']]
+            assert vs['sweet']['id'] == vs['sweet_id']
+            assert vs['vendor_id'] == vendor_id
+            assert 'price' in vs
+
     def test_returns_404_if_no_vendor_to_get(self):
         '''returns an error message and 404 status code with GET request to /vendors/<int:id> by a non-existent ID.'''
 
@@ -180,6 +212,13 @@ class TestApp:
             assert response.json['errors'] == ["validation errors"]
 
 
+    @pytest.mark.parametrize('body', [[1], 'text', 3])
+    def test_400_for_non_object_body(self, body):
+        '''returns a 400 status code if the body of a POST request to /vendor_sweets is not a JSON object.'''
+        response = app.test_client().post('/vendor_sweets', json=body)
+        assert response.status_code == 400
+        assert response.json['errors'] == ["expected a JSON object"]
+
     def test_deletes_vendor_sweet_by_id(self):
         '''deletes one VendorSweet with DELETE request to /vendor_sweets/<int:id>.'''
 
@@ -211,4 +250,372 @@ class TestApp:
         with app.app_context():
             response = app.test_client().delete('/vendor_sweets/0')
             assert response.status_code == 404
-            assert response.json.get('error') == "VendorSweet not found"
\ No newline at end of file
+            assert response.json.get('error') == "VendorSweet not found"
+
+    @pytest.mark.wsgi_only
+    def test_paginates_vendors_with_keyset_cursor(self):
+        '''returns one page of vendors and a next cursor with GET requests to /vendors?limit=&after=.'''
+
+        with app.app_context():
+            fake = Faker()
+            db.session.add_all([Vendor(name=fake.name()) for _ in range(4)])
+            db.session.commit()
+
+            ids = [vendor.id for vendor in Vendor.query.order_by(Vendor.id)]
+            after = ids[-4]
+
+            response = app.test_client().get(f'/vendors?limit=2&after={after}')
+            assert response.status_code == 200
+            assert [vendor['id'] for vendor in response.json] == ids[-3:-1]
+            assert response.headers['X-Next-Cursor'] == str(ids[-2])
+            assert 'rel="next"' in response.headers['Link']
+
+            response = app.test_client().get(
+                f'/vendors?limit=2&after={ids[-2]}')
+            assert [vendor['id'] for vendor in response.json] == ids[-1:]
+            assert 'Link' not in response.headers
+
+    @pytest.mark.wsgi_only
+    def test_400_for_invalid_page_args(self):
+        '''returns a 400 status code for a non-numeric limit or an unknown stream format.'''
+
+        with app.app_context():
+            response = app.test_client().get('/sweets?limit=abc')
+            assert response.status_code == 400
+            assert response.json['errors'] == ['limit must be an integer']
+
+            response = app.test_client().get('/sweets?stream=xml')
+            assert response.status_code == 400
+
+    @pytest.mark.wsgi_only
+    def test_streams_sweets(self):
+        '''streams every sweet as a JSON array or NDJSON with GET requests to /sweets?stream=.'''
+
+        with app.app_context():
+            fake = Faker()
+            db.session.add_all([Sweet(name=fake.name()) for _ in range(2)])
+            db.session.commit()
+
+            sweets = [sweet.to_dict() for sweet in Sweet.query.order_by(Sweet.id)]
+
+            response = app.test_client().get('/sweets?stream=json')
+            assert response.status_code == 200
+            assert response.content_type == 'application/json'
+            assert response.json == sweets
+
+            response = app.test_client().get('/sweets?stream=ndjson')
+            assert response.content_type == 'application/x-ndjson'
+            lines = response.get_data(as_text=True).splitlines()
+            assert [json.loads(line) for line in lines] == sweets
+
+    @pytest.mark.wsgi_only
+    def test_creates_vendor_sweet_with_one_read(self, sql_statements):
+        '''creates a VendorSweet with a single SELECT besides the INSERT with a POST request to /vendor_sweets.'''
+
+        with app.app_context():
+            fake = Faker()
+            sweet = Sweet(name=fake.name())
+            vendor = Vendor(name=fake.name())
+            db.session.add_all([sweet, vendor])
+            db.session.commit()
+            sweet_id, vendor_id = sweet.id, vendor.id
+
+        sql_statements.clear()
+        response = app.test_client().post(
+            '/vendor_sweets',
+            json={"price": 5, "vendor_id": vendor_id, "sweet_id": sweet_id}
+        )
+        assert response.status_code == 201
+        selects = [s for s in sql_statements if s.lstrip().upper().startswith('SELECT')]
+        inserts = [s for s in sql_statements if s.lstrip().upper().startswith('INSERT')]
+        assert len(selects) == 1
+        assert len(inserts) == 1
+
+    def test_404_for_missing_sweet_or_vendor(self):
+        '''returns a 404 status code when a POST request to /vendor_sweets references a non-existent sweet or vendor.'''
+
+        with app.app_context():
+            vendor = Vendor(name=Faker().name())
+            sweet = Sweet(name=Faker().name())
+            db.session.add_all([vendor, sweet])
+            db.session.commit()
+
+            response = app.test_client().post(
+                '/vendor_sweets',
+                json={"price": 5, "vendor_id": vendor.id, "sweet_id": 0}
+            )
+            assert response.status_code == 404
+            assert response.json['error'] == "Sweet not found"
+
+            response = app.test_client().post(
+                '/vendor_sweets',
+                json={"price": 5, "vendor_id": 0, "sweet_id": sweet.id}
+            )
+            assert response.status_code == 404
+            assert response.json['error'] == "Vendor not found"
+
+            response = app.test_client().post(
+                '/vendor_sweets',
+                json={"price": 5, "sweet_id": sweet.id}
+            )
+            assert response.status_code == 400
+
+    @pytest.mark.wsgi_only
+    def test_bulk_creates_vendor_sweets(self):
+        '''creates many VendorSweets and reports each row with a POST request to /vendor_sweets/bulk.'''
+
+        with app.app_context():
+            fake = Faker()
+            sweet = Sweet(name=fake.name())
+            vendor = Vendor(name=fake.name())
+            db.session.add_all([sweet, vendor])
+            db.session.commit()
+
+            rows = [
+                {"price": 1, "vendor_id": vendor.id, "sweet_id": sweet.id},
+                {"price": -1, "vendor_id": vendor.id, "sweet_id": sweet.id},
+                {"price": 2, "vendor_id": vendor.id, "sweet_id": 0},
+                {"price": 3, "vendor_id": vendor.id, "sweet_id": sweet.id},
+            ]
+            response = app.test_client().post(
+                '/vendor_sweets/bulk?chunk_size=2', json=rows)
+            assert response.status_code == 200
+            report = response.json
+            assert report['created'] == 2
+            assert report['failed'] == 2
+            results = report['results']
+            assert [result['index'] for result in results] == [0, 1, 2, 3]
+            assert results[1]['errors'] == ['validation errors']
+            assert results[2]['errors'] == ['Sweet not found']
+
+            created = db.session.get(VendorSweet, results[3]['id'])
+            assert created.price == 3
+            assert created.sweet_id == sweet.id
+
+    @pytest.mark.wsgi_only
+    def test_bulk_rejects_integers_out_of_range(self):
+        '''reports rows with integers SQLite cannot store as invalid with a POST request to /vendor_sweets/bulk.'''
+
+        with app.app_context():
+            fake = Faker()
+            sweet = Sweet(name=fake.name())
+            vendor = Vendor(name=fake.name())
+            db.session.add_all([sweet, vendor])
+            db.session.commit()
+
+            rows = [
+                {"price": 2 ** 70, "vendor_id": vendor.id, "sweet_id": sweet.id},
+                {"price": 1, "vendor_id": -2 ** 64, "sweet_id": sweet.id},
+                {"price": 1, "vendor_id": vendor.id, "sweet_id": sweet.id},
+            ]
+            response = app.test_client().post('/vendor_sweets/bulk', json=rows)
+            assert response.status_code == 200
+            results = response.json['results']
+            assert [result.get('errors') for result in results] == [
+                ['validation errors'], ['validation errors'], None]
+
+    @pytest.mark.wsgi_only
+    def test_bulk_checks_ids_in_bounded_queries(self, sql_statements):
+        '''checks the sweet and vendor ids of a large chunk at most 500 per query.'''
+
+        with app.app_context():
+            vendor = Vendor(name=Faker().name())
+            db.session.add(vendor)
+            db.session.commit()
+
+            rows = [{"price": 1, "vendor_id": vendor.id, "sweet_id": -id}
+                    for id in range(1, 1201)]
+            sql_statements.clear()
+            response = app.test_client().post(
+                '/vendor_sweets/bulk?chunk_size=2000', json=rows)
+            assert response.json['failed'] == 1200
+            lookups = [s for s in sql_statements if 'FROM sweets' in s]
+            assert len(lookups) == 3
+            assert max(s.count('?') for s in lookups) == 500
+
+    @pytest.mark.wsgi_only
+    def test_bulk_accepts_ndjson(self):
+        '''accepts newline-delimited JSON with a POST request to /vendor_sweets/bulk.'''
+
+        with app.app_context():
+            fake = Faker()
+            sweet = Sweet(name=fake.name())
+            vendor = Vendor(name=fake.name())
+            db.session.add_all([sweet, vendor])
+            db.session.commit()
+
+            body = '\n'.join([
+                json.dumps({"price": 4, "vendor_id": vendor.id, "sweet_id": sweet.id}),
+                '{not json',
+            ])
+            response = app.test_client().post(
+                '/vendor_sweets/bulk', data=body,
+                content_type='application/x-ndjson')
+            assert response.status_code == 200
+            assert response.json['created'] == 1
+            assert response.json['results'][1]['errors'] == ['validation errors']
+
+            response = app.test_client().post(
+                '/vendor_sweets/bulk', json={"price": 4})
+            assert response.status_code == 400
+
+    @pytest.mark.wsgi_only
+    def test_gets_sweet_vendors_with_price_stats(self):
+        '''returns the vendors selling a sweet, one page at a time, with its price aggregates with GET requests to /sweets/<int:id>/vendors.'''
+
+        with app.app_context():
+            fake = Faker()
+            sweet = Sweet(name=fake.name())
+            vendors = [Vendor(name=fake.name()) for _ in range(3)]
+            db.session.add_all([sweet, *vendors])
+            db.session.commit()
+            db.session.add_all([
+                VendorSweet(sweet_id=sweet.id, vendor_id=vendor.id, price=price)
+                for vendor, price in zip(vendors, [300, 100, 200])
+            ])
+            db.session.commit()
+
+            response = app.test_client().get(f'/sweets/{sweet.id}/vendors?limit=2')
+            assert response.status_code == 200
+            assert response.json['id'] == sweet.id
+            assert response.json['price_stats'] == {
+                'count': 3, 'min': 100, 'max': 300, 'sum': 600, 'avg': 200.0}
+            assert [v['id'] for v in response.json['vendors']] == \
+                [vendors[0].id, vendors[1].id]
+            assert response.json['vendors'][0]['price'] == 300
+
+            cursor = response.headers['X-Next-Cursor']
+            response = app.test_client().get(
+                f'/sweets/{sweet.id}/vendors?limit=2&after={cursor}')
+            assert [v['name'] for v in response.json['vendors']] == [vendors[2].name]
+            assert 'Link' not in response.headers
+
+            response = app.test_client().get('/sweets/0/vendors')
+            assert response.status_code == 404
+            assert response.json.get('error') == "Sweet not found"
+
+    @pytest.mark.wsgi_only
+    def test_gets_sweets_with_price_stats(self):
+        '''includes price aggregates in every sweet or vendor with GET requests to /sweets?include=price_stats and /vendors?include=price_stats.'''
+
+        with app.app_context():
+            fake = Faker()
+            sold, unsold = Sweet(name=fake.name()), Sweet(name=fake.name())
+            vendor = Vendor(name=fake.name())
+            db.session.add_all([sold, unsold, vendor])
+            db.session.commit()
+            db.session.add_all([
+                VendorSweet(sweet_id=sold.id, vendor_id=vendor.id, price=price)
+                for price in (10, 30)
+            ])
+            db.session.commit()
+
+            client = app.test_client()
+            response = client.get(
+                f'/sweets?include=price_stats&limit=2&after={sold.id - 1}')
+            assert response.status_code == 200
+            assert response.json == [
+                {'id': sold.id, 'name': sold.name, 'price_stats': {
+                    'count': 2, 'min': 10, 'max': 30, 'sum': 40, 'avg': 20.0}},
+                {'id': unsold.id, 'name': unsold.name, 'price_stats': {
+                    'count': 0, 'min': None, 'max': None, 'sum': 0, 'avg': None}},
+            ]
+
+            response = client.get(
+                f'/vendors?include=price_stats&limit=1&after={vendor.id - 1}')
+            assert response.json[0]['price_stats'] == {
+                'count': 2, 'min': 10, 'max': 30, 'sum': 40, 'avg': 20.0}
+
+            client.post('/vendor_sweets', json={
+                "price": 50, "vendor_id": vendor.id, "sweet_id": sold.id})
+            response = client.get(
+                f'/sweets?include=price_stats&limit=1&after={sold.id - 1}')
+            assert response.json[0]['price_stats']['max'] == 50
+
+            response = client.get('/sweets?include=vendors')
+            assert response.status_code == 400
+
+    @pytest.mark.wsgi_only
+    def test_batch_mutates_vendor_sweets(self):
+        '''deletes, reprices and creates VendorSweets in one POST request to /vendor_sweets/batch, reporting missing ids.'''
+
+        with app.app_context():
+            fake = Faker()
+            sweet = Sweet(name=fake.name())
+            vendor = Vendor(name=fake.name())
+            db.session.add_all([sweet, vendor])
+            db.session.commit()
+            vendor_sweets = [
+                VendorSweet(sweet_id=sweet.id, vendor_id=vendor.id, price=price)
+                for price in (1, 2, 3)
+            ]
+            db.session.add_all(vendor_sweets)
+            db.session.commit()
+            ids = [vs.id for vs in vendor_sweets]
+
+            response = app.test_client().post('/vendor_sweets/batch', json={
+                "delete": [ids[0], ids[1], 0],
+                "update": [{"id": ids[2], "price": 30}, {"id": ids[0], "price": 10}],
+                "create": [{"price": 4, "vendor_id": vendor.id, "sweet_id": sweet.id}],
+            })
+            assert response.status_code == 200
+            report = response.json
+            assert report['deleted'] == ids[:2]
+            assert report['updated'] == [ids[2]]
+            assert report['not_found'] == {'delete': [0], 'update': [ids[0]]}
+
+            db.session.expire_all()
+            assert db.session.get(VendorSweet, ids[0]) is None
+            assert db.session.get(VendorSweet, ids[2]).price == 30
+            assert db.session.get(VendorSweet, report['created'][0]).price == 4
+
+    @pytest.mark.wsgi_only
+    def test_batch_rejects_invalid_rows(self):
+        '''applies nothing and returns a 400 status code when any row of a batch is invalid.'''
+
+        with app.app_context():
+            fake = Faker()
+            sweet = Sweet(name=fake.name())
+            vendor = Vendor(name=fake.name())
+            db.session.add_all([sweet, vendor])
+            db.session.commit()
+            vendor_sweet = VendorSweet(sweet_id=sweet.id, vendor_id=vendor.id, price=1)
+            db.session.add(vendor_sweet)
+            db.session.commit()
+
+            client = app.test_client()
+            response = client.post('/vendor_sweets/batch', json={
+                "delete": [vendor_sweet.id],
+                "update": [{"id": vendor_sweet.id, "price": -1}],
+                "create": [{"price": 4, "vendor_id": vendor.id, "sweet_id": 0}],
+            })
+            assert response.status_code == 400
+            assert response.json['errors'] == [
+                {'update': 0, 'errors': ['validation errors']},
+                {'create': 0, 'errors': ['Sweet not found']},
+            ]
+            db.session.expire_all()
+            assert db.session.get(VendorSweet, vendor_sweet.id).price == 1
+
+            response = client.post('/vendor_sweets/batch', json={"create": [
+                {"price": -1, "vendor_id": vendor.id, "sweet_id": sweet.id},
+                {"price": 1, "vendor_id": vendor.id, "sweet_id": 0},
+            ]})
+            assert response.json['errors'] == [
+                {'create': 0, 'errors': ['validation errors']},
+                {'create': 1, 'errors': ['Sweet not found']},
+            ]
+
+            response = client.post('/vendor_sweets/batch', json={"update": [
+                {"id": vendor_sweet.id, "price": 2},
+                {"id": vendor_sweet.id, "price": 2 ** 70},
+            ]})
+            assert response.status_code == 400
+            assert response.json['errors'] == [
+                {'update': 1, 'errors': ['validation errors']},
+            ]
+            response = client.post('/vendor_sweets/batch', json={"delete": [2 ** 64]})
+            assert response.status_code == 400
+
+            response = client.post('/vendor_sweets/batch', json={"remove": [1]})
+            assert response.status_code == 400
@@ -0,0 +1,219 @@
+import pytest
+from faker import Faker
+from app import app, response_cache
+from cache import Cache, LRUCache
+from models import db, Sweet, Vendor, VendorSweet
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class TestLRUCache:
+    '''Class LRUCache in cache.py'''
+
+    def test_evicts_least_recently_used(self):
+        '''evicts the least recently used entry once max_entries is exceeded.'''
+
+        cache = LRUCache(max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        assert cache.get('a') == 1
+        cache.set('c', 3)
+
+        assert cache.get('b') is None
+        assert cache.get('a') == 1
+        assert cache.get('c') == 3
+        assert cache.stats() == {
+            'hits': 3, 'misses': 1, 'evictions': 1, 'entries': 2, 'versions': 0}
+
+    def test_expires_after_ttl(self):
+        '''expires entries once their TTL has passed.'''
+
+        clock = FakeClock()
+        cache = LRUCache(ttl=10, clock=clock)
+        cache.set('a', 1)
+        cache.set('b', 2, ttl=20)
+        clock.now = 15
+
+        assert cache.get('a') is None
+        assert cache.get('b') == 2
+
+    def test_versions_are_not_evicted(self):
+        '''keeps version counters regardless of the entry cap.'''
+
+        cache = LRUCache(max_entries=1)
+        cache.bump('vendors')
+        cache.bump('vendors')
+        cache.set('a', 1)
+        cache.set('b', 2)
+        assert cache.version('vendors') == 2
+        assert cache.version('sweets') == 0
+
+    def test_bounds_versions_without_reusing_them(self):
+        '''forgets the least recently bumped versions past max_versions, never handing out an old version again.'''
+
+        cache = LRUCache(max_versions=4)
+        seen = {}
+        for id in range(10):
+            seen.setdefault('vendors', set()).add(cache.version('vendors'))
+            cache.bump('vendors')
+            seen.setdefault(f'vendor:{id}', set()).add(cache.version(f'vendor:{id}'))
+            cache.bump(f'vendor:{id}')
+        assert cache.stats()['versions'] <= 4
+        assert cache.version('vendors') == 10
+        for name, versions in seen.items():
+            assert cache.version(name) > max(versions)
+
+    def test_requires_every_operation(self):
+        '''is abstract until every operation is implemented.'''
+
+        class Partial(Cache):
+            def get(self, key):
+                return None
+
+        with pytest.raises(TypeError):
+            Partial()
+
+
+@pytest.mark.wsgi_only
+class TestResponseCache:
+    '''Class ResponseCache in cache.py'''
+
+    def test_serves_repeat_reads_without_sql(self, sql_statements):
+        '''serves a repeated GET /sweets/<int:id> from the cache.'''
+
+        with app.app_context():
+            sweet = Sweet(name=Faker().name())
+            db.session.add(sweet)
+            db.session.commit()
+            sweet_id = sweet.id
+
+        client = app.test_client()
+        first = client.get(f'/sweets/{sweet_id}')
+        sql_statements.clear()
+        second = client.get(f'/sweets/{sweet_id}')
+
+        assert sql_statements == []
+        assert second.json == first.json
+        assert second.content_type == 'application/json'
+
+    def test_vendor_sweet_writes_invalidate_vendor(self):
+        '''drops a cached /vendors/<int:id> when one of its vendor_sweets is created or deleted.'''
+
+        with app.app_context():
+            fake = Faker()
+            sweet = Sweet(name=fake.name())
+            vendor = Vendor(name=fake.name())
+            db.session.add_all([sweet, vendor])
+            db.session.commit()
+            sweet_id, vendor_id = sweet.id, vendor.id
+
+        client = app.test_client()
+        assert client.get(f'/vendors/{vendor_id}').json['vendor_sweets'] == []
+
+        created = client.post('/vendor_sweets', json={
+            "price": 7, "vendor_id": vendor_id, "sweet_id": sweet_id}).json
+        vendor_sweets = client.get(f'/vendors/{vendor_id}').json['vendor_sweets']
+        assert [vs['id'] for vs in vendor_sweets] == [created['id']]
+
+        client.delete(f'/vendor_sweets/{created["id"]}')
+        assert client.get(f'/vendors/{vendor_id}').json['vendor_sweets'] == []
+
+    def test_writes_only_invalidate_affected_entries(self):
+        '''keeps unrelated entries cached when a vendor_sweet is written.'''
+
+        with app.app_context():
+            fake = Faker()
+            sweet = Sweet(name=fake.name())
+            vendor = Vendor(name=fake.name())
+            db.session.add_all([sweet, vendor])
+            db.session.commit()
+
+            versions = response_cache.backend.version('sweets')
+            db.session.add(VendorSweet(
+                vendor_id=vendor.id, sweet_id=sweet.id, price=1))
+            db.session.commit()
+
+            assert response_cache.backend.version('sweets') == versions
+            assert response_cache.backend.version(f'vendor:{vendor.id}') >= 1
+
+    def test_bulk_statements_invalidate(self):
+        '''drops cached responses after a bulk insert through the session.'''
+
+        with app.app_context():
+            fake = Faker()
+            sweet = Sweet(name=fake.name())
+            vendor = Vendor(name=fake.name())
+            db.session.add_all([sweet, vendor])
+            db.session.commit()
+            sweet_id, vendor_id = sweet.id, vendor.id
+
+        client = app.test_client()
+        assert client.get(f'/vendors/{vendor_id}').json['vendor_sweets'] == []
+        client.post('/vendor_sweets/bulk', json=[
+            {"price": 1, "vendor_id": vendor_id, "sweet_id": sweet_id}])
+        assert len(client.get(f'/vendors/{vendor_id}').json['vendor_sweets']) == 1
+
+
+@pytest.mark.wsgi_only
+class TestConditionalGet:
+    '''ETag handling of ResponseCache.cached in cache.py'''
+
+    def test_returns_304_for_matching_etag(self, sql_statements):
+        '''returns 304 without querying when If-None-Match matches a cached response.'''
+
+        with app.app_context():
+            vendor = Vendor(name=Faker().name())
+            db.session.add(vendor)
+            db.session.commit()
+            vendor_id = vendor.id
+
+        client = app.test_client()
+        response = client.get(f'/vendors/{vendor_id}')
+        etag = response.headers['ETag']
+        assert etag.startswith('"') and not etag.startswith('W/')
+
+        sql_statements.clear()
+        response = client.get(
+            f'/vendors/{vendor_id}', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        assert response.headers['ETag'] == etag
+        assert response.get_data() == b''
+        assert sql_statements == []
+
+    def test_etag_changes_after_write(self):
+        '''returns 200 and a new ETag once the resource has changed.'''
+
+        with app.app_context():
+            sweet = Sweet(name=Faker().name())
+            db.session.add(sweet)
+            db.session.commit()
+            sweet_id = sweet.id
+
+        client = app.test_client()
+        etag = client.get(f'/sweets/{sweet_id}').headers['ETag']
+
+        with app.app_context():
+            db.session.get(Sweet, sweet_id).name = Faker().name()
+            db.session.commit()
+
+        response = client.get(f'/sweets/{sweet_id}', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+
+    def test_etag_without_cache(self):
+        '''answers conditional requests from the body hash when the cache is disabled.'''
+
+        client = app.test_client()
+        etag = client.get('/sweets').headers['ETag']
+        response_cache.enabled = False
+        try:
+            response = client.get('/sweets', headers={'If-None-Match': etag})
+        finally:
+            response_cache.enabled = True
+        assert response.status_code == 304
@@ -0,0 +1,167 @@
+import pytest
+from faker import Faker
+from app import app, catalog_snapshot
+from models import db, Change, Sweet, Vendor
+import changes
+
+pytestmark = pytest.mark.wsgi_only
+
+
+def add_vendor_sweet(price=3):
+    with app.app_context():
+        fake = Faker()
+        vendor, sweet = Vendor(name=fake.name()), Sweet(name=fake.name())
+        db.session.add_all([vendor, sweet])
+        db.session.commit()
+        return vendor.id, sweet.id
+
+
+def latest_seq():
+    with app.app_context():
+        return changes.last_seq(db.session.connection())
+
+
+class TestChanges:
+    '''/changes in app.py'''
+
+    def test_lists_changes_with_current_rows(self):
+        '''lists the changes after since with the current row, or null once deleted.'''
+
+        vendor_id, sweet_id = add_vendor_sweet()
+        since = latest_seq()
+        client = app.test_client()
+        created = client.post('/vendor_sweets', json={
+            'price': 4, 'vendor_id': vendor_id, 'sweet_id': sweet_id}).json
+        client.post('/vendor_sweets', json={
+            'price': 5, 'vendor_id': vendor_id, 'sweet_id': sweet_id})
+        client.delete(f'/vendor_sweets/{created["id"]}')
+
+        response = client.get(f'/changes?since={since}')
+        assert response.status_code == 200
+        feed = response.json
+        assert [(c['table'], c['op']) for c in feed] == [
+            ('vendor_sweets', 'insert'), ('vendor_sweets', 'insert'),
+            ('vendor_sweets', 'delete')]
+        assert [c['seq'] for c in feed] == sorted(c['seq'] for c in feed)
+        assert feed[0]['id'] == created['id'] and feed[0]['row'] is None
+        assert feed[1]['row']['price'] == 5
+        assert feed[2]['row'] is None
+
+    def test_pages_with_since(self):
+        '''pages through the log with limit and a since cursor.'''
+
+        since = latest_seq()
+        for _ in range(3):
+            add_vendor_sweet()
+        client = app.test_client()
+
+        response = client.get(f'/changes?since={since}&limit=4')
+        assert len(response.json) == 4
+        next_since = response.json[-1]['seq']
+        assert response.headers['X-Next-Cursor'] == str(next_since)
+        assert f'since={next_since}' in response.headers['Link']
+
+        rest = client.get(f'/changes?since={next_since}&limit=4')
+        assert len(rest.json) == 2
+        assert 'Link' not in rest.headers
+
+    def test_rejects_bad_since(self):
+        '''returns 400 for a since that is not a non-negative integer.'''
+
+        client = app.test_client()
+        response = client.get('/changes?since=soon')
+        assert response.status_code == 400
+        assert response.json['errors']
+        response = client.get('/changes', headers={
+            'Accept': 'text/event-stream', 'Last-Event-ID': '-3'})
+        assert response.status_code == 400
+
+    def test_ends_streams(self, monkeypatch):
+        '''ends an idle event stream after CHANGES_STREAM_SECONDS.'''
+
+        monkeypatch.setitem(app.config, 'CHANGES_STREAM_SECONDS', 0.05)
+        monkeypatch.setitem(app.config, 'CHANGES_POLL_INTERVAL', 0.01)
+        response = app.test_client().get('/changes', headers={
+            'Accept': 'text/event-stream', 'Last-Event-ID': str(latest_seq())})
+        assert response.get_data() == b'retry: 2000\n\n'
+
+    def test_streams_server_sent_events(self):
+        '''streams the changes after Last-Event-ID as server-sent events.'''
+
+        since = latest_seq()
+        vendor_id, sweet_id = add_vendor_sweet()
+        response = app.test_client().get('/changes', buffered=False, headers={
+            'Accept': 'text/event-stream', 'Last-Event-ID': str(since)})
+        assert response.mimetype == 'text/event-stream'
+        events = iter(response.response)
+        assert next(events) == b'retry: 2000\n\n'
+        event = next(events).decode()
+        response.close()
+        assert event.startswith(f'id: {since + 1}\nevent: change\ndata: ')
+        assert '"op":"insert"' in event
+        assert f'"id":{vendor_id},' in event or f'"id":{sweet_id},' in event
+
+
+class TestCompaction:
+    '''compact in changes.py'''
+
+    def test_drops_superseded_entries(self):
+        '''keeps only the newest entry of each row.'''
+
+        vendor_id, _ = add_vendor_sweet()
+        with app.app_context():
+            vendor = db.session.get(Vendor, vendor_id)
+            for n in range(3):
+                vendor.name = f'Renamed {n}'
+                db.session.commit()
+            with db.engine.begin() as conn:
+                changes.compact(conn, retention=10 ** 9)
+            entries = db.session.scalars(db.select(Change).where(
+                Change.table_name == 'vendors', Change.row_id == vendor_id)).all()
+        assert [entry.op for entry in entries] == ['update']
+
+    def test_commits_leave_the_log_alone(self):
+        '''never compacts inside a request.'''
+
+        vendor_id, _ = add_vendor_sweet()
+        with app.app_context():
+            vendor = db.session.get(Vendor, vendor_id)
+            for n in range(3):
+                vendor.name = f'Renamed {n}'
+                db.session.commit()
+            entries = db.session.scalars(db.select(Change).where(
+                Change.table_name == 'vendors', Change.row_id == vendor_id)).all()
+        assert len(entries) == 4
+
+    def test_indexes_rows(self):
+        '''looks up entries by (table_name, row_id) through an index.'''
+
+        with app.app_context():
+            plan = db.session.execute(db.text(
+                'EXPLAIN QUERY PLAN SELECT seq FROM changes '
+                "WHERE table_name = 'vendors' AND row_id = 1")).all()
+        assert 'ix_changes_table_name_row_id' in ' '.join(row[-1] for row in plan)
+
+    def test_gone_after_lossy_compaction(self, monkeypatch):
+        '''answers 410 to readers behind the retention horizon, and the snapshot reloads.'''
+
+        monkeypatch.setattr(catalog_snapshot, 'enabled', True)
+        with app.app_context():
+            catalog_snapshot.refresh()
+        since = latest_seq()
+        for _ in range(3):
+            add_vendor_sweet()
+        with app.app_context(), db.engine.begin() as conn:
+            changes.compact(conn, retention=1)
+        seq = latest_seq()
+        client = app.test_client()
+
+        response = client.get(f'/changes?since={since}')
+        assert response.status_code == 410
+        assert response.json['seq'] == seq
+        assert client.get(f'/changes?since={seq - 1}').status_code == 200
+
+        reloads = catalog_snapshot.reloads
+        with app.app_context():
+            catalog_snapshot.refresh()
+        assert catalog_snapshot.reloads == reloads + 1
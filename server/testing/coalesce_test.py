@@ -0,0 +1,113 @@
+import threading
+import time
+import pytest
+from faker import Faker
+from sqlalchemy import event
+from app import app, coalescer, response_cache
+from coalesce import SingleFlight
+from models import db, Vendor
+
+pytestmark = pytest.mark.wsgi_only
+
+CONCURRENCY = 8
+
+
+class TestSingleFlight:
+    '''Class SingleFlight in coalesce.py'''
+
+    def test_shares_one_call_per_key(self):
+        '''runs one call for concurrent callers of a key and gives followers its result.'''
+
+        flights = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            started.set()
+            release.wait()
+            return 'result'
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(flights.do('k', slow)))
+        leader.start()
+        started.wait()
+        followers = [
+            threading.Thread(target=lambda: results.append(flights.do('k', slow)))
+            for _ in range(3)
+        ]
+        for thread in followers:
+            thread.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in [leader, *followers]:
+            thread.join()
+
+        assert calls == [1]
+        assert sorted(results) == [('result', False)] + [('result', True)] * 3
+        assert flights.do('k', lambda: 'again') == ('again', False)
+
+    def test_followers_time_out(self):
+        '''returns None to a follower whose leader is slower than the timeout.'''
+
+        flights = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        leader = threading.Thread(target=flights.do, args=(
+            'k', lambda: started.set() or release.wait()))
+        leader.start()
+        started.wait()
+        assert flights.do('k', lambda: 'unused', timeout=0.01) == (None, True)
+        release.set()
+        leader.join()
+
+
+class TestCoalescing:
+    '''Request coalescing on GET routes in app.py'''
+
+    def test_collapses_concurrent_identical_requests(self, monkeypatch, sql_statements):
+        '''runs the VendorById queries once for concurrent identical requests.'''
+
+        monkeypatch.setattr(response_cache, 'enabled', False)
+        with app.app_context():
+            vendor = Vendor(name=Faker().name())
+            db.session.add(vendor)
+            db.session.commit()
+            vendor_id = vendor.id
+            engine = db.engine
+
+        # Hold each query long enough for every request to arrive.
+        def slow_query(*args):
+            time.sleep(0.1)
+        event.listen(engine, 'before_cursor_execute', slow_query)
+        followers = coalescer.followers
+        barrier = threading.Barrier(CONCURRENCY)
+        responses = []
+
+        def get():
+            client = app.test_client()
+            barrier.wait()
+            responses.append(client.get(f'/vendors/{vendor_id}'))
+
+        sql_statements.clear()
+        threads = [threading.Thread(target=get) for _ in range(CONCURRENCY)]
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            event.remove(engine, 'before_cursor_execute', slow_query)
+
+        assert [r.status_code for r in responses] == [200] * CONCURRENCY
+        assert all(r.json == responses[0].json for r in responses)
+        assert len(sql_statements) < 2 * CONCURRENCY
+        assert len(sql_statements) == 2 * (CONCURRENCY - (coalescer.followers - followers))
+        assert coalescer.followers - followers >= CONCURRENCY // 2
+
+    def test_reports_metrics(self):
+        '''exposes leader, follower and fallback counters at /metrics.'''
+
+        with app.app_context():
+            body = app.test_client().get('/metrics').get_data(as_text=True)
+        assert 'coalesce_followers_total' in body
+        assert 'coalesce_fallbacks_total' in body
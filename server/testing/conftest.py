@@ -1,9 +1,116 @@
 #!/usr/bin/env python3
 
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import pytest
+from sqlalchemy import event
+
+# SERVING_MODE=asgi runs the suite against the ASGI app in asgi.py.
+SERVING_MODE = os.environ.get('SERVING_MODE', 'wsgi')
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Each test process (each pytest-xdist worker, or pytest itself) runs
+# against its own SQLite file, built by the migrations when the process
+# starts. The migrated database is kept in memory and copied back over
+# the file with SQLite's backup API before every test.
+test_database = {}
+
+def pytest_configure(config):
+    # Runs as this conftest is loaded, before any test module imports app,
+    # which reads DB_URI and checks for the search index at import time.
+    worker = os.environ.get('PYTEST_XDIST_WORKER', 'main')
+    directory = tempfile.mkdtemp(prefix=f'sweets-{worker}-')
+    path = os.path.join(directory, 'test.db')
+    os.environ['DB_URI'] = f'sqlite:///{path}'
+    subprocess.run(
+        [sys.executable, '-m', 'flask', '--app', 'app', 'db', 'upgrade'],
+        cwd=SERVER_DIR, check=True, capture_output=True)
+    migrated = sqlite3.connect(':memory:', check_same_thread=False)
+    with sqlite3.connect(path) as source:
+        source.backup(migrated)
+    test_database.update(directory=directory, path=path, migrated=migrated)
+
+def pytest_unconfigure(config):
+    if test_database:
+        test_database['migrated'].close()
+        shutil.rmtree(test_database['directory'], ignore_errors=True)
+
+@pytest.fixture(autouse=True)
+def database():
+    '''Starts every test on a freshly migrated database, with no state
+    left in the app's caches from earlier tests.'''
+    from app import app, catalog_snapshot, response_cache, search
+    from models import db
+
+    target = sqlite3.connect(test_database['path'])
+    try:
+        test_database['migrated'].backup(target)
+    finally:
+        target.close()
+    if response_cache.backend is not None:
+        response_cache.backend.clear()
+    response_cache.seq = None
+    catalog_snapshot.seq = None
+    search.memory = None
+    yield
+    with app.app_context():
+        db.session.remove()
+
+def pytest_collection_modifyitems(config, items):
+    if SERVING_MODE != 'asgi':
+        return
+    skip = pytest.mark.skip(reason='exercises a WSGI-only feature')
+    for item in items:
+        if item.get_closest_marker('wsgi_only'):
+            item.add_marker(skip)
+
+@pytest.fixture(scope='session')
+def asgi_client(request):
+    from asgi import TestClient, app as asgi_app
+
+    client = TestClient(asgi_app)
+    yield client
+    client.close()
+
+@pytest.fixture(autouse=True)
+def serving_mode(request, monkeypatch):
+    '''Routes `app.test_client()` to the ASGI app under SERVING_MODE=asgi.'''
+    if SERVING_MODE == 'asgi':
+        from app import app
+
+        client = request.getfixturevalue('asgi_client')
+        monkeypatch.setattr(app, 'test_client', lambda: client)
+
 def pytest_itemcollected(item):
     par = item.parent.obj
     node = item.obj
     pref = par.__doc__.strip() if par.__doc__ else par.__class__.__name__
     suf = node.__doc__.strip() if node.__doc__ else node.__name__
     if pref or suf:
-        item._nodeid = ' '.join((pref, suf))
\ No newline at end of file
+        item._nodeid = ' '.join((pref, suf))
+        # Parametrized items share a docstring; keep their ids apart.
+        callspec = getattr(item, 'callspec', None)
+        if callspec is not None:
+            item._nodeid += f' [{callspec.id}]'
+
+@pytest.fixture
+def sql_statements():
+    '''Records every SQL statement the app's engine executes during a test.'''
+    from app import app
+    from models import db
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    yield statements
+    event.remove(engine, 'before_cursor_execute', record)
@@ -0,0 +1,87 @@
+import pytest
+from faker import Faker
+from app import app
+from models import db, Sweet, Vendor, VendorSweet
+
+pytestmark = pytest.mark.wsgi_only
+
+
+def select_clause(statement):
+    return ' '.join(statement.split()).split(' FROM ')[0]
+
+
+class TestFieldsets:
+    '''fields= and embed= on /vendors, /vendors/<int:id>, /sweets and /sweets/<int:id> in app.py'''
+
+    @pytest.fixture
+    def offering(self):
+        with app.app_context():
+            fake = Faker()
+            sweet, vendor = Sweet(name=fake.name()), Vendor(name=fake.name())
+            db.session.add_all([sweet, vendor])
+            db.session.commit()
+            vendor_sweet = VendorSweet(sweet_id=sweet.id, vendor_id=vendor.id, price=7)
+            db.session.add(vendor_sweet)
+            db.session.commit()
+            return sweet.to_dict(), vendor.to_dict(), vendor_sweet.to_dict()
+
+    def test_selects_only_requested_fields(self, offering, sql_statements):
+        '''selects only id and the requested columns, and returns only the requested ones.'''
+
+        sweet, vendor, _ = offering
+        sql_statements.clear()
+        response = app.test_client().get(f'/vendors/{vendor["id"]}?fields=name&embed=')
+        assert response.json == {'name': vendor['name']}
+        assert len(sql_statements) == 1
+        assert select_clause(sql_statements[0]) == 'SELECT vendors.id, vendors.name'
+
+        sql_statements.clear()
+        response = app.test_client().get(
+            f'/sweets?fields=id&limit=1&after={sweet["id"] - 1}')
+        assert response.json == [{'id': sweet['id']}]
+        assert len(sql_statements) == 1
+        assert select_clause(sql_statements[0]) == 'SELECT sweets.id'
+
+        response = app.test_client().get(f'/sweets/{sweet["id"]}?fields=name')
+        assert response.json == {'name': sweet['name']}
+
+    def test_embeds_with_one_joined_query(self, offering, sql_statements):
+        '''embeds vendor_sweets with their other side using one extra joined SELECT.'''
+
+        sweet, vendor, vendor_sweet = offering
+        sql_statements.clear()
+        response = app.test_client().get(
+            f'/sweets?embed=vendor_sweets&limit=1&after={sweet["id"] - 1}')
+        assert response.json == [
+            {**sweet, 'vendor_sweets': [{**vendor_sweet, 'vendor': vendor}]}]
+        assert len(sql_statements) == 2
+        assert select_clause(sql_statements[1]) == (
+            'SELECT vendor_sweets.id, vendor_sweets.price, vendor_sweets.sweet_id, '
+            'vendor_sweets.vendor_id, vendors.id AS id_1, vendors.name')
+        assert 'JOIN vendors' in sql_statements[1]
+
+        sql_statements.clear()
+        response = app.test_client().get(
+            f'/vendors/{vendor["id"]}?fields=name&embed=vendor_sweets')
+        assert response.json == {
+            'name': vendor['name'],
+            'vendor_sweets': [{**vendor_sweet, 'sweet': sweet}]}
+        assert len(sql_statements) == 2
+        assert 'JOIN sweets' in sql_statements[1]
+
+        sql_statements.clear()
+        response = app.test_client().get(
+            f'/sweets/{sweet["id"]}?embed=vendor_sweets&fields=name')
+        assert response.json['vendor_sweets'][0]['vendor'] == vendor
+        assert len(sql_statements) == 2
+
+    def test_400_for_unknown_names(self):
+        '''returns a 400 status code for fields or embeds the model does not have.'''
+
+        with app.app_context():
+            client = app.test_client()
+            assert client.get('/vendors?fields=price').status_code == 400
+            assert client.get('/sweets/1?fields=').status_code == 400
+            response = client.get('/vendors/1?embed=sweets')
+            assert response.status_code == 400
+            assert response.json['errors'] == ['embed must be chosen from vendor_sweets']
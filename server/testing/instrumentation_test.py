@@ -0,0 +1,57 @@
+import logging
+import pytest
+from faker import Faker
+from app import app, instrumentation
+from models import db, Sweet, Vendor, VendorSweet
+
+pytestmark = pytest.mark.wsgi_only
+
+
+class TestInstrumentation:
+    '''Class Instrumentation in instrumentation.py'''
+
+    def test_server_timing_header(self):
+        '''reports query count, SQL, serialization and total time in a Server-Timing header.'''
+
+        with app.app_context():
+            fake = Faker()
+            vendor = Vendor(name=fake.name())
+            sweet = Sweet(name=fake.name())
+            db.session.add_all([vendor, sweet])
+            db.session.commit()
+            db.session.add(VendorSweet(vendor_id=vendor.id, sweet_id=sweet.id, price=3))
+            db.session.commit()
+            vendor_id = vendor.id
+
+        response = app.test_client().get(f'/vendors/{vendor_id}')
+        timing = response.headers['Server-Timing']
+        assert 'db;dur=' in timing
+        assert 'desc="2 queries"' in timing
+        assert 'serialize;dur=' in timing
+        assert 'total;dur=' in timing
+
+    def test_metrics_endpoint(self):
+        '''exposes per-endpoint histograms and cache counters at /metrics in Prometheus text format.'''
+
+        client = app.test_client()
+        client.get('/sweets/0')
+        response = client.get('/metrics')
+        assert response.status_code == 200
+        assert response.content_type.startswith('text/plain; version=0.0.4')
+
+        text = response.get_data(as_text=True)
+        assert '# TYPE http_request_duration_seconds histogram' in text
+        assert 'http_request_sql_queries_bucket{method="GET",endpoint="/sweets/<int:id>",le="1"}' in text
+        assert 'http_request_duration_seconds_count{method="GET",endpoint="/sweets/<int:id>"}' in text
+        assert 'response_cache_hits_total' in text
+
+    def test_slow_query_log(self, caplog):
+        '''logs queries slower than SLOW_QUERY_MS.'''
+
+        instrumentation.slow_query_ms = 0
+        try:
+            with caplog.at_level(logging.WARNING, logger='sweets.slow_query'):
+                app.test_client().get('/sweets/0')
+        finally:
+            instrumentation.slow_query_ms = None
+        assert any('slow query' in record.getMessage() for record in caplog.records)
@@ -0,0 +1,90 @@
+import pytest
+from faker import Faker
+from app import app, catalog_snapshot, response_cache
+from models import db, Sweet, Vendor, VendorSweet
+
+pytestmark = pytest.mark.wsgi_only
+
+
+def add_vendors(n):
+    with app.app_context():
+        fake = Faker()
+        vendors = [Vendor(name=fake.name()) for _ in range(n)]
+        db.session.add_all(vendors)
+        db.session.commit()
+        return [vendor.id for vendor in vendors]
+
+
+class TestLookup:
+    '''GET /vendors?ids= and POST /<collection>/lookup in app.py'''
+
+    def test_preserves_request_order(self):
+        '''returns the rows in the order asked for, once each, and reports missing ids.'''
+
+        first, second, third = add_vendors(3)
+        response = app.test_client().get(
+            f'/vendors?ids={third},{first},0,{third},{second}')
+        assert response.status_code == 200
+        assert [vendor['id'] for vendor in response.json['results']] == [
+            third, first, second]
+        assert response.json['not_found'] == [0]
+
+    def test_chunks_in_queries(self, sql_statements, monkeypatch):
+        '''selects the rows with one IN query per 500 ids.'''
+
+        monkeypatch.setattr(response_cache, 'enabled', False)
+        ids = add_vendors(2)
+        missing = list(range(max(ids) + 1, max(ids) + 600))
+        sql_statements.clear()
+        response = app.test_client().post(
+            '/vendors/lookup?fields=name', json={'ids': ids + missing})
+        assert response.status_code == 200
+        assert len(response.json['results']) == 2
+        assert response.json['not_found'] == missing
+        assert len([s for s in sql_statements if 'FROM vendors' in s]) == 2
+
+    def test_applies_fieldsets(self):
+        '''honors fields, embed and include=price_stats.'''
+
+        with app.app_context():
+            fake = Faker()
+            vendor, sweet = Vendor(name=fake.name()), Sweet(name=fake.name())
+            db.session.add_all([vendor, sweet])
+            db.session.commit()
+            db.session.add(VendorSweet(vendor_id=vendor.id, sweet_id=sweet.id, price=7))
+            db.session.commit()
+            ids = {'vendor_id': vendor.id, 'sweet_id': sweet.id}
+        client = app.test_client()
+
+        response = client.get(
+            f'/sweets?ids={ids["sweet_id"]}&fields=name&embed=vendor_sweets'
+            '&include=price_stats')
+        [result] = response.json['results']
+        assert result['name'] == client.get(f'/sweets/{ids["sweet_id"]}').json['name']
+        assert [vs['vendor']['id'] for vs in result['vendor_sweets']] == [ids['vendor_id']]
+        assert result['price_stats']['count'] == 1
+
+        lookup = client.post(
+            '/vendors/lookup?embed=vendor_sweets', json={'ids': [ids['vendor_id']]})
+        assert lookup.json['results'] == [client.get(f'/vendors/{ids["vendor_id"]}').json]
+
+    def test_matches_snapshot(self, monkeypatch):
+        '''serves the same results from the catalog snapshot.'''
+
+        monkeypatch.setattr(response_cache, 'enabled', False)
+        ids = add_vendors(3)
+        path = f'/vendors?ids={ids[2]},0,{ids[0]}&embed=vendor_sweets'
+        client = app.test_client()
+        expected = client.get(path).json
+        monkeypatch.setattr(catalog_snapshot, 'enabled', True)
+        assert client.get(path).json == expected
+
+    def test_400_for_invalid_ids(self):
+        '''returns a 400 status code for malformed, empty or oversized id lists.'''
+
+        client = app.test_client()
+        for path in ('/vendors?ids=1,x', '/sweets?ids=', '/vendors?ids=-1',
+                     '/vendors?ids=1&limit=5', '/vendors?ids=1&stream=ndjson'):
+            assert client.get(path).status_code == 400, path
+        for payload in ([1, 2], {'ids': ['a']}, {'ids': list(range(1, 1002))}):
+            assert client.post('/sweets/lookup', json=payload).status_code == 400
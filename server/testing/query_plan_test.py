@@ -0,0 +1,79 @@
+import pytest
+from faker import Faker
+from sqlalchemy import event, select
+from app import app, response_cache
+from models import db, Sweet, Vendor, VendorSweet
+
+pytestmark = pytest.mark.wsgi_only
+
+
+def query_plan(statement, parameters=()):
+    '''Returns the detail column of SQLite's EXPLAIN QUERY PLAN output.'''
+    rows = db.session.connection().exec_driver_sql(
+        f'EXPLAIN QUERY PLAN {statement}', parameters)
+    return [row[-1] for row in rows]
+
+
+def full_scans(plan):
+    return [step for step in plan if step.startswith('SCAN')]
+
+
+class TestQueryPlans:
+    '''SQLite query plans of the app's hot queries'''
+
+    def test_endpoint_queries_use_indexes(self):
+        '''plans every SELECT issued by the detail, page, price stats and create endpoints without a full table SCAN.'''
+
+        with app.app_context():
+            fake = Faker()
+            sweet = Sweet(name=fake.name())
+            vendor = Vendor(name=fake.name())
+            db.session.add_all([sweet, vendor])
+            db.session.commit()
+            db.session.add(VendorSweet(vendor_id=vendor.id, sweet_id=sweet.id, price=1))
+            db.session.commit()
+            sweet_id, vendor_id = sweet.id, vendor.id
+
+            selects = []
+
+            def record(conn, cursor, statement, parameters, context, executemany):
+                if statement.lstrip().upper().startswith('SELECT'):
+                    selects.append((statement, parameters))
+
+            event.listen(db.engine, 'before_cursor_execute', record)
+            response_cache.enabled = False
+            try:
+                client = app.test_client()
+                client.get(f'/vendors/{vendor_id}')
+                client.get(f'/sweets/{sweet_id}')
+                client.get('/vendors?limit=2&after=1')
+                client.get('/sweets?limit=2&after=1')
+                client.get(f'/sweets/{sweet_id}/vendors?limit=1')
+                client.get('/sweets?include=price_stats&limit=2&after=1')
+                client.post('/vendor_sweets', json={
+                    "price": 2, "vendor_id": vendor_id, "sweet_id": sweet_id})
+            finally:
+                response_cache.enabled = True
+                event.remove(db.engine, 'before_cursor_execute', record)
+
+            assert selects
+            for statement, parameters in selects:
+                plan = query_plan(statement, parameters)
+                assert not full_scans(plan), (statement, plan)
+
+    def test_vendor_sweet_lookups_use_indexes(self):
+        '''plans sweet and price-sorted vendor lookups on vendor_sweets as index searches.'''
+
+        with app.app_context():
+            queries = [
+                select(VendorSweet).where(VendorSweet.sweet_id == 1),
+                select(VendorSweet).where(VendorSweet.vendor_id == 1),
+                select(VendorSweet).where(VendorSweet.vendor_id == 1)
+                .order_by(VendorSweet.price),
+            ]
+            for query in queries:
+                compiled = query.compile(
+                    db.engine, compile_kwargs={'literal_binds': True})
+                plan = query_plan(str(compiled))
+                assert not full_scans(plan), (str(compiled), plan)
+                assert not any('TEMP B-TREE' in step for step in plan), plan
@@ -0,0 +1,134 @@
+import importlib.util
+import os
+import pytest
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+from faker import Faker
+from sqlalchemy import create_engine, event
+from app import app, search
+from models import db, Sweet, Vendor
+from search import PrefixIndex, match_expression, search_table_exists, terms
+
+MIGRATION = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)),
+    'migrations', 'versions', '61b5f2372f6a_add_search_index.py')
+
+pytestmark = pytest.mark.wsgi_only
+
+
+class TestPrefixIndex:
+    '''Class PrefixIndex in search.py'''
+
+    def test_matches_every_word_as_a_prefix(self):
+        '''returns rows with a token starting with each word, exact matches first.'''
+
+        index = PrefixIndex([
+            (2, 'Chocolate Chip Cookie'),
+            (4, 'Chocolate Cookies Deluxe Box'),
+            (5, 'Cookie Monster Bakery'),
+            (6, 'Brownie'),
+        ])
+        assert index.search(['choc', 'cookie'], 10, 0) == [
+            (2, 'Chocolate Chip Cookie'),
+            (4, 'Chocolate Cookies Deluxe Box'),
+        ]
+        assert [rowid for rowid, _ in index.search(['cookie'], 10, 0)] == [2, 5, 4]
+        assert index.search(['cookie'], 1, 1) == [(5, 'Cookie Monster Bakery')]
+        assert index.search(['pie'], 10, 0) == []
+
+    def test_quotes_user_input(self):
+        '''turns a query into quoted FTS5 prefix terms, dropping operators.'''
+
+        assert terms('"Choc" OR* cook-ie') == ['choc', 'or', 'cook', 'ie']
+        assert match_expression(['choc', 'or']) == '"choc"* "or"*'
+
+
+class TestSearch:
+    '''GET /search in app.py'''
+
+    def search_names(self, q, backend):
+        previous = search.backend
+        search.backend = backend
+        try:
+            response = app.test_client().get(f'/search?q={q}')
+        finally:
+            search.backend = previous
+        assert response.status_code == 200
+        return [(result['type'], result['name']) for result in response.json]
+
+    @pytest.mark.parametrize('backend', ['fts5', 'memory'])
+    def test_finds_sweets_and_vendors(self, backend):
+        '''finds sweets and vendors by word prefix and follows renames and deletes.'''
+
+        if backend == 'fts5' and search.backend != 'fts5':
+            pytest.skip('the database has no FTS5 search index')
+
+        with app.app_context():
+            word = Faker().unique.pystr(min_chars=12, max_chars=12).lower()
+            sweet = Sweet(name=f'{word} Fudge')
+            vendor = Vendor(name=f'{word.title()} Bakery')
+            db.session.add_all([sweet, vendor])
+            db.session.commit()
+
+            assert sorted(self.search_names(word[:6], backend)) == [
+                ('sweet', f'{word} Fudge'), ('vendor', f'{word.title()} Bakery')]
+            assert self.search_names(f'{word} fud', backend) == [
+                ('sweet', f'{word} Fudge')]
+
+            sweet.name = f'{word} Toffee'
+            db.session.delete(vendor)
+            db.session.commit()
+            assert self.search_names(word, backend) == [('sweet', f'{word} Toffee')]
+
+    def test_paginates_results(self):
+        '''returns `limit` results and a Link to the next page.'''
+
+        with app.app_context():
+            word = Faker().unique.pystr(min_chars=12, max_chars=12).lower()
+            db.session.add_all([Sweet(name=f'{word} {n}') for n in range(3)])
+            db.session.commit()
+
+            client = app.test_client()
+            response = client.get(f'/search?q={word}&limit=2')
+            assert len(response.json) == 2
+            assert 'offset=2' in response.headers['Link']
+
+            response = client.get(f'/search?q={word}&limit=2&offset=2')
+            assert len(response.json) == 1
+            assert 'Link' not in response.headers
+
+    def test_400_without_query(self):
+        '''returns a 400 status code when q is missing or has no words.'''
+
+        with app.app_context():
+            assert app.test_client().get('/search').status_code == 400
+            assert app.test_client().get('/search?q=%20').status_code == 400
+
+
+class TestSearchMigration:
+    '''migration 61b5f2372f6a_add_search_index.py'''
+
+    @pytest.mark.parametrize('fts5', [True, False], ids=['fts5', 'no-fts5'])
+    def test_upgrades_with_and_without_fts5(self, fts5, tmp_path):
+        '''creates the FTS5 index only where SQLite has FTS5.'''
+
+        spec = importlib.util.spec_from_file_location('add_search_index', MIGRATION)
+        migration = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(migration)
+        engine = create_engine(f'sqlite:///{tmp_path / "search.db"}')
+
+        @event.listens_for(engine, 'connect')
+        def connect(dbapi_connection, connection_record):
+            if not fts5:
+                # Stand in for a build without FTS5.
+                dbapi_connection.create_function(
+                    'sqlite_compileoption_used', 1, lambda option: 0)
+
+        with engine.begin() as conn:
+            for table in ('sweets', 'vendors'):
+                conn.exec_driver_sql(
+                    f'CREATE TABLE {table} (id INTEGER PRIMARY KEY, name VARCHAR)')
+            with Operations.context(MigrationContext.configure(conn)):
+                migration.upgrade()
+            assert search_table_exists(conn) is (fts5 and migration.fts5_available(conn))
+        engine.dispose()
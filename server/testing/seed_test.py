@@ -0,0 +1,32 @@
+import pytest
+from sqlalchemy import func, select, text
+from app import app
+from models import db, Change, Sweet, Vendor
+from search import SEARCH_TABLE, trigger_ddl
+from seed import load_catalog
+import changes
+
+pytestmark = pytest.mark.wsgi_only
+
+
+class TestLoadCatalog:
+    '''load_catalog in seed.py'''
+
+    def test_rebuilds_search_index_and_change_log(self):
+        '''indexes every loaded name, keeps the search triggers, and leaves one reload entry.'''
+
+        with app.app_context():
+            db.session.add(Vendor(name='Replaced Vendor'))
+            db.session.commit()
+            counts = load_catalog(db.engine, vendors=30, sweets=10, seed=1)
+            with db.engine.connect() as conn:
+                indexed = conn.execute(text(f'SELECT count(*) FROM {SEARCH_TABLE}')).scalar()
+                triggers = set(conn.execute(text(
+                    "SELECT name FROM sqlite_master WHERE type = 'trigger'")).scalars())
+                entries = conn.execute(select(Change.table_name, Change.op)).all()
+                names = conn.execute(select(func.count()).select_from(
+                    select(Vendor.name).union_all(select(Sweet.name)).subquery())).scalar()
+        assert counts['vendors'] == 30 and counts['sweets'] == 10
+        assert indexed == names == 40
+        assert {name for name, _ in trigger_ddl()} <= triggers
+        assert entries == [('*', changes.RELOAD)]
@@ -0,0 +1,18 @@
+import json
+import pytest
+from app import app
+import serializers
+
+
+class TestSerializers:
+    '''dumps and FastJSONProvider in serializers.py'''
+
+    @pytest.mark.parametrize('obj', [{'n': 2 ** 70}, {1: 'a', 2: 'b'}])
+    def test_falls_back_for_what_orjson_rejects(self, obj):
+        '''encodes integers over 64 bits and non-string keys like the standard library.'''
+
+        expected = json.dumps(obj, separators=(',', ':'), sort_keys=True)
+        assert serializers.dumps(obj) == expected.encode()
+        with app.app_context():
+            assert json.loads(app.json.dumps(obj)) == json.loads(expected)
+            assert app.json.response(obj).get_data(as_text=True) == expected + '\n'
@@ -0,0 +1,123 @@
+import os
+import runpy
+import subprocess
+import sys
+import pytest
+from faker import Faker
+from sqlalchemy import func, select
+from app import app, response_cache
+from models import db, Sweet, Vendor
+
+pytestmark = pytest.mark.wsgi_only
+
+CONFIG = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'gunicorn.conf.py')
+
+
+@pytest.fixture
+def config(monkeypatch):
+    # The config file defaults DB_PROFILE; keep that out of other tests.
+    monkeypatch.delenv('DB_PROFILE', raising=False)
+    monkeypatch.delenv('RESPONSE_CACHE_SYNC', raising=False)
+    monkeypatch.delenv('CHANGES_STREAM_SECONDS', raising=False)
+    return runpy.run_path(CONFIG)
+
+
+# Run by a second interpreter, as another gunicorn worker would.
+OTHER_WORKER_POST = '''
+import sys
+from app import app
+response = app.test_client().post('/vendor_sweets', json={
+    'price': 9, 'vendor_id': int(sys.argv[1]), 'sweet_id': int(sys.argv[2])})
+assert response.status_code == 201, response.json
+'''
+
+
+class TestGunicornConfig:
+    '''gunicorn.conf.py'''
+
+    def test_preloads_and_recycles_workers(self, config):
+        '''preloads the app, runs a worker per core and recycles workers.'''
+
+        assert config['preload_app'] is True
+        assert config['workers'] >= 1
+        assert config['max_requests'] > 0
+
+    def test_syncs_caches_of_several_workers(self, monkeypatch):
+        '''turns on response cache sync when it starts more than one worker.'''
+
+        monkeypatch.setenv('WEB_CONCURRENCY', '2')
+        monkeypatch.delenv('DB_PROFILE', raising=False)
+        monkeypatch.delenv('RESPONSE_CACHE_SYNC', raising=False)
+        monkeypatch.delenv('CHANGES_STREAM_SECONDS', raising=False)
+        runpy.run_path(CONFIG)
+        assert os.environ['RESPONSE_CACHE_SYNC'] == '1'
+
+    def test_post_fork_drops_inherited_connections(self, config):
+        '''gives each forked worker its own connection pool, leaving the parent's usable.'''
+
+        post_fork = config['post_fork']
+        with app.app_context():
+            count = db.session.scalar(select(func.count(Vendor.id)))
+            db.session.remove()
+            pool = db.engine.pool
+
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                post_fork(None, None)
+                with app.app_context():
+                    if (db.engine.pool is not pool and
+                            db.session.scalar(select(func.count(Vendor.id))) == count):
+                        status = 0
+            finally:
+                os._exit(status)
+        _, status = os.waitpid(pid, 0)
+        assert os.waitstatus_to_exitcode(status) == 0
+
+        with app.app_context():
+            assert db.engine.pool is pool
+            assert db.session.scalar(select(func.count(Vendor.id))) == count
+
+
+class TestResponseCacheSync:
+    '''ResponseCache with RESPONSE_CACHE_SYNC in cache.py'''
+
+    def test_sees_writes_of_other_processes(self, monkeypatch):
+        '''stops serving a cached response once another process commits a write it depends on.'''
+
+        monkeypatch.setattr(response_cache, 'enabled', True)
+        monkeypatch.setattr(response_cache, 'sync', True)
+        with app.app_context():
+            fake = Faker()
+            vendor, sweet = Vendor(name=fake.name()), Sweet(name=fake.name())
+            db.session.add_all([vendor, sweet])
+            db.session.commit()
+            ids = (vendor.id, sweet.id)
+        client = app.test_client()
+        before = client.get(f'/vendors/{ids[0]}')
+        assert before.json['vendor_sweets'] == []
+        assert client.get(f'/vendors/{ids[0]}').json == before.json
+
+        subprocess.run(
+            [sys.executable, '-c', OTHER_WORKER_POST, *map(str, ids)],
+            cwd=os.path.dirname(CONFIG), check=True)
+
+        after = client.get(f'/vendors/{ids[0]}', headers={'If-None-Match': before.headers['ETag']})
+        assert after.status_code == 200
+        assert [vs['price'] for vs in after.json['vendor_sweets']] == [9]
+
+
+class TestSweetsASGI:
+    '''SweetsASGI in asgi.py'''
+
+    def test_reads_db_profile_when_constructed(self, monkeypatch):
+        '''resolves DB_PROFILE at construction and rejects unknown profiles like config.py.'''
+
+        from asgi import SweetsASGI
+
+        monkeypatch.setenv('DB_PROFILE', 'turbo')
+        with pytest.raises(ValueError, match='DB_PROFILE must be one of'):
+            SweetsASGI(os.environ['DB_URI'])
+        asgi_app = SweetsASGI(os.environ['DB_URI'], profile='production')
+        asgi_app.engine.sync_engine.dispose()
@@ -0,0 +1,126 @@
+import pytest
+from faker import Faker
+from sqlalchemy import update
+from app import app, catalog_snapshot, response_cache
+from models import db, Sweet, Vendor, VendorSweet
+import changes
+
+pytestmark = pytest.mark.wsgi_only
+
+PATHS = (
+    '/vendors',
+    '/sweets?fields=name',
+    '/vendors?embed=vendor_sweets&limit=3&after={vendor_id}',
+    '/sweets?embed=vendor_sweets&limit=2',
+    '/vendors/{vendor_id}',
+    '/vendors/{vendor_id}?fields=name&embed=',
+    '/sweets/{sweet_id}?embed=vendor_sweets',
+    '/sweets/0',
+)
+
+
+@pytest.fixture
+def snapshot(monkeypatch):
+    monkeypatch.setattr(response_cache, 'enabled', False)
+    monkeypatch.setattr(catalog_snapshot, 'enabled', True)
+    return catalog_snapshot
+
+
+def responses(enabled, **ids):
+    catalog_snapshot.enabled = enabled
+    client = app.test_client()
+    results = []
+    for path in PATHS:
+        response = client.get(path.format(**ids))
+        results.append((response.status_code, response.json,
+                        response.headers.get('X-Next-Cursor')))
+    return results
+
+
+class TestCatalogSnapshot:
+    '''CatalogSnapshot in snapshot.py'''
+
+    def test_matches_sql_reads(self, snapshot, sql_statements):
+        '''serves the same responses as the SQL path, only reading the change log.'''
+
+        with app.app_context():
+            fake = Faker()
+            vendor, sweet = Vendor(name=fake.name()), Sweet(name=fake.name())
+            db.session.add_all([vendor, sweet])
+            db.session.commit()
+            db.session.add(VendorSweet(vendor_id=vendor.id, sweet_id=sweet.id, price=3))
+            db.session.commit()
+            ids = {'vendor_id': vendor.id, 'sweet_id': sweet.id}
+            expected = responses(False, **ids)
+            snapshot.refresh()
+
+        sql_statements.clear()
+        assert responses(True, **ids) == expected
+        assert all('FROM changes' in statement for statement in sql_statements)
+
+    def test_follows_the_change_log(self, snapshot):
+        '''applies inserts, updates and deletes committed after it was loaded.'''
+
+        with app.app_context():
+            fake = Faker()
+            vendor, sweet = Vendor(name=fake.name()), Sweet(name=fake.name())
+            db.session.add_all([vendor, sweet])
+            db.session.commit()
+            snapshot.refresh()
+
+            client = app.test_client()
+            response = client.post('/vendor_sweets', json={
+                'price': 5, 'vendor_id': vendor.id, 'sweet_id': sweet.id})
+            created = response.json['id']
+            vendor.name = f'{vendor.name} Renamed'
+            newcomer = Sweet(name=fake.name())
+            db.session.add(newcomer)
+            db.session.commit()
+            client.post('/vendor_sweets', json={
+                'price': 8, 'vendor_id': vendor.id, 'sweet_id': newcomer.id})
+            client.delete(f'/vendor_sweets/{created}')
+            client.post('/vendor_sweets/batch', json={
+                'create': [{'price': 9, 'vendor_id': vendor.id, 'sweet_id': sweet.id}]})
+            ids = {'vendor_id': vendor.id, 'sweet_id': sweet.id}
+            reloads = snapshot.reloads
+
+            assert responses(True, **ids) == responses(False, **ids)
+            assert snapshot.reloads == reloads
+            vendor_sweets = client.get(f'/vendors/{vendor.id}').json['vendor_sweets']
+            assert [vs['price'] for vs in vendor_sweets] == [8, 9]
+
+    def test_checks_the_log_at_most_once_per_interval(self, snapshot, sql_statements, monkeypatch):
+        '''skips the change log within the interval unless this process committed.'''
+
+        monkeypatch.setattr(snapshot, 'interval', 60)
+        with app.app_context():
+            vendor = Vendor(name='Before')
+            db.session.add(vendor)
+            db.session.commit()
+            client = app.test_client()
+            assert client.get(f'/vendors/{vendor.id}').json['name'] == 'Before'
+
+            sql_statements.clear()
+            assert client.get(f'/vendors/{vendor.id}').json['name'] == 'Before'
+            assert sql_statements == []
+
+            # As another worker would: no commit through this session.
+            with db.engine.begin() as conn:
+                conn.execute(update(Vendor).where(Vendor.id == vendor.id).values(name='Other'))
+            assert client.get(f'/vendors/{vendor.id}').json['name'] == 'Before'
+
+            db.session.add(Sweet(name='Local'))
+            db.session.commit()
+            assert client.get(f'/vendors/{vendor.id}').json['name'] == 'Other'
+
+    def test_reloads_after_bulk_load(self, snapshot):
+        '''reloads every table when the change log has a reload entry.'''
+
+        with app.app_context():
+            snapshot.refresh()
+            reloads = snapshot.reloads
+            with db.engine.begin() as conn:
+                changes.record_reload(conn)
+            snapshot.refresh()
+            assert snapshot.reloads == reloads + 1
+            assert snapshot.seq == changes.last_seq(db.session.connection())
@@ -0,0 +1,45 @@
+import os
+import pytest
+from app import app, build_app, response_cache
+from benchmarks.cold_start import import_times
+
+# Cumulative `import app` time allowed, in milliseconds. It takes about
+# 650 ms on an idle machine; the default leaves room for a loaded one, such
+# as a run under pytest -n. Raise it deliberately, not to make a slow import
+# pass, and lower it with IMPORT_BUDGET_MS to check an idle machine tightly.
+IMPORT_BUDGET_MS = float(os.environ.get('IMPORT_BUDGET_MS', 2000))
+
+# Modules that serving never uses and app.py must not import.
+DEFERRED_MODULES = ('flask_migrate', 'alembic', 'ipdb', 'faker', 'sqlalchemy_serializer')
+
+
+@pytest.fixture(scope='module')
+def times():
+    return import_times('app', cwd=os.path.dirname(os.path.dirname(__file__)))
+
+
+class TestStartup:
+    '''import app, as measured by python -X importtime'''
+
+    def test_defers_non_serving_imports(self, times):
+        '''does not import migration tooling, debuggers or seed data libraries.'''
+
+        assert [name for name in DEFERRED_MODULES if name in times] == []
+
+    def test_stays_within_import_budget(self, times):
+        '''imports within IMPORT_BUDGET_MS milliseconds.'''
+
+        assert times['app'] / 1000 < IMPORT_BUDGET_MS
+
+
+class TestBuildApp:
+    '''build_app in app.py'''
+
+    def test_builds_one_app_per_process(self):
+        '''refuses to build a second app over the module singletons.'''
+
+        enabled = response_cache.enabled
+        with pytest.raises(RuntimeError):
+            build_app()
+        assert response_cache.enabled == enabled
+        assert app.extensions['response_cache'] is response_cache
@@ -0,0 +1,99 @@
+from faker import Faker
+from sqlalchemy import text
+from app import app
+from models import db, Sweet, SweetPriceSummary, Vendor, VendorPriceSummary, VendorSweet
+from summaries import check
+
+
+def summary(model, id):
+    db.session.expire_all()
+    row = db.session.get(model, id)
+    if row is None:
+        return None
+    return (row.count, row.min_price, row.max_price, row.price_sum)
+
+
+class TestPriceSummaries:
+    '''Price summary tables maintained by the triggers in summaries.py'''
+
+    def test_maintained_by_create_and_delete(self):
+        '''updates sweet and vendor summaries with POST and DELETE requests to /vendor_sweets.'''
+
+        with app.app_context():
+            fake = Faker()
+            sweet = Sweet(name=fake.name())
+            vendors = [Vendor(name=fake.name()), Vendor(name=fake.name())]
+            db.session.add_all([sweet, *vendors])
+            db.session.commit()
+
+            client = app.test_client()
+            ids = [
+                client.post('/vendor_sweets', json={
+                    "price": price, "vendor_id": vendor.id, "sweet_id": sweet.id,
+                }).json['id']
+                for vendor, price in [(vendors[0], 5), (vendors[0], 9), (vendors[1], 7)]
+            ]
+            assert summary(SweetPriceSummary, sweet.id) == (3, 5, 9, 21)
+            assert summary(VendorPriceSummary, vendors[0].id) == (2, 5, 9, 14)
+            assert summary(VendorPriceSummary, vendors[1].id) == (1, 7, 7, 7)
+
+            client.delete(f'/vendor_sweets/{ids[0]}')
+            assert summary(SweetPriceSummary, sweet.id) == (2, 7, 9, 16)
+            assert summary(VendorPriceSummary, vendors[0].id) == (1, 9, 9, 9)
+
+            client.delete(f'/vendor_sweets/{ids[2]}')
+            assert summary(VendorPriceSummary, vendors[1].id) is None
+
+            with db.engine.connect() as conn:
+                assert check(conn) == []
+
+    def test_maintained_by_updates(self):
+        '''moves a vendor sweet's price between summaries when its price or sweet changes.'''
+
+        with app.app_context():
+            fake = Faker()
+            sweets = [Sweet(name=fake.name()), Sweet(name=fake.name())]
+            vendor = Vendor(name=fake.name())
+            db.session.add_all([*sweets, vendor])
+            db.session.commit()
+            vendor_sweet = VendorSweet(sweet_id=sweets[0].id, vendor_id=vendor.id, price=4)
+            db.session.add(vendor_sweet)
+            db.session.commit()
+
+            vendor_sweet.price = 6
+            db.session.commit()
+            assert summary(SweetPriceSummary, sweets[0].id) == (1, 6, 6, 6)
+
+            vendor_sweet.sweet_id = sweets[1].id
+            db.session.commit()
+            assert summary(SweetPriceSummary, sweets[0].id) is None
+            assert summary(SweetPriceSummary, sweets[1].id) == (1, 6, 6, 6)
+            assert summary(VendorPriceSummary, vendor.id) == (1, 6, 6, 6)
+
+    def test_check_command(self):
+        '''reports summaries that drifted from a full recompute, and rebuilds them.'''
+
+        with app.app_context():
+            fake = Faker()
+            sweet = Sweet(name=fake.name())
+            vendor = Vendor(name=fake.name())
+            db.session.add_all([sweet, vendor])
+            db.session.commit()
+            db.session.add(VendorSweet(sweet_id=sweet.id, vendor_id=vendor.id, price=3))
+            db.session.commit()
+
+            db.session.execute(text(
+                'UPDATE sweet_price_summaries SET count = 5 WHERE sweet_id = :id'),
+                {'id': sweet.id})
+            db.session.commit()
+
+            runner = app.test_cli_runner()
+            result = runner.invoke(args=['price-summaries', 'check'])
+            assert result.exit_code == 1
+            assert f'sweet_price_summaries {sweet.id}' in result.output
+
+            result = runner.invoke(args=['price-summaries', 'rebuild'])
+            assert result.exit_code == 0
+            result = runner.invoke(args=['price-summaries', 'check'])
+            assert result.exit_code == 0
+            assert summary(SweetPriceSummary, sweet.id) == (1, 3, 3, 3)